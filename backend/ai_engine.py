@@ -1,8 +1,10 @@
 import os
 import json
+import time
 import logging
+import threading
 import google.generativeai as genai
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 
 # Configure Logging
 logging.basicConfig(level=logging.INFO)
@@ -13,6 +15,63 @@ load_dotenv()
 
 # --- CONFIGURATION ---
 MODEL_NAME = "gemini-1.5-flash" 
+AI_REQUEST_TIMEOUT_SECONDS = float(os.getenv("AI_REQUEST_TIMEOUT_SECONDS", "20"))
+AI_FAILURE_THRESHOLD = int(os.getenv("AI_FAILURE_THRESHOLD", "3"))
+AI_COOLDOWN_SECONDS = float(os.getenv("AI_COOLDOWN_SECONDS", "300"))
+
+class CircuitBreaker:
+    """
+    Stops calling the LLM after repeated failures.
+    After the cool-down the breaker is half-open: exactly one trial call is let through
+    and every other caller is refused until it reports back. Success closes the breaker
+    again; failure re-opens it for another cool-down.
+    """
+    def __init__(self, failure_threshold: int = AI_FAILURE_THRESHOLD, cooldown_seconds: float = AI_COOLDOWN_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def _probe_due(self) -> bool:
+        return not self.probe_in_flight and time.monotonic() - self.opened_at >= self.cooldown_seconds
+
+    def would_allow(self) -> bool:
+        """Whether a call could go through now, without claiming the half-open probe."""
+        with self._lock:
+            return self.opened_at is None or self._probe_due()
+
+    def allow(self) -> bool:
+        """Whether to make a call now; in the half-open state the first caller gets the probe."""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self._probe_due():
+                self.probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            if self.probe_in_flight:
+                # The probe failed: stay open for another cool-down
+                self.probe_in_flight = False
+                self.opened_at = time.monotonic()
+                logger.warning("AI circuit breaker probe failed; staying open.")
+                return
+            self.failures += 1
+            if self.failures >= self.failure_threshold and self.opened_at is None:
+                self.opened_at = time.monotonic()
+                logger.warning(f"AI circuit breaker opened after {self.failures} failures.")
+
+circuit_breaker = CircuitBreaker()
 
 class AIEngine:
     def __init__(self):
@@ -25,12 +84,19 @@ class AIEngine:
             genai.configure(api_key=api_key)
             self.model = genai.GenerativeModel(MODEL_NAME)
 
-    def generate_risk_explanation(self, risk_data: dict, user_profile: dict = None) -> str:
+    @property
+    def available(self) -> bool:
+        return self.model is not None and circuit_breaker.would_allow()
+
+    def generate_risk_explanation(self, risk_data: dict, user_profile: dict = None) -> Optional[str]:
         """
         Uses Gemini to write a personalized explanation based on user profile.
+        Returns None if the call fails, so callers can keep the deterministic text.
         """
         if not self.model:
             return f"{risk_data['description']} (AI Explanation Unavailable)"
+        if not circuit_breaker.allow():
+            return None
 
         try:
             # Extract Context from Profile
@@ -57,11 +123,16 @@ class AIEngine:
             - Be professional and direct.
             """
             
-            response = self.model.generate_content(prompt)
+            response = self.model.generate_content(
+                prompt,
+                request_options={"timeout": AI_REQUEST_TIMEOUT_SECONDS}
+            )
+            circuit_breaker.record_success()
             return response.text.strip()
         except Exception as e:
+            circuit_breaker.record_failure()
             logger.error(f"AI Error: {e}")
-            return risk_data['description']
+            return None
 
     def summarize_notice_text(self, ocr_text: str) -> dict:
         """
@@ -90,4 +161,13 @@ class AIEngine:
             return json.loads(response.text)
         except Exception as e:
             logger.error(f"AI Parsing Error: {e}")
-            return {}
\ No newline at end of file
+            return {}
+
+_shared_engine = None
+
+def get_ai_engine() -> AIEngine:
+    """Returns a process-wide AIEngine so the client is configured only once."""
+    global _shared_engine
+    if _shared_engine is None:
+        _shared_engine = AIEngine()
+    return _shared_engine
@@ -0,0 +1,74 @@
+import re
+from functools import lru_cache
+
+# ==========================================
+# AIS Category Classifier
+# ==========================================
+# Maps raw AIS information categories / codes to the canonical types used by
+# ingestion (TDS/TCS rows) and the normalizer (rent, TDS, interest, securities).
+# Lookup order: exact-match table, then one precompiled pattern scanning for
+# every known marker at once. Results are memoized per distinct category string,
+# so each row costs a dictionary lookup.
+
+RENT = "rent"
+TDS = "tds"
+TCS = "tcs"
+INTEREST = "interest"
+SECURITIES_SALE = "securities_sale"
+SECURITIES_PURCHASE = "securities_purchase"
+OTHER = "other"
+
+# Markers per type (case-insensitive substrings), in priority order:
+# a category matching several markers gets the type listed first.
+PATTERNS = (
+    (RENT, ("Rent received",)),
+    (TDS, ("TDS", "Tax Deducted")),
+    (TCS, ("TCS",)),
+    (INTEREST, ("Interest from savings", "Interest from deposits")),
+    (SECURITIES_SALE, ("Sale of securities", "SFT-017")),
+    (SECURITIES_PURCHASE, ("Purchase of securities", "Purchase of shares", "Purchase of units")),
+)
+
+# Common categories exactly as the portal / scraper emits them
+EXACT = {
+    "Rent received": RENT,
+    "TDS": TDS,
+    "TCS": TCS,
+    "Interest from savings bank": INTEREST,
+    "Interest from deposits": INTEREST,
+    "Sale of securities": SECURITIES_SALE,
+    "SFT-017": SECURITIES_SALE,
+    "Purchase of securities": SECURITIES_PURCHASE,
+    "Salary": OTHER,
+    "Dividend": OTHER,
+}
+
+_PRIORITY = {kind: rank for rank, (kind, _) in enumerate(PATTERNS)}
+
+# Lookahead alternation so overlapping markers are all reported; the group name is the type
+_MATCHER = re.compile(
+    "(?=" + "|".join(
+        f"(?P<{kind}>" + "|".join(re.escape(marker) for marker in markers) + ")"
+        for kind, markers in PATTERNS
+    ) + ")",
+    re.IGNORECASE,
+)
+
+@lru_cache(maxsize=4096)
+def _classify(category: str) -> str:
+    kind = EXACT.get(category)
+    if kind is not None:
+        return kind
+
+    best = OTHER
+    for match in _MATCHER.finditer(category):
+        found = match.lastgroup
+        if best == OTHER or _PRIORITY[found] < _PRIORITY[best]:
+            best = found
+    return best
+
+def classify(category) -> str:
+    """Returns the canonical type (RENT, TDS, TCS, INTEREST, SECURITIES_SALE, SECURITIES_PURCHASE or OTHER) of an AIS category."""
+    if not category:
+        return OTHER
+    return _classify(category if isinstance(category, str) else str(category))
@@ -0,0 +1,74 @@
+import hashlib
+import json
+import zlib
+from typing import Any, Union
+
+# ==========================================
+# Raw Artifact Codec
+# ==========================================
+# Raw payloads (ITR JSON, AIS snapshots) are stored as compact JSON compressed
+# into a binary column. orjson and zstandard are used when installed; the stdlib
+# json/zlib fallback keeps everything working without them. The first byte of
+# every blob records the compression so either build can read the other's rows.
+
+try:
+    import orjson
+except ImportError: # pragma: no cover - optional speedup
+    orjson = None
+
+try:
+    import zstandard
+except ImportError: # pragma: no cover - optional speedup
+    zstandard = None
+
+ZLIB = b"z"
+ZSTD = b"s"
+ZSTD_LEVEL = 3
+ZLIB_LEVEL = 6
+
+def dumps(obj: Any) -> bytes:
+    """Serializes to compact UTF-8 JSON."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+def loads(data: Union[bytes, str]) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def encode(obj: Any) -> bytes:
+    """JSON-serializes and compresses obj for storage."""
+    payload = dumps(obj)
+    if zstandard is not None:
+        return ZSTD + zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(payload)
+    return ZLIB + zlib.compress(payload, ZLIB_LEVEL)
+
+def decompress(blob: bytes) -> bytes:
+    """Returns the JSON bytes stored in blob."""
+    marker, body = blob[:1], blob[1:]
+    if marker == ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Artifact is zstd-compressed but 'zstandard' is not installed")
+        return zstandard.ZstdDecompressor().decompress(body)
+    if marker == ZLIB:
+        return zlib.decompress(body)
+    raise ValueError(f"Unknown artifact encoding {marker!r}")
+
+def decode(blob: bytes) -> Any:
+    return loads(decompress(blob))
+
+# --- Content hashes (idempotent ingestion) ---
+def canonical_dumps(obj: Any) -> bytes:
+    """Key-sorted compact JSON, so equal documents serialize identically regardless of key order."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+def content_hash(obj: Any) -> str:
+    """
+    Canonical content hash of a JSON document.
+    orjson and the stdlib format some numbers differently, so a hash written by one
+    build may not match the other's; the only cost of that is one redundant re-ingest.
+    """
+    return hashlib.blake2b(canonical_dumps(obj), digest_size=16).hexdigest()
@@ -0,0 +1,231 @@
+import logging
+import time
+from datetime import date
+import numpy as np
+from typing import Dict, List, Sequence, Tuple
+from . import rule_engine, tax_engine
+from .rule_engine import RawITR, RawAIS, EvaluationResult, RULES, ENGINES
+
+# ==========================================
+# Batch Rule Engine (Columnar)
+# ==========================================
+# Evaluates the Risk / Opportunity rules for many taxpayers at once: the normalized
+# ITR and AIS figures of N users are laid out as NumPy columns and every threshold
+# check becomes one vectorized mask over all rows. Python code only runs for the rows
+# a rule fires on, where the shared result builders from rule_engine produce records
+# identical to the scalar engines' (same rules, order and codes).
+
+ITR_COLUMNS = (
+    "total_income", "tax_payable", "tax_paid", "house_property_income",
+    "capital_gains_stcg", "capital_gains_ltcg",
+    "deductions_80c", "deductions_80d", "deductions_80ccd_1b", "tds_claimed",
+)
+AIS_COLUMNS = ("rent_received", "total_tds_deposited", "interest_income")
+
+class RuleTable:
+    """Columnar rule inputs: one row per taxpayer, one float64 / bool array per field"""
+    def __init__(self, keys: list, itrs: List[RawITR], aiss: List[RawAIS], profiles: List[dict]):
+        self.keys = list(keys)
+        # Row objects are kept for the per-row engines (tax calendar) and input fingerprints
+        self.itrs = itrs
+        self.aiss = aiss
+        self.profiles = profiles
+        count = len(self.keys)
+        self.columns: Dict[str, np.ndarray] = {}
+        for field in ITR_COLUMNS:
+            self.columns[field] = np.fromiter((getattr(itr, field) for itr in itrs), dtype=np.float64, count=count)
+        for field in AIS_COLUMNS:
+            self.columns[field] = np.fromiter((getattr(ais, field) for ais in aiss), dtype=np.float64, count=count)
+        # Entry-level and text inputs are reduced to one value per row up front
+        self.columns["short_term_equity_sales"] = np.fromiter(
+            (ais.sale_of_securities.short_term_equity for ais in aiss), dtype=np.float64, count=count
+        )
+        self.columns["lot_matched"] = np.fromiter((ais.capital_gains.matched_sales > 0 for ais in aiss), dtype=bool, count=count)
+        self.columns["lot_stcg"] = np.fromiter((ais.capital_gains.stcg for ais in aiss), dtype=np.float64, count=count)
+        self.columns["lot_ltcg"] = np.fromiter((ais.capital_gains.ltcg for ais in aiss), dtype=np.float64, count=count)
+        self.columns["filed_resident"] = np.fromiter(("RES" in itr.residential_status for itr in itrs), dtype=bool, count=count)
+        self.columns["declares_nri"] = np.fromiter((rule_engine.declares_nri(p) for p in profiles), dtype=bool, count=count)
+        self.columns["declares_capital_gains"] = np.fromiter(
+            (rule_engine.declares_capital_gains(p) for p in profiles), dtype=bool, count=count
+        )
+        self.columns["new_regime"] = np.fromiter((rule_engine.is_new_regime(p) for p in profiles), dtype=bool, count=count)
+        self.columns["filed_old_regime"] = np.fromiter(
+            (rule_engine.filed_regime(itr) == tax_engine.OLD for itr in itrs), dtype=bool, count=count
+        )
+
+    @classmethod
+    def from_records(cls, records: Sequence[Tuple]) -> "RuleTable":
+        """Builds the table from (key, RawITR, RawAIS or None, user_profile or None) tuples."""
+        keys, itrs, aiss, profiles = [], [], [], []
+        for key, itr, ais, profile in records:
+            keys.append(key)
+            itrs.append(itr)
+            aiss.append(ais if ais is not None else RawAIS())
+            profiles.append(profile or {})
+        return cls(keys, itrs, aiss, profiles)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __getitem__(self, field: str) -> np.ndarray:
+        return self.columns[field]
+
+class BatchRuleEngine:
+    """Vectorized counterpart of RiskEngine + OpportunityEngine over a RuleTable"""
+    def __init__(self, table: RuleTable):
+        self.table = table
+        self.risks: List[list] = [[] for _ in range(len(table))]
+        self.opportunities: List[list] = [[] for _ in range(len(table))]
+
+    def execute(self, rules=None, engines=("risks", "opportunities")) -> Tuple[List[list], List[list]]:
+        """
+        Runs the registered checks in the scalar engines' order, or only those named in `rules`.
+        Returns (risks, opportunities), each a list of result lists aligned with the table rows.
+        """
+        for engine, outputs in (("risks", self.risks), ("opportunities", self.opportunities)):
+            if engine not in engines:
+                continue
+            for name in BATCH_RULES[engine]:
+                if rules is None or name in rules:
+                    BATCH_RULES[engine][name](self.table, outputs)
+        return self.risks, self.opportunities
+
+# name of the scalar rule -> vectorized check(table, outputs)
+BATCH_RULES: Dict[str, Dict] = {"risks": {}, "opportunities": {}}
+
+def batch_rule(engine: str, name: str):
+    """Registers the vectorized implementation of the scalar rule `name`."""
+    def register(check):
+        BATCH_RULES[engine][name] = check
+        return check
+    return register
+
+def _emit(outputs: List[list], mask: np.ndarray, build, *columns):
+    """Appends build(*row values) to the outputs of every row selected by `mask`."""
+    rows = np.flatnonzero(mask)
+    if not len(rows):
+        return
+    values = [column[rows].tolist() for column in columns]
+    for position, row in enumerate(rows.tolist()):
+        outputs[row].append(build(*(value[position] for value in values)))
+
+# --- Risk checks (same thresholds as RiskEngine) ---
+
+@batch_rule("risks", "_check_rental_mismatch")
+def _rental_mismatch(t: RuleTable, outputs):
+    rent, declared = t["rent_received"], t["house_property_income"]
+    _emit(outputs, (rent > 0) & (rent - declared > 50000), rule_engine.rental_mismatch_risk, rent, declared)
+
+@batch_rule("risks", "_check_capital_gains_misclass")
+def _capital_gains_misclass(t: RuleTable, outputs):
+    matched, computed, reported = t["lot_matched"], t["lot_stcg"], t["capital_gains_stcg"]
+    risky_stcg = t["short_term_equity_sales"]
+    # Rows with FIFO figures use them; the others fall back to the sale descriptions (one result per row at most)
+    _emit(outputs, matched & (computed - reported > rule_engine.CG_TOLERANCE), rule_engine.stcg_underreported_risk, computed, reported)
+    _emit(outputs, ~matched & (risky_stcg > 100000) & (reported == 0), rule_engine.stcg_unreported_risk, risky_stcg)
+
+@batch_rule("risks", "_check_ltcg_underreported")
+def _ltcg_underreported(t: RuleTable, outputs):
+    computed, reported = t["lot_ltcg"], t["capital_gains_ltcg"]
+    _emit(outputs, t["lot_matched"] & (computed - reported > rule_engine.CG_TOLERANCE), rule_engine.ltcg_underreported_risk, computed, reported)
+
+@batch_rule("risks", "_check_tds_mismatch")
+def _tds_mismatch(t: RuleTable, outputs):
+    deposited, claimed = t["total_tds_deposited"], t["tds_claimed"]
+    under = deposited > (claimed + 1000)
+    over = ~under & (claimed > (deposited + 1000))
+    # At most one of the two fires per row, so emitting them one after the other keeps the row order
+    _emit(outputs, under, rule_engine.tds_underclaim_risk, deposited, claimed)
+    _emit(outputs, over, rule_engine.tds_overclaim_risk, deposited, claimed)
+
+@batch_rule("risks", "_check_interest_mismatch")
+def _interest_mismatch(t: RuleTable, outputs):
+    interest = t["interest_income"]
+    _emit(outputs, (interest > 5000) & (t["total_income"] < interest), rule_engine.interest_undeclared_risk, interest)
+
+@batch_rule("risks", "_check_high_income_disclosure")
+def _high_income_disclosure(t: RuleTable, outputs):
+    income = t["total_income"]
+    _emit(outputs, income > 5000000, rule_engine.schedule_al_risk, income)
+
+@batch_rule("risks", "_check_tax_liability_mismatch")
+def _tax_liability_mismatch(t: RuleTable, outputs):
+    payable, paid = t["tax_payable"], t["tax_paid"]
+    _emit(outputs, payable > (paid + 100), rule_engine.tax_demand_risk, payable, paid)
+
+@batch_rule("risks", "_check_residential_status_mismatch")
+def _residential_status_mismatch(t: RuleTable, outputs):
+    _emit(outputs, t["declares_nri"] & t["filed_resident"], rule_engine.residential_status_risk)
+
+@batch_rule("risks", "_check_declared_income_sources")
+def _declared_income_sources(t: RuleTable, outputs):
+    no_gains = (t["capital_gains_ltcg"] + t["capital_gains_stcg"]) == 0
+    _emit(outputs, t["declares_capital_gains"] & no_gains, rule_engine.cg_not_reported_risk)
+
+# --- Opportunity checks (deductions old regime only, as in OpportunityEngine) ---
+
+def _tax(t: RuleTable, scenario: str) -> np.ndarray:
+    """Column of rule_engine.scenario_taxes; all scenarios are computed in one pass on first use."""
+    if f"tax_{scenario}" not in t.columns:
+        for name, column in rule_engine.scenario_taxes(t.itrs).items():
+            t.columns[f"tax_{name}"] = column
+    return t[f"tax_{scenario}"]
+
+@batch_rule("opportunities", "_check_80c")
+def _opportunity_80c(t: RuleTable, outputs):
+    claimed = t["deductions_80c"]
+    savings = _tax(t, "old") - _tax(t, "fill_80c")
+    _emit(outputs, ~t["new_regime"] & (rule_engine.LIMIT_80C - claimed > 5000) & (savings > 0), rule_engine.opportunity_80c, claimed, savings)
+
+@batch_rule("opportunities", "_check_80d")
+def _opportunity_80d(t: RuleTable, outputs):
+    savings = _tax(t, "old") - _tax(t, "claim_80d")
+    _emit(outputs, ~t["new_regime"] & (t["deductions_80d"] == 0) & (savings > 0), rule_engine.opportunity_80d, savings)
+
+@batch_rule("opportunities", "_check_nps")
+def _opportunity_nps(t: RuleTable, outputs):
+    savings = _tax(t, "old") - _tax(t, "claim_nps")
+    _emit(outputs, ~t["new_regime"] & (t["deductions_80ccd_1b"] == 0) & (savings > 0), rule_engine.opportunity_nps, savings)
+
+@batch_rule("opportunities", "_check_regime")
+def _regime_switch(t: RuleTable, outputs):
+    filed_old = t["filed_old_regime"]
+    filed_tax = np.where(filed_old, _tax(t, "old"), _tax(t, "new"))
+    other_tax = np.where(filed_old, _tax(t, "new"), _tax(t, "old"))
+    other = np.where(filed_old, "new", "old")
+    _emit(outputs, filed_tax - other_tax >= rule_engine.REGIME_SWITCH_MIN, rule_engine.opportunity_regime_switch, other, filed_tax, other_tax)
+
+# Checks run in the scalar engines' declaration order; every scalar rule needs a batch twin
+for _engine, _engine_class in (("risks", rule_engine.RiskEngine), ("opportunities", rule_engine.OpportunityEngine)):
+    assert set(BATCH_RULES[_engine]) == set(_engine_class.RULE_NAMES), f"Batch rules out of sync for {_engine}"
+    BATCH_RULES[_engine] = {name: BATCH_RULES[_engine][name] for name in _engine_class.RULE_NAMES}
+
+def evaluate_batch(table: RuleTable, engines=ENGINES, rules=None) -> List[EvaluationResult]:
+    """
+    Batch counterpart of rule_engine.evaluate_all: one EvaluationResult per table row, with
+    the same risk / opportunity dicts the scalar engines produce. The tax calendar has no
+    thresholds to vectorize and runs per row on projected taxes computed for the whole
+    table. Timings are for the whole batch.
+    """
+    if rules is not None:
+        engines = [engine for engine in engines if any(RULES[name].engine == engine for name in rules)]
+    results = [EvaluationResult() for _ in range(len(table))]
+
+    start = time.perf_counter()
+    risks, opportunities = BatchRuleEngine(table).execute(rules, engines)
+    elapsed = (time.perf_counter() - start) * 1000
+    for result, row_risks, row_opps in zip(results, risks, opportunities):
+        result.risks = [r.to_dict() for r in row_risks]
+        result.opportunities = [o.to_dict() for o in row_opps]
+        result.timings["batch_rules"] = elapsed
+
+    if "tax_calendar" in engines:
+        # The projected tax is computed for all rows in one pass; the schedules are built per row
+        today = date.today()
+        estimates = rule_engine.projected_taxes(table.itrs, today.year if today.month > 3 else today.year - 1).tolist()
+        for result, itr, estimated_tax in zip(results, table.itrs, estimates):
+            try:
+                result.tax_calendar = rule_engine.TaxCalendarEngine(itr, estimated_tax).execute(rules)
+            except Exception as e:
+                logging.exception(f"Tax Calendar Error: {e}")
+    return results
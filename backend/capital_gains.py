@@ -0,0 +1,227 @@
+import numpy as np
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Optional, Tuple
+
+# ==========================================
+# Lot-level Capital Gains (FIFO)
+# ==========================================
+# Matches AIS securities purchases against sales first-in-first-out per security
+# and splits the realized gains into short / long term by holding period.
+# Trades are held as NumPy columns and matched in one vectorized pass: every
+# security gets its own stretch of a shared "unit" axis, on which each purchase
+# and each sale covers a consecutive range of units (cumulative quantities).
+# Cutting the axis at every range boundary yields segments that each belong to
+# exactly one purchase lot and one sale, i.e. the FIFO matches. Units a sale sells
+# beyond what is held at that date (incomplete purchase history) are split off
+# first, so they never consume a later purchase.
+#
+# Only entries with a security identifier, a quantity and a parseable date take
+# part; sales without matching purchases are reported as unmatched proceeds.
+
+# Held for more than this many days -> long term
+EQUITY_LONG_TERM_DAYS = 365 # listed equity shares and equity-oriented funds: 12 months
+OTHER_LONG_TERM_DAYS = 730 # other securities: 24 months
+
+SECURITY_KEYS = ("isin", "ISIN", "security", "securityName", "SecurityName", "scrip")
+QUANTITY_KEYS = ("quantity", "Quantity", "units", "Units")
+DATE_FORMATS = ("%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y", "%d-%b-%Y", "%d-%b-%y", "%d %b %Y")
+
+_EPSILON = 1e-9 # units; float noise below this is not a match
+
+@lru_cache(maxsize=4096)
+def parse_date(value: str) -> Optional[int]:
+    """Proleptic ordinal of an AIS date string, or None if no known format matches."""
+    value = value.strip()[:11]
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date().toordinal()
+        except ValueError:
+            continue
+    return None
+
+def fy_period(fy: str) -> Optional[Tuple[int, int]]:
+    """(first, last) day ordinals of a financial year such as "2023-24", or None."""
+    try:
+        start = int(str(fy).split("-")[0])
+    except ValueError:
+        return None
+    return date(start, 4, 1).toordinal(), date(start + 1, 3, 31).toordinal()
+
+def ay_period(ay: str) -> Optional[Tuple[int, int]]:
+    """fy_period of the financial year an assessment year ("2024-25") assesses, or None."""
+    try:
+        start = int(str(ay).split("-")[0])
+    except ValueError:
+        return None
+    return fy_period(str(start - 1))
+
+@lru_cache(maxsize=1024)
+def is_equity(description: str) -> bool:
+    desc = description.lower()
+    return "equity" in desc or "shares" in desc
+
+def _first(entry: dict, keys):
+    for key in keys:
+        value = entry.get(key)
+        if value not in (None, ""):
+            return value
+    return None
+
+def _number(value) -> Optional[float]:
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).replace(",", ""))
+    except ValueError:
+        return None
+
+def trade_fields(entry: dict):
+    """(security, quantity) of an AIS entry, or None for either that is missing or invalid."""
+    security = _first(entry, SECURITY_KEYS)
+    quantity = _first(entry, QUANTITY_KEYS)
+    quantity = _number(quantity) if quantity is not None else None
+    return (str(security).strip().upper() if security is not None else None), quantity
+
+class TradeLedger:
+    """Purchases and sales of securities as columns, one row per trade"""
+    def __init__(self, securities, days, quantities, amounts, is_sale, equity):
+        # Securities are factorized to consecutive codes; rows stay in input order
+        self.names, self.security = np.unique(np.asarray(securities, dtype=object).astype(str), return_inverse=True)
+        self.day = np.asarray(days, dtype=np.int64)
+        self.quantity = np.asarray(quantities, dtype=np.float64)
+        self.amount = np.asarray(amounts, dtype=np.float64)
+        self.is_sale = np.asarray(is_sale, dtype=bool)
+        self.equity = np.asarray(equity, dtype=bool)
+
+    @classmethod
+    def from_entries(cls, purchases: list, sales: list) -> "TradeLedger":
+        """Builds the ledger from AIS entry dicts, skipping entries that cannot be matched."""
+        securities, days, quantities, amounts, is_sale, equity = [], [], [], [], [], []
+        for entries, sale in ((purchases, False), (sales, True)):
+            for entry in entries:
+                security, quantity = trade_fields(entry)
+                if security is None or not quantity or quantity <= 0:
+                    continue
+                day = parse_date(str(entry.get("date") or ""))
+                amount = _number(entry.get("amount", 0) or 0)
+                if day is None or amount is None:
+                    continue
+                securities.append(security)
+                days.append(day)
+                quantities.append(quantity)
+                amounts.append(amount)
+                is_sale.append(sale)
+                equity.append(is_equity(str(entry.get("description") or "")))
+        return cls(securities, days, quantities, amounts, is_sale, equity)
+
+    def __len__(self):
+        return len(self.day)
+
+def _uncovered(security, quantity, is_sale):
+    """
+    Units of each trade (sorted by security, then date) sold beyond the holding at
+    that point: the running shortfall -min(0, min cumulative holding) per security.
+    """
+    signed = np.where(is_sale, -quantity, quantity)
+    shortfall = np.zeros(len(signed))
+    starts = np.flatnonzero(np.diff(security, prepend=-1))
+    holding = np.cumsum(signed)
+    holding -= np.repeat(holding[starts] - signed[starts], np.diff(np.append(starts, len(signed))))
+    if holding.min() >= -_EPSILON:
+        return shortfall # every sale is covered: the usual case
+    for start, end in zip(starts, np.append(starts[1:], len(signed))):
+        running = np.minimum(np.minimum.accumulate(np.cumsum(signed[start:end])), 0.0)
+        shortfall[start:end] = -np.diff(running, prepend=0.0)
+    return shortfall
+
+def _unit_ranges(security, quantity, span_offset, group_base):
+    """End / start of each trade's range on the unit axis (trades sorted by security)."""
+    end = span_offset[security] + np.cumsum(quantity) - group_base[security]
+    return end - quantity, end
+
+def match_fifo(ledger: TradeLedger) -> dict:
+    """
+    FIFO-matches the ledger's sales against its purchases per security.
+    Returns the matched segments as columns: "sale" / "lot" (ledger row indexes),
+    "quantity", "cost", "proceeds", "holding_days", plus "unmatched_sale" /
+    "unmatched_quantity" for sold units without an earlier purchase.
+    """
+    empty = np.empty(0, dtype=np.int64)
+    result = {
+        "sale": empty, "lot": empty, "quantity": np.empty(0), "cost": np.empty(0),
+        "proceeds": np.empty(0), "holding_days": empty,
+        "unmatched_sale": empty, "unmatched_quantity": np.empty(0),
+    }
+    if not len(ledger) or not ledger.is_sale.any():
+        return result
+
+    # Per security: purchases before sales on the same day, then in date order
+    order = np.lexsort((ledger.is_sale, ledger.day, ledger.security))
+    sorted_sale = ledger.is_sale[order]
+    shortfall = _uncovered(ledger.security[order], ledger.quantity[order], sorted_sale)
+    buys, sells = order[~sorted_sale], order[sorted_sale]
+    uncovered = shortfall[sorted_sale]
+    covered = ledger.quantity[sells] - uncovered
+    count = len(ledger.names)
+
+    # Covered sales never exceed the purchases before them, so each security's stretch is its bought units
+    bought = np.bincount(ledger.security[buys], weights=ledger.quantity[buys], minlength=count)
+    sold = np.bincount(ledger.security[sells], weights=covered, minlength=count)
+    span_offset = np.concatenate(([0.0], np.cumsum(bought)[:-1]))
+    buy_start, buy_end = _unit_ranges(ledger.security[buys], ledger.quantity[buys], span_offset, np.cumsum(bought) - bought)
+    sell_start, sell_end = _unit_ranges(ledger.security[sells], covered, span_offset, np.cumsum(sold) - sold)
+
+    cuts = np.unique(np.concatenate((buy_start, buy_end, sell_start, sell_end)))
+    seg_start, seg_length = cuts[:-1], np.diff(cuts)
+    keep = seg_length > _EPSILON
+    seg_start, seg_length = seg_start[keep], seg_length[keep]
+    probe = seg_start + seg_length / 2 # a point strictly inside the segment
+
+    sell_pos = np.searchsorted(sell_end, probe, side="right")
+    in_sale = sell_pos < len(sells)
+    in_sale[in_sale] = sell_start[sell_pos[in_sale]] <= probe[in_sale]
+    buy_pos = np.searchsorted(buy_end, probe, side="right")
+    in_lot = buy_pos < len(buys)
+    in_lot[in_lot] = buy_start[buy_pos[in_lot]] <= probe[in_lot]
+
+    matched = in_sale & in_lot
+    sale = sells[sell_pos[matched]]
+    lot = buys[buy_pos[matched]]
+    quantity = seg_length[matched]
+    short = uncovered > _EPSILON
+    result.update(
+        sale=sale, lot=lot, quantity=quantity,
+        cost=quantity * ledger.amount[lot] / ledger.quantity[lot],
+        proceeds=quantity * ledger.amount[sale] / ledger.quantity[sale],
+        holding_days=ledger.day[sale] - ledger.day[lot],
+        unmatched_sale=sells[short], unmatched_quantity=uncovered[short],
+    )
+    return result
+
+def realized_gains(ledger: TradeLedger, period: Optional[Tuple[int, int]] = None) -> dict:
+    """
+    Short / long-term gains of the sales dated within `period` (day ordinals, inclusive;
+    default: all sales): {"stcg", "ltcg", "matched_sales", "unmatched_proceeds"}.
+    """
+    matches = match_fifo(ledger)
+    sale, unmatched_sale = matches["sale"], matches["unmatched_sale"]
+    in_period = np.ones(len(sale), dtype=bool)
+    unmatched_in_period = np.ones(len(unmatched_sale), dtype=bool)
+    if period is not None:
+        first, last = period
+        in_period = (ledger.day[sale] >= first) & (ledger.day[sale] <= last)
+        unmatched_in_period = (ledger.day[unmatched_sale] >= first) & (ledger.day[unmatched_sale] <= last)
+
+    gain = matches["proceeds"] - matches["cost"]
+    threshold = np.where(ledger.equity[sale], EQUITY_LONG_TERM_DAYS, OTHER_LONG_TERM_DAYS)
+    long_term = matches["holding_days"] > threshold
+    unmatched = unmatched_sale[unmatched_in_period]
+    return {
+        "stcg": round(float(gain[in_period & ~long_term].sum()), 2),
+        "ltcg": round(float(gain[in_period & long_term].sum()), 2),
+        "matched_sales": int(len(np.unique(sale[in_period]))),
+        "unmatched_proceeds": round(float(
+            (matches["unmatched_quantity"][unmatched_in_period] * ledger.amount[unmatched] / ledger.quantity[unmatched]).sum()
+        ), 2),
+    }
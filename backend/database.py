@@ -1,5 +1,5 @@
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -19,6 +19,35 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+def upgrade_schema():
+    """
+    Adds columns and indexes declared on the models but missing from existing tables.
+    create_all only creates new tables, so this keeps older SQLite files usable (MVP stand-in for Alembic).
+    Run through `python -m backend.tools.migrate`, not on API startup.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+def begin_transaction(db):
+    """
+    Makes sure a real database transaction is open on the session's connection.
+    pysqlite only emits BEGIN before DML, so a SAVEPOINT issued first would run
+    outside any transaction and be committed as soon as it is released.
+    """
+    dbapi_connection = db.connection().connection.dbapi_connection
+    if engine.dialect.name == "sqlite" and not dbapi_connection.in_transaction:
+        dbapi_connection.execute("BEGIN")
+
 # Dependency
 def get_db():
     db = SessionLocal()
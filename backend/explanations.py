@@ -0,0 +1,84 @@
+from typing import Dict, Optional
+
+# ==========================================
+# Local Explanation Templates
+# ==========================================
+# Keyed by risk code (RiskResult.risk_code) and the questionnaire's risk appetite.
+# The LLM is only used for risk types / profiles that have no entry here.
+
+DEFAULT_RISK_APPETITE = "Balanced"
+
+RISK_TEMPLATES: Dict[str, Dict[str, str]] = {
+    "RISK_RENTAL_MISMATCH": { # Rental Income Mismatch
+        "Conservative": "AIS reports {amount} more rent than your return; revising the return now is the safest way to avoid a mismatch notice.",
+        "Balanced": "AIS reports {amount} more rent than your return, so reconcile it with your tenant's records and revise if it is genuine income.",
+        "Aggressive": "AIS shows {amount} of rent missing from your return; claim the 30% standard deduction and interest on loan while correcting it to limit the extra tax.",
+    },
+    "RISK_STCG_UNREPORTED": { # Capital Gains Discrepancy
+        "Conservative": "AIS shows {amount} of short-term equity sales that are not in your return; report them in Schedule CG before the department flags it.",
+        "Balanced": "AIS shows {amount} of short-term equity sales missing from Schedule CG, so match it against your broker's capital gains statement.",
+        "Aggressive": "AIS shows {amount} of short-term equity sales missing from your return; report them and set off any available losses to reduce the impact.",
+    },
+    "RISK_STCG_UNDERREPORTED": { # Short Term Capital Gains Under-reported
+        "Conservative": "FIFO matching of your AIS trades shows {amount} more short-term gains than your return; report them in Schedule CG to avoid a mismatch notice.",
+        "Balanced": "Your AIS trades imply {amount} more short-term gains than reported, so reconcile Schedule CG with your broker's capital gains statement.",
+        "Aggressive": "Short-term gains are {amount} higher than reported; correct Schedule CG and set off any available capital losses to limit the tax.",
+    },
+    "RISK_LTCG_UNDERREPORTED": { # Long Term Capital Gains Under-reported
+        "Conservative": "FIFO matching of your AIS trades shows {amount} more long-term gains than your return; report them in Schedule CG to avoid a mismatch notice.",
+        "Balanced": "Your AIS trades imply {amount} more long-term gains than reported, so reconcile Schedule CG with your broker's capital gains statement.",
+        "Aggressive": "Long-term gains are {amount} higher than reported; correct Schedule CG and apply the annual LTCG exemption and grandfathering to limit the tax.",
+    },
+    "RISK_TDS_UNDERCLAIM": { # Unclaimed TDS Credit
+        "Conservative": "{amount} of TDS deducted on your behalf is not claimed; verify it in Form 26AS and claim it in a revised return.",
+        "Balanced": "You are leaving {amount} of TDS credit unclaimed, which you can recover by revising your return.",
+        "Aggressive": "{amount} of TDS credit is unclaimed money; revise the return promptly to get it back as refund or lower tax payable.",
+    },
+    "RISK_TDS_OVERCLAIM": { # Mismatch in TDS claimed vs Form 26AS
+        "Conservative": "You claimed {amount} more TDS than Form 26AS shows, which will be disallowed; revise the return and pay the difference to stay compliant.",
+        "Balanced": "Your TDS claim exceeds Form 26AS by {amount}, so check for missing deductor filings before revising the return.",
+        "Aggressive": "Your TDS claim exceeds Form 26AS by {amount}; ask the deductor to correct their TDS return if the credit is genuine, otherwise revise to avoid interest.",
+    },
+    "RISK_INTEREST_UNDECLARED": { # Interest income not declared
+        "Conservative": "Interest of {amount} reported in AIS is not in your return; declare it under Other Sources to avoid penalty proceedings.",
+        "Balanced": "Interest of {amount} from AIS appears to be missing from your return, so add it under Income from Other Sources.",
+        "Aggressive": "Interest of {amount} from AIS is undeclared; report it and claim the 80TTA/80TTB deduction to reduce the tax on it.",
+    },
+    "RISK_SCHEDULE_AL": { # High Income Disclosure
+        "Conservative": "With gross income of {amount}, Schedule AL is mandatory; make sure every asset and liability is disclosed.",
+        "Balanced": "Your gross income of {amount} crosses ₹50L, so confirm that Schedule AL lists your assets and liabilities.",
+        "Aggressive": "Your gross income of {amount} requires Schedule AL; complete it accurately so the return is not treated as defective.",
+    },
+    "RISK_TAX_DEMAND": { # Outstanding Tax Demand
+        "Conservative": "Your liability exceeds taxes paid by {amount}; pay self-assessment tax right away to stop interest under 234B/234C.",
+        "Balanced": "There is a {amount} gap between tax liability and taxes paid, so pay self-assessment tax or trace any missing challans.",
+        "Aggressive": "A {amount} shortfall in taxes paid is accruing interest; settle it or match unlinked challans to close the demand.",
+    },
+    "RISK_RESIDENTIAL_STATUS": { # Residential Status Mismatch
+        "Conservative": "Your return was filed as Resident although you identified as NRI; file a revised return with the correct status to avoid scrutiny.",
+        "Balanced": "Your questionnaire says NRI but the return says Resident, so check the 182-day rule and revise if needed.",
+        "Aggressive": "Filing as Resident while being NRI may over-tax your foreign income; verify your days in India and revise to the correct status.",
+    },
+    "RISK_CG_NOT_REPORTED": { # Missing Capital Gains
+        "Conservative": "You reported capital gains income in your profile but Schedule CG is empty; report the gains to remain fully compliant.",
+        "Balanced": "Your profile mentions capital gains but none are in the return, so confirm with your broker statement whether they should be reported.",
+        "Aggressive": "Capital gains from your profile are missing in the return; report them along with exemptions like 54/54F to minimise tax.",
+    },
+}
+
+def render_explanation(risk_data: dict, user_profile: Optional[dict] = None) -> Optional[str]:
+    """
+    Returns a local explanation for the risk, or None if no template covers
+    this risk type / risk appetite (the caller then falls back to the LLM).
+    """
+    templates = RISK_TEMPLATES.get(risk_data.get("risk_code"))
+    if not templates:
+        return None
+
+    appetite = (user_profile or {}).get("risk") or DEFAULT_RISK_APPETITE
+    template = templates.get(appetite)
+    if not template:
+        return None
+
+    amount = float(risk_data.get("amount_involved") or 0)
+    return template.format(amount=f"₹{amount:,.0f}")
@@ -0,0 +1,193 @@
+import json
+from typing import Dict, Mapping, Union
+from . import artifact_codec
+
+# ==========================================
+# Single-pass ITR Field Extraction
+# ==========================================
+# One field plan per form family, shared by DataNormalizer (rule engine),
+# itr_service (ingestion) and the profile router. Each plan entry is
+#   field -> (candidate paths, kind, default)
+# where the first candidate path present in the JSON wins. "{form}" is replaced
+# by the concrete form type (ITR1, ITR4, ...) when the plan is compiled.
+
+NUM, STR, RAW = "num", "str", "raw"
+
+_PERSONAL_FIELDS = {
+    "pan": (("PAN",),),
+    "first_name": (("AssesseeName", "FirstName"),),
+    "middle_name": (("AssesseeName", "MiddleName"),),
+    "last_name": (("AssesseeName", "SurNameOrOrgName"),),
+    "dob": (("DOB",),),
+    "residence_no": (("Address", "ResidenceNo"),),
+    "residence_name": (("Address", "ResidenceName"),),
+    "road_or_street": (("Address", "RoadOrStreet"),),
+    "locality_or_area": (("Address", "LocalityOrArea"),),
+    "city_or_town": (("Address", "CityOrTownOrDistrict"),),
+    "pin_code": (("Address", "PinCode"),),
+    "country_code_mobile": (("Address", "CountryCodeMobile"),),
+    "mobile_no": (("Address", "MobileNo"),),
+    "email": (("Address", "EmailAddress"),),
+}
+
+def _personal_plan(prefix: tuple) -> dict:
+    return {field: (tuple(prefix + path for path in paths), RAW, None) for field, paths in _PERSONAL_FIELDS.items()}
+
+def _filing_plan(prefix: tuple) -> dict:
+    status = prefix + ("FilingStatus",)
+    return {
+        "ack_num": ((status + ("AcknowledgementNumber",), status + ("ReceiptNo",)), RAW, "Pending"),
+        "filing_date": ((status + ("DateOfFiling",), status + ("OrigRetFiledDate",), ("CreationInfo", "JSONCreationDate")), RAW, "Unknown"),
+        "residential_status": ((status + ("ResidentialStatus",),), STR, "RES"),
+        "opt_out_new_regime": ((status + ("OptOutNewTaxRegime",),), STR, "N"), # AY 2024-25 onwards
+        "opt_in_new_regime": ((status + ("NewTaxRegime",), status + ("OptingNewTaxRegime",)), STR, "N"), # 115BAC, up to AY 2023-24
+    }
+
+# ITR-1 / ITR-4: schedules sit directly under the form
+SIMPLE_FORM_PLAN = {
+    "ay": ((("Form_{form}", "AssessmentYear"),), RAW, "Unknown"),
+    "gross_total_income": ((("{form}_IncomeDeductions", "GrossTotIncome"),), NUM, 0.0),
+    "total_income": ((("{form}_IncomeDeductions", "TotalIncome"),), NUM, 0.0),
+    "tax_payable": ((("{form}_TaxComputation", "NetTaxLiability"),), NUM, 0.0),
+    "tax_paid": ((("TaxPaid", "TaxesPaid", "TotalTaxesPaid"),), NUM, 0.0),
+    "house_property_income": ((("{form}_IncomeDeductions", "IncomeFromHP"),), NUM, 0.0),
+    "deductions_80c": ((("{form}_IncomeDeductions", "UsrDeductUndChapVIA", "Section80C"),), NUM, 0.0),
+    "tds_claimed": ((("TDS", "TotalTDSClaimed"),), NUM, 0.0),
+    "refund_due": ((("Refund", "RefundDue"),), RAW, "0"),
+    **_filing_plan(()),
+    **_personal_plan(("PersonalInfo",)),
+}
+
+# ITR-2 / ITR-3: Part A / Part B layout with separate schedules
+DETAILED_FORM_PLAN = {
+    "ay": ((("Form_{form}", "AssessmentYear"),), RAW, "Unknown"),
+    "gross_total_income": ((("PartB-TI", "GrossTotalIncome"),), NUM, 0.0),
+    "total_income": ((("PartB-TI", "TotalIncome"),), NUM, 0.0),
+    "tax_payable": ((("PartB_TTI", "ComputationOfTaxLiability", "NetTaxLiability"), ("PartB_TTI", "NetTaxLiability")), NUM, 0.0),
+    "tax_paid": ((("PartB_TTI", "TaxPaid", "TaxesPaid", "TotalTaxesPaid"),), NUM, 0.0),
+    "house_property_income": ((("ScheduleHP", "TotalIncomeHP"),), NUM, 0.0),
+    "capital_gains_stcg": ((("ScheduleCGFor23", "ShortTermCapGainFor23", "TotalSTCG"),), NUM, 0.0),
+    "capital_gains_ltcg": ((("ScheduleCGFor23", "LongTermCapGain23", "TotalLTCG"),), NUM, 0.0),
+    "deductions_80c": ((("ScheduleVIA", "UsrDeductUndChapVIA", "Section80C"),), NUM, 0.0),
+    "deductions_80d": ((("ScheduleVIA", "UsrDeductUndChapVIA", "Section80D"),), NUM, 0.0),
+    "deductions_80ccd_1b": ((("ScheduleVIA", "UsrDeductUndChapVIA", "Section80CCD1B"),), NUM, 0.0),
+    "tds_claimed": ((("ScheduleTDS1", "TotalTDSClaimed"),), NUM, 0.0),
+    "refund_due": ((("PartB_TTI", "Refund", "RefundDue"),), RAW, "0"),
+    **_filing_plan(("PartA_GEN1",)),
+    **_personal_plan(("PartA_GEN1", "PersonalInfo")),
+}
+
+# Fields a plan does not cover (e.g. capital gains on ITR-1) fall back to these
+ALL_FIELDS = {field: default for field, (_, _, default) in {**SIMPLE_FORM_PLAN, **DETAILED_FORM_PLAN}.items()}
+
+def is_simple_form(form_type: str) -> bool:
+    return "ITR1" in form_type or "ITR4" in form_type
+
+class CompiledPlan:
+    """
+    A field plan with concrete paths, folded into a trie so that a single
+    walk over the JSON visits every path prefix exactly once.
+    """
+    def __init__(self, form_type: str, plan: dict):
+        self.fields = {}
+        self.trie = {} # key -> [children, terminals]; terminals = [(field, candidate_index)]
+        for field, (paths, kind, default) in plan.items():
+            self.fields[field] = (len(paths), kind, default)
+            for index, path in enumerate(paths):
+                node = [self.trie, None]
+                for key in path:
+                    key = key.replace("{form}", form_type)
+                    node = node[0].setdefault(key, [{}, []])
+                node[1].append((field, index))
+
+    def run(self, form_data: dict) -> dict:
+        found = {}
+        stack = [(self.trie, form_data)]
+        while stack:
+            children, value = stack.pop()
+            for key, (grandchildren, terminals) in children.items():
+                if key not in value:
+                    continue
+                child_value = value[key]
+                for field, index in terminals:
+                    found[(field, index)] = child_value
+                if grandchildren and isinstance(child_value, dict):
+                    stack.append((grandchildren, child_value))
+
+        result = dict(ALL_FIELDS)
+        for field, (candidates, kind, default) in self.fields.items():
+            for index in range(candidates):
+                if (field, index) in found:
+                    result[field] = _coerce(found[(field, index)], kind, default)
+                    break
+        return result
+
+def _coerce(value, kind, default):
+    if kind == NUM:
+        if isinstance(value, (int, float)):
+            return float(value)
+        if isinstance(value, str) and value.replace('.', '', 1).isdigit():
+            return float(value)
+        return default
+    if kind == STR:
+        return value if isinstance(value, str) else default
+    return value
+
+_compiled_plans: Dict[str, CompiledPlan] = {}
+
+def _plan_for(form_type: str) -> CompiledPlan:
+    plan = _compiled_plans.get(form_type)
+    if plan is None:
+        plan = CompiledPlan(form_type, SIMPLE_FORM_PLAN if is_simple_form(form_type) else DETAILED_FORM_PLAN)
+        _compiled_plans[form_type] = plan
+    return plan
+
+def _extract(itr_json: dict) -> dict:
+    itr_root = itr_json.get("ITR", {}) if isinstance(itr_json, dict) else {}
+    form_type = next(iter(itr_root)) if itr_root else "Unknown"
+    form_data = itr_root.get(form_type, {})
+    if not isinstance(form_data, dict):
+        form_data = {}
+
+    fields = _plan_for(form_type).run(form_data)
+    fields["form_type"] = form_type
+    return fields
+
+def extract_itr(itr_json: dict) -> dict:
+    """Extracts every field the normalizer, ingestion and profile need in one traversal."""
+    return _extract(itr_json)
+
+def extract_itr_raw(raw_data: Union[bytes, str]) -> dict:
+    """Same as extract_itr, for a filing's stored payload (compressed blob or legacy JSON text)."""
+    itr_json = artifact_codec.decode(raw_data) if isinstance(raw_data, bytes) else json.loads(raw_data)
+    return _extract(itr_json)
+
+def gross_income(fields: Mapping) -> float:
+    """
+    GrossTotIncome, or for returns without it (seeded / legacy JSON) TotalIncome plus
+    the chapter VI-A deductions.
+    """
+    if fields["gross_total_income"]:
+        return fields["gross_total_income"]
+    return fields["total_income"] + fields["deductions_80c"] + fields["deductions_80d"] + fields["deductions_80ccd_1b"]
+
+def full_name(fields: Mapping) -> str:
+    parts = [fields.get("first_name"), fields.get("middle_name"), fields.get("last_name")]
+    return " ".join(str(p).strip() for p in parts if p and str(p).strip())
+
+def format_address(fields: Mapping) -> str:
+    parts = [
+        fields.get("residence_no"),
+        fields.get("residence_name"),
+        fields.get("road_or_street"),
+        fields.get("locality_or_area"),
+        fields.get("city_or_town"),
+        fields.get("pin_code"),
+    ]
+    return ", ".join(str(p) for p in parts if p)
+
+def format_phone(fields: Mapping) -> str:
+    mobile_no = fields.get("mobile_no")
+    if not mobile_no:
+        return ""
+    return f"+{fields.get('country_code_mobile') or 91} {mobile_no}"
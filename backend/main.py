@@ -1,12 +1,14 @@
 
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from . import models, database
-from .routers import auth, dashboard, data_receiver, profile, history, sync
+from . import models, database, rule_engine
+from .routers import auth, dashboard, data_receiver, profile, history, sync, jobs, debug, tax
+from .services import job_pool
 from .database import engine
 
 # Create Tables (for MVP, instead of Alembic for now)
 # Create Tables (for MVP, instead of Alembic for now)
+# Existing databases are upgraded once per deploy with `python -m backend.tools.migrate`
 models.Base.metadata.create_all(bind=engine)
 
 import logging
@@ -36,6 +38,14 @@ app.include_router(data_receiver.router)
 app.include_router(profile.router)
 app.include_router(history.router)
 app.include_router(sync.router)
+app.include_router(jobs.router)
+if rule_engine.RULE_TRACE: # debug routes expose process-wide rule stats; dev only
+    app.include_router(debug.router)
+app.include_router(tax.router)
+
+@app.on_event("shutdown")
+def stop_job_pool():
+    job_pool.shutdown()
 
 @app.get("/api/health")
 def health_check():
@@ -1,7 +1,9 @@
 
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, Text, Date
-from sqlalchemy.orm import relationship
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, Text, Date, LargeBinary, Index
+from sqlalchemy.orm import relationship, deferred
 from .database import Base
+from . import artifact_codec
+import json
 from datetime import datetime
 
 class User(Base):
@@ -14,11 +16,15 @@ class User(Base):
     dob = Column(String) # DD-MM-YYYY format to match frontend
     questionnaire_data = Column(Text) # JSON string of user answers
     ao_details = Column(Text) # JSON string: {area_code, ao_type, range_code, ao_num, city, jurisdiction}
+    rules_fingerprint = Column(String) # Hash of rules_inputs
+    rules_inputs = Column(Text) # JSON inputs of the last stored rule evaluation, see itr_service.rule_inputs
     created_at = Column(String, default=datetime.utcnow().isoformat())
     
     # Relationships
     itr_filings = relationship("ITR_Filing", back_populates="user")
     ais_entries = relationship("AIS_Entry", back_populates="user")
+    ais_aggregates = relationship("AIS_Aggregate", back_populates="user")
+    ais_snapshots = relationship("AIS_Snapshot", back_populates="user")
     risks = relationship("Risk", back_populates="user")
     opportunities = relationship("Opportunity", back_populates="user")
     advance_tax = relationship("AdvanceTax", back_populates="user")
@@ -29,7 +35,7 @@ class ITR_Filing(Base):
     __tablename__ = "itr_filings"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_pan = Column(String, ForeignKey("users.pan"))
+    user_pan = Column(String, ForeignKey("users.pan"), index=True)
     ack_num = Column(String, unique=True, index=True)
     ay = Column(String)
     filing_date = Column(String)
@@ -41,10 +47,42 @@ class ITR_Filing(Base):
     status = Column(String, default="Filed") # Filed, Processed, Defective
     refund_amount = Column(String, default="0") # Stored as string to handle "—" or currency
     
-    raw_data = Column(Text)
+    # Normalized fields extracted at ingest (see itr_extractor), so hot paths never parse raw_data
+    fields_extracted = Column(Boolean, default=False)
+    gross_total_income = Column(Float)
+    tax_paid = Column(Float)
+    house_property_income = Column(Float)
+    capital_gains_stcg = Column(Float)
+    capital_gains_ltcg = Column(Float)
+    deductions_80c = Column(Float)
+    deductions_80d = Column(Float)
+    deductions_80ccd_1b = Column(Float)
+    tds_claimed = Column(Float)
+    residential_status = Column(String)
+    opt_out_new_regime = Column(String)
+    opt_in_new_regime = Column(String)
+    assessee_name = Column(String)
+    assessee_dob = Column(String)
+    address = Column(String)
+    phone = Column(String)
+    email = Column(String)
+    
+    # Full return JSON, compressed (see artifact_codec); only loaded on explicit reprocess
+    content_hash = Column(String, index=True) # artifact_codec.content_hash of the ITR JSON
+    raw_blob = deferred(Column(LargeBinary))
+    raw_data = deferred(Column(Text)) # Legacy uncompressed JSON, migrated to raw_blob on reprocess
     
     user = relationship("User", back_populates="itr_filings")
 
+    @property
+    def raw_json(self) -> dict:
+        """Decompresses and parses the stored return on first access."""
+        if self.raw_blob:
+            return artifact_codec.decode(self.raw_blob)
+        if self.raw_data:
+            return json.loads(self.raw_data)
+        return {}
+
 class Notice(Base):
     __tablename__ = "notices"
     
@@ -61,22 +99,73 @@ class Notice(Base):
 
 class AIS_Entry(Base):
     __tablename__ = "ais_entries"
+    __table_args__ = (Index("ix_ais_entries_pan_security", "user_pan", "security"),) # FIFO lot lookups
 
     id = Column(Integer, primary_key=True, index=True)
-    user_pan = Column(String, ForeignKey("users.pan"))
-    fy = Column(String)
+    user_pan = Column(String, ForeignKey("users.pan"), index=True)
+    fy = Column(String, index=True)
     category = Column(String)
     description = Column(String)
     amount = Column(Float)
     source = Column(String)
+    date = Column(String)
+    security = Column(String, nullable=True) # ISIN / scrip of securities purchases and sales
+    quantity = Column(Float, nullable=True) # units traded; set on entries usable for FIFO lots
+    entry_key = Column(String, index=True) # Natural key, see sync_service.ais_entry_key
     
     user = relationship("User", back_populates="ais_entries")
 
+class AIS_Aggregate(Base):
+    """
+    Running totals of AIS_Entry rows per (PAN, FY, category), maintained at ingest
+    (see sync_service) so the rule engine never has to scan raw AIS rows.
+    """
+    __tablename__ = "ais_aggregates"
+    __table_args__ = (Index("ix_ais_aggregates_pan_fy_category", "user_pan", "fy", "category", unique=True),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_pan = Column(String, ForeignKey("users.pan"))
+    fy = Column(String)
+    category = Column(String)
+    total_amount = Column(Float, default=0.0)
+    entry_count = Column(Integer, default=0)
+
+    user = relationship("User", back_populates="ais_aggregates")
+
+class AIS_Snapshot(Base):
+    """
+    Content hash of each ingested AIS document and the FYs it covered.
+    A snapshot is dropped once a later one covers any of its FYs, so a matching hash
+    here means the stored entries still reflect that document.
+    """
+    __tablename__ = "ais_snapshots"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_pan = Column(String, ForeignKey("users.pan"), index=True)
+    content_hash = Column(String, index=True)
+    fys = Column(Text) # JSON list of financial years
+    entry_count = Column(Integer, default=0)
+    ingested_at = Column(String, default=lambda: datetime.utcnow().isoformat())
+
+    user = relationship("User", back_populates="ais_snapshots")
+
+class IdempotencyRecord(Base):
+    """Stored response of an /api/data/upload call, replayed for a repeated Idempotency-Key."""
+    __tablename__ = "idempotency_records"
+    __table_args__ = (Index("ix_idempotency_records_pan_key", "user_pan", "key", unique=True),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_pan = Column(String, ForeignKey("users.pan"))
+    key = Column(String)
+    request_hash = Column(String)
+    response = Column(Text) # JSON
+    created_at = Column(String, default=lambda: datetime.utcnow().isoformat())
+
 class Risk(Base):
     __tablename__ = "risks"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_pan = Column(String, ForeignKey("users.pan"))
+    user_pan = Column(String, ForeignKey("users.pan"), index=True)
     ay = Column(String) # Added for Frontend
     risk_code = Column(String)
     title = Column(String) # mapped to 'wrong'
@@ -91,7 +180,7 @@ class Opportunity(Base):
     __tablename__ = "opportunities"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_pan = Column(String, ForeignKey("users.pan"))
+    user_pan = Column(String, ForeignKey("users.pan"), index=True)
     ay = Column(String) # Added for Frontend
     opp_code = Column(String)
     title = Column(String) # mapped to 'opportunity'
@@ -104,7 +193,7 @@ class AdvanceTax(Base):
     __tablename__ = "advance_tax"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_pan = Column(String, ForeignKey("users.pan"))
+    user_pan = Column(String, ForeignKey("users.pan"), index=True)
     quarter = Column(String) # Q1, Q2, etc
     section = Column(String)
     due_date = Column(String)
@@ -124,5 +213,7 @@ class TDS_Entry(Base):
     date = Column(String)
     tds_amount = Column(String)
     total_amount = Column(String)
+    fy = Column(String)
+    entry_key = Column(String, index=True) # Natural key of the source AIS transaction
 
     user = relationship("User", back_populates="tds_entries")
@@ -1,17 +1,23 @@
 
 from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, Form
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from .. import models, schemas, database, auth_utils
+from .. import models, schemas, database, auth_utils, artifact_codec
 from fastapi.security import OAuth2PasswordRequestForm
 from datetime import timedelta
+from typing import Optional, Tuple
+import logging
 
 router = APIRouter(
     prefix="/api/auth",
     tags=["Authentication"]
 )
 
-@router.post("/login", response_model=schemas.Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), questionnaire_data: str = Form(None), db: Session = Depends(database.get_db)):
+def _authenticate(form_data: OAuth2PasswordRequestForm, questionnaire_data: Optional[str], db: Session) -> Tuple[str, bool]:
+    """
+    Checks the credentials and stores the questionnaire sent with them: (pan, is_demo).
+    Synchronous (password hashing, database), so login runs it on the threadpool.
+    """
     # 1. DEMO MODE CHECK
     if form_data.username == "ABCDE1234F" and form_data.password == "demo123":
         # Ensure Demo User Exists in DB with Frontend required fields
@@ -31,8 +37,8 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), questionnaire_data:
         # Populate Mock Data for Dashboard if empty
         if not user.risks:
             # Add Mock Risks
-            db.add(models.Risk(user_pan=user.pan, ay="2023-24", title="Mismatch in TDS claimed vs Form 26AS", severity="High", description="TDS amount claimed ₹12,000 more than reflected in 26AS", solutions='["Verify Form 26AS", "File rectification"]', amount_involved=12000))
-            db.add(models.Risk(user_pan=user.pan, ay="2022-23", title="Interest income not declared", severity="Med", description="FD interest of ₹45,000 from SBI not reported", solutions='["File revised return"]', amount_involved=45000))
+            db.add(models.Risk(user_pan=user.pan, ay="2023-24", title="Mismatch in TDS claimed vs Form 26AS", severity="High", description="TDS amount claimed ₹12,000 more than reflected in 26AS", solutions='["Verify Form 26AS", "File rectification"]', amount_involved=12000, risk_code="RISK_TDS_OVERCLAIM"))
+            db.add(models.Risk(user_pan=user.pan, ay="2022-23", title="Interest income not declared", severity="Med", description="FD interest of ₹45,000 from SBI not reported", solutions='["File revised return"]', amount_involved=45000, risk_code="RISK_INTEREST_UNDECLARED"))
             
             # Add Mock Opportunities
             db.add(models.Opportunity(user_pan=user.pan, ay="2023-24", title="Section 80C – PPF contribution not claimed", description="Missed deduction", potential_savings=46800))
@@ -45,7 +51,6 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), questionnaire_data:
             
             # Add Mock ITR Filing (For Profile Page)
             # We construct a minimal JSON that matches the structure expected by profile.py
-            import json
             mock_itr_json = {
                 "ITR": {
                     "ITR2": {
@@ -95,17 +100,17 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), questionnaire_data:
                 itr_type="ITR-2",
                 status="Filed",
                 refund_amount="0",
-                raw_data=json.dumps(mock_itr_json)
+                raw_blob=artifact_codec.encode(mock_itr_json)
             ))
             
             # Seed Past ITRs
             db.add(models.ITR_Filing(
                 user_pan=user.pan, ack_num="DEMO_REC_24", ay="2024-25", filing_date="2024-07-31", 
-                total_income=1400000, tax_payable=120000, itr_type="ITR-1", status="Processed", refund_amount="₹12,400", raw_data="{}"
+                total_income=1400000, tax_payable=120000, itr_type="ITR-1", status="Processed", refund_amount="₹12,400", raw_blob=artifact_codec.encode({})
             ))
             db.add(models.ITR_Filing(
                 user_pan=user.pan, ack_num="DEMO_REC_23", ay="2023-24", filing_date="2023-07-31", 
-                total_income=1300000, tax_payable=100000, itr_type="ITR-1", status="Processed", refund_amount="0", raw_data="{}"
+                total_income=1300000, tax_payable=100000, itr_type="ITR-1", status="Processed", refund_amount="0", raw_blob=artifact_codec.encode({})
             ))
 
             # Seed Notices
@@ -120,8 +125,7 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), questionnaire_data:
             
             db.commit()
 
-        access_token = auth_utils.create_access_token(data={"sub": user.pan})
-        return {"access_token": access_token, "token_type": "bearer"}
+        return user.pan, True
 
     # 2. LOCAL AUTH ONLY (Login)
     user = db.query(models.User).filter(models.User.pan == form_data.username.upper()).first()
@@ -139,20 +143,33 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), questionnaire_data:
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # 3. TRIGGER RULE ENGINE (Refresh Risks/Opportunities on Login)
-    from ..services import itr_service
-    # Run in background to not block login? Or synchronously? 
-    # Synchronously is better for immediate dashboard update if fast (<1s).
-    itr_service.run_rules_for_user(db, user.pan)
-    
-    # Update Questionnaire Data if provided
+    # Update Questionnaire Data if provided (before the refresh, so it evaluates the new answers)
     if questionnaire_data:
          user.questionnaire_data = questionnaire_data
          db.commit()
+    return user.pan, False
+
+@router.post("/login", response_model=schemas.Token)
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), questionnaire_data: str = Form(None), db: Session = Depends(database.get_db)):
+    pan, is_demo = await run_in_threadpool(_authenticate, form_data, questionnaire_data, db)
+    if is_demo:
+        access_token = auth_utils.create_access_token(data={"sub": pan})
+        return {"access_token": access_token, "token_type": "bearer"}
+
+    # 3. TRIGGER RULE ENGINE (Refresh Risks/Opportunities on Login)
+    from ..services import itr_service, job_pool
+    # Runs in the job pool and is awaited on the event loop (no thread held) for at most
+    # JOB_INTERACTIVE_WAIT_SECONDS, so the dashboard is usually current without slowing
+    # login down. A longer or skipped (pool saturated) refresh just finishes later: the
+    # next evaluation still picks up everything that changed.
+    try:
+        await job_pool.get_pool().run_async(itr_service.run_rules_job, pan, timeout=job_pool.JOB_INTERACTIVE_WAIT_SECONDS)
+    except job_pool.PoolBusy:
+        logging.warning(f"Job pool busy, rule refresh on login skipped for {pan}")
 
     access_token_expires = timedelta(minutes=auth_utils.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = auth_utils.create_access_token(
-        data={"sub": user.pan}, expires_delta=access_token_expires
+        data={"sub": pan}, expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
@@ -1,7 +1,11 @@
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Header
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from .. import models, schemas, database, rule_engine
+from sqlalchemy.exc import IntegrityError
+from typing import Optional, Union
+from .. import models, schemas, database, rule_engine, artifact_codec
+from ..services import job_pool
 import json
 
 router = APIRouter(
@@ -10,33 +14,92 @@ router = APIRouter(
 )
 
 # Pydantic model for incoming data (flexible for now)
-from pydantic import BaseModel, Json
+from pydantic import BaseModel
 class ScrapedData(BaseModel):
     pan: str
-    itr_data: Json 
+    itr_data: Union[dict, str] # JSON object, or JSON text parsed in the job pool
     ais_data: list # List of dicts
 
-@router.post("/upload")
-def upload_scraped_data(data: ScrapedData, db: Session = Depends(database.get_db)):
-    # 1. Find or Create User
-    user = db.query(models.User).filter(models.User.pan == data.pan).first()
-    if not user:
-        # Create user (Password would be set later or via email flow in real app)
-        user = models.User(pan=data.pan, name="Scraped User", password_hash="TEMP_HASH") 
-        db.add(user)
-        db.commit()
-    
-    # 2. Process ITR Data via Service
-    from ..services import itr_service
-    
+def ingest_upload(pan: str, itr_data, ais_data: list, idempotency_key: Optional[str] = None) -> dict:
+    """
+    Parses and ingests an upload; runs as a job_pool job with its own session.
+    Returns {"status_code", "body"} of the HTTP response.
+    """
     # Check if itr_data is string or dict
-    itr_json = data.itr_data
+    itr_json = itr_data
     if isinstance(itr_json, str):
-        itr_json = json.loads(itr_json)
+        try:
+            itr_json = json.loads(itr_json)
+        except ValueError as e:
+            return {"status_code": 400, "body": {"detail": f"Error processing data: invalid itr_data JSON ({e})"}}
+
+    db = database.SessionLocal()
+    try:
+        # 0. Replay the stored response for a repeated Idempotency-Key
+        request_hash = None
+        if idempotency_key:
+            request_hash = artifact_codec.content_hash({"pan": pan, "itr_data": itr_json, "ais_data": ais_data})
+            record = db.query(models.IdempotencyRecord).filter(
+                models.IdempotencyRecord.user_pan == pan,
+                models.IdempotencyRecord.key == idempotency_key
+            ).first()
+            if record:
+                if record.request_hash != request_hash:
+                    return {"status_code": 422, "body": {"detail": "Idempotency-Key was already used with a different payload"}}
+                return {"status_code": 200, "body": json.loads(record.response)}
+
+        # 1. Find or Create User
+        user = db.query(models.User).filter(models.User.pan == pan).first()
+        if not user:
+            # Create user (Password would be set later or via email flow in real app)
+            user = models.User(pan=pan, name="Scraped User", password_hash="TEMP_HASH") 
+            db.add(user)
+            db.commit()
+        
+        # 2. Process ITR Data via Service
+        from ..services import itr_service
+        success, message = itr_service.process_itr_data(db, pan, itr_json)
         
-    success, message = itr_service.process_itr_data(db, data.pan, itr_json)
-    
-    if not success:
-        raise HTTPException(status_code=400, detail=f"Error processing data: {message}")
+        if not success:
+            return {"status_code": 400, "body": {"detail": f"Error processing data: {message}"}}
+
+        response = {"status": "success", "message": "Data ingested and analyzed successfully"}
+        if idempotency_key:
+            db.add(models.IdempotencyRecord(
+                user_pan=pan, key=idempotency_key, request_hash=request_hash, response=json.dumps(response)
+            ))
+            try:
+                db.commit()
+            except IntegrityError:
+                # A concurrent request with the same key stored its response first
+                db.rollback()
+        return {"status_code": 200, "body": response}
+    finally:
+        db.close()
+
+@router.post("/upload")
+async def upload_scraped_data(
+    data: ScrapedData,
+    wait: bool = True,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    # Parsing, extraction and evaluation run in the job pool, awaited on the event loop
+    # so no API thread is held. wait=false (or a job outliving JOB_WAIT_SECONDS) answers
+    # 202 with a job handle.
+    try:
+        job = await job_pool.get_pool().run_async(
+            ingest_upload, data.pan, data.itr_data, data.ais_data, idempotency_key,
+            timeout=job_pool.JOB_WAIT_SECONDS if wait else 0
+        )
+    except job_pool.PoolBusy:
+        raise HTTPException(
+            status_code=503, detail="Too many uploads in progress, retry later",
+            headers={"Retry-After": str(job_pool.RETRY_AFTER_SECONDS)}
+        )
 
-    return {"status": "success", "message": "Data ingested and analyzed successfully"}
+    if not job.done:
+        return JSONResponse(status_code=202, content={"status": "accepted", "job_id": job.id, "status_url": f"/api/jobs/{job.id}"})
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=f"Error processing data: {job.future.exception()}")
+    outcome = job.result()
+    return JSONResponse(status_code=outcome["status_code"], content=outcome["body"])
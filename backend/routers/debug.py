@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from .. import models, database, auth_utils, rule_engine
+from ..services import itr_service
+
+router = APIRouter(
+    prefix="/api/debug",
+    tags=["Debug"]
+)
+
+@router.get("/rules/trace")
+def trace_rules(current_user: models.User = Depends(auth_utils.get_current_user), db: Session = Depends(database.get_db)):
+    """Re-runs every rule for the current user in trace mode (nothing is stored)."""
+    trace = itr_service.trace_rules_for_user(db, current_user.pan)
+    db.rollback() # legacy filings may have been re-extracted on the way; this is a read-only view
+    if trace is None:
+        raise HTTPException(status_code=404, detail="No ITR found for this user")
+    return trace
+
+@router.get("/rules/stats")
+def rule_stats(current_user: models.User = Depends(auth_utils.get_current_user)):
+    """Per-rule counters of all traced evaluations since startup, slowest rules first."""
+    return {"tracing": rule_engine.RULE_TRACE, "rules": rule_engine.RULE_STATS.summary()}
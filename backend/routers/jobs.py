@@ -0,0 +1,16 @@
+
+from fastapi import APIRouter, HTTPException
+from ..services import job_pool
+
+router = APIRouter(
+    prefix="/api/jobs",
+    tags=["Jobs"]
+)
+
+@router.get("/{job_id}")
+def get_job(job_id: str):
+    # Job ids are random and only handed to the client that submitted the job
+    job = job_pool.get_pool().get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job.to_dict()
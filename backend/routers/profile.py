@@ -1,5 +1,6 @@
 
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from .. import models, schemas, database, auth_utils
 import json
@@ -22,6 +23,9 @@ def delete_account(
         db.query(models.Opportunity).filter(models.Opportunity.user_pan == current_user.pan).delete()
         db.query(models.ITR_Filing).filter(models.ITR_Filing.user_pan == current_user.pan).delete()
         db.query(models.AIS_Entry).filter(models.AIS_Entry.user_pan == current_user.pan).delete()
+        db.query(models.AIS_Aggregate).filter(models.AIS_Aggregate.user_pan == current_user.pan).delete()
+        db.query(models.AIS_Snapshot).filter(models.AIS_Snapshot.user_pan == current_user.pan).delete()
+        db.query(models.IdempotencyRecord).filter(models.IdempotencyRecord.user_pan == current_user.pan).delete()
         db.query(models.AdvanceTax).filter(models.AdvanceTax.user_pan == current_user.pan).delete()
         db.query(models.TDS_Entry).filter(models.TDS_Entry.user_pan == current_user.pan).delete()
         db.query(models.Notice).filter(models.Notice.user_pan == current_user.pan).delete()
@@ -61,73 +65,39 @@ def get_user_profile(
              ao_details.update(saved_ao)
         except: pass
 
-    if itr and itr.raw_data:
+    if itr:
         try:
-            itr_json = json.loads(itr.raw_data)
-            itr_root = itr_json.get("ITR", {})
+            # Normalized columns are written at ingest; older filings are reprocessed once
+            if not itr.fields_extracted:
+                from ..services import itr_service
+                itr_service.reprocess_filing(db, itr)
+                db.commit()
             
-            # Detect ITR form type
-            form_type = next(iter(itr_root)) if itr_root else "Unknown"
-            form_data = itr_root.get(form_type, {})
-            
-            # Extract personal info based on form type
-            if "ITR1" in form_type or "ITR4" in form_type:
-                # ITR1/ITR4 Structure: PersonalInfo is directly under form
-                personal_info = form_data.get("PersonalInfo", {})
-            else:
-                # ITR2/ITR3 Structure: PersonalInfo is under PartA_GEN1
-                personal_info = form_data.get("PartA_GEN1", {}).get("PersonalInfo", {})
-            
-            # Extract name
-            assessee_name = personal_info.get("AssesseeName", {})
-            first_name = assessee_name.get("FirstName", "")
-            middle_name = assessee_name.get("MiddleName", "")
-            last_name = assessee_name.get("SurNameOrOrgName", "")
-            full_name = f"{first_name} {middle_name} {last_name}".strip()
-            if full_name:
-                name = full_name
+            # Name
+            if itr.assessee_name:
+                name = itr.assessee_name
                 # Update user record if name is missing or generic
                 if not current_user.name or current_user.name == "Scraped User":
                     current_user.name = name
                     db.add(current_user)
                     db.commit()
             
-            # Extract DOB
-            if personal_info.get("DOB"):
-                dob = personal_info.get("DOB")
+            # DOB
+            if itr.assessee_dob:
+                dob = itr.assessee_dob
                 # Update user record if DOB is missing
                 if not current_user.dob:
                     current_user.dob = dob
                     db.add(current_user)
                     db.commit()
             
-            # Extract Address
-            addr_obj = personal_info.get("Address", {})
-            parts = [
-                addr_obj.get("ResidenceNo"),
-                addr_obj.get("ResidenceName"),
-                addr_obj.get("RoadOrStreet"),
-                addr_obj.get("LocalityOrArea"),
-                addr_obj.get("CityOrTownOrDistrict"),
-            ]
-            pin_code = addr_obj.get("PinCode")
-            if pin_code:
-                parts.append(str(pin_code))
-            
-            address_str = ", ".join([str(p) for p in parts if p])
-            if address_str:
-                address = address_str
-            
-            # Extract Phone
-            country_code = addr_obj.get("CountryCodeMobile", 91)
-            mobile_no = addr_obj.get("MobileNo", "")
-            if mobile_no:
-                phone = f"+{country_code} {mobile_no}"
-            
-            # Extract Email
-            email_addr = addr_obj.get("EmailAddress", "")
-            if email_addr:
-                email = email_addr
+            # Address, Phone & Email
+            if itr.address:
+                address = itr.address
+            if itr.phone:
+                phone = itr.phone
+            if itr.email:
+                email = itr.email
 
         except Exception as e:
             logging.error(f"Profile parse error: {e}", exc_info=True)
@@ -147,20 +117,31 @@ def get_user_profile(
 class QuestionnaireUpdate(schemas.BaseModel):
     items: dict
 
+def _save_questionnaire(db: Session, user: models.User, items: dict):
+    user.questionnaire_data = json.dumps(items)
+    db.add(user)
+    db.commit()
+
 @router.put("/questionnaire")
-def update_questionnaire(
+async def update_questionnaire(
     data: QuestionnaireUpdate,
     current_user: models.User = Depends(auth_utils.get_current_user),
     db: Session = Depends(database.get_db)
 ):
+    pan = current_user.pan # read before the commit expires the instance
     try:
-        current_user.questionnaire_data = json.dumps(data.items)
-        db.add(current_user)
-        db.commit()
+        await run_in_threadpool(_save_questionnaire, db, current_user, data.items)
         
-        # Re-run Rules to update Dashboard immediately
-        from ..services import itr_service
-        itr_service.run_rules_for_user(db, current_user.pan)
+        # Re-run Rules to update Dashboard (in the job pool), waiting briefly on the event loop
+        from ..services import itr_service, job_pool
+        try:
+            job = await job_pool.get_pool().run_async(
+                itr_service.run_rules_job, pan, timeout=job_pool.JOB_INTERACTIVE_WAIT_SECONDS
+            )
+        except job_pool.PoolBusy:
+            return {"status": "success", "message": "Profile updated successfully; analysis will refresh on your next login or sync"}
+        if not job.done:
+            return {"status": "success", "message": "Profile updated successfully; analysis is refreshing", "job_id": job.id}
         
         return {"status": "success", "message": "Profile updated successfully"}
     except Exception as e:
@@ -115,52 +115,52 @@ def run_automation_workflow(workflow_name: str, user_pan: str, password: str, db
         with open(results_file, 'r') as f:
             results_data = json.load(f)
         
-        # Dispatch to appropriate service
-        if workflow_name == "filed_returns":
-             # Existing logic for ITR
-             count = 0
-             for item in results_data:
-                 if "file" in item and item["file"].endswith(".json"):
-                     try:
-                         with open(item["file"], 'r') as jf:
-                             data = json.load(jf)
-                         success, msg = itr_service.process_itr_data(db, user_pan, data)
-                         if success: count += 1
-                     except Exception as e:
-                         logging.error(f"Failed to process ITR file {item.get('file')}: {e}")
-             logging.info(f"Ingested {count} ITR files.")
-
-        elif workflow_name == "ais_download":
-            # AIS Download workflow saves file paths in results.json
-            count = 0
-            for item in results_data:
-                file_path = item.get("file")
-                if file_path and os.path.exists(file_path):
-                     try:
-                         # AIS download usually gives a JSON file if we selected JSON button
-                         # We try to read it
-                         with open(file_path, 'r') as af:
-                             ais_content = json.load(af)
-                         success, msg = sync_service.process_ais_data(db, user_pan, ais_content)
-                         if success: count += 1
-                     except json.JSONDecodeError:
-                         logging.error(f"Failed to parse AIS JSON {file_path}")
-                     except Exception as e:
-                         logging.error(f"Failed to process AIS file {file_path}: {e}")
-            logging.info(f"Ingested {count} AIS files.")
-
-        elif workflow_name == "form_26as":
-            for item in results_data:
-                if "file" in item:
-                    sync_service.process_26as_file(db, user_pan, item["file"])
-
-        elif workflow_name == "eproceedings":
-            for item in results_data:
-                if "file" in item:
-                    sync_service.process_eproceedings_file(db, user_pan, item["file"])
+        # All artifacts of this run are ingested in one transaction with a single
+        # rule evaluation per user (deferred further if the caller opened a rule_batch)
+        with itr_service.rule_batch(db):
+            # Dispatch to appropriate service
+            if workflow_name == "filed_returns":
+                 # Existing logic for ITR
+                 count = 0
+                 for item in results_data:
+                     if "file" in item and item["file"].endswith(".json"):
+                         try:
+                             with open(item["file"], 'r') as jf:
+                                 data = json.load(jf)
+                             success, msg = itr_service.process_itr_data(db, user_pan, data)
+                             if success: count += 1
+                         except Exception as e:
+                             logging.error(f"Failed to process ITR file {item.get('file')}: {e}")
+                 logging.info(f"Ingested {count} ITR files.")
+
+            elif workflow_name == "ais_download":
+                # AIS Download workflow saves file paths in results.json
+                count = 0
+                for item in results_data:
+                    file_path = item.get("file")
+                    if file_path and os.path.exists(file_path):
+                         try:
+                             # AIS download usually gives a JSON file if we selected JSON button
+                             # It is parsed incrementally, so large files are never fully loaded
+                             success, msg = sync_service.process_ais_file(db, user_pan, file_path)
+                             if success: count += 1
+                             else: logging.error(f"Failed to ingest AIS file {file_path}: {msg}")
+                         except Exception as e:
+                             logging.error(f"Failed to process AIS file {file_path}: {e}")
+                logging.info(f"Ingested {count} AIS files.")
+
+            elif workflow_name == "form_26as":
+                for item in results_data:
+                    if "file" in item:
+                        sync_service.process_26as_file(db, user_pan, item["file"])
+
+            elif workflow_name == "eproceedings":
+                for item in results_data:
+                    if "file" in item:
+                        sync_service.process_eproceedings_file(db, user_pan, item["file"])
         
-        elif workflow_name == "verify_credentials":
-            logging.info("Credentials verification successful.")
+            elif workflow_name == "verify_credentials":
+                logging.info("Credentials verification successful.")
             
         return True, "Success"
 
@@ -184,28 +184,33 @@ def bg_sync_all(user_pan: str, password: str):
     """
     db = database.SessionLocal()
     try:
-        # 1. Verify Credentials
-        update_sync_state(user_pan, "Verify", "Verifying credentials...")
-        success, msg = run_automation_workflow("verify_credentials", user_pan, password, db)
-        if not success:
-             update_sync_state(user_pan, "Verify", msg, "failed")
-             return
-        
-        # 2. ITR
-        update_sync_state(user_pan, "ITR", "Fetching Income Tax Returns...")
-        run_automation_workflow("filed_returns", user_pan, password, db)
-        
-        # 3. AIS
-        update_sync_state(user_pan, "AIS", "Downloading AIS/TIS data...")
-        run_automation_workflow("ais_download", user_pan, password, db)
-        
-        # 4. Form 26AS
-        update_sync_state(user_pan, "26AS", "Downloading Form 26AS...")
-        run_automation_workflow("form_26as", user_pan, password, db)
-        
-        # 5. Notices
-        update_sync_state(user_pan, "Notices", "Checking for Notices...")
-        run_automation_workflow("eproceedings", user_pan, password, db)
+        # Rules are evaluated once, after every workflow has been ingested
+        with itr_service.rule_batch(db):
+            # 1. Verify Credentials
+            update_sync_state(user_pan, "Verify", "Verifying credentials...")
+            success, msg = run_automation_workflow("verify_credentials", user_pan, password, db)
+            if not success:
+                 update_sync_state(user_pan, "Verify", msg, "failed")
+                 return
+            
+            # 2. ITR
+            update_sync_state(user_pan, "ITR", "Fetching Income Tax Returns...")
+            run_automation_workflow("filed_returns", user_pan, password, db)
+            
+            # 3. AIS
+            update_sync_state(user_pan, "AIS", "Downloading AIS/TIS data...")
+            run_automation_workflow("ais_download", user_pan, password, db)
+            
+            # 4. Form 26AS
+            update_sync_state(user_pan, "26AS", "Downloading Form 26AS...")
+            run_automation_workflow("form_26as", user_pan, password, db)
+            
+            # 5. Notices
+            update_sync_state(user_pan, "Notices", "Checking for Notices...")
+            run_automation_workflow("eproceedings", user_pan, password, db)
+
+            # 6. Rule Engine (runs when the batch closes)
+            update_sync_state(user_pan, "Analyze", "Analyzing your tax data...")
         
         update_sync_state(user_pan, "Complete", "All syncs completed successfully.", "completed")
         logging.info("All sync workflows completed.")
@@ -0,0 +1,46 @@
+import time
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from .. import models, database, auth_utils, schemas, rule_engine, tax_engine
+from ..services import itr_service
+
+router = APIRouter(
+    prefix="/api/tax",
+    tags=["Tax"]
+)
+
+MAX_SCENARIOS = 10000 # per request, so one call stays within a few milliseconds
+
+@router.post("/what-if")
+def what_if(request: schemas.WhatIfRequest, current_user: models.User = Depends(auth_utils.get_current_user),
+            db: Session = Depends(database.get_db)):
+    """
+    Tax on the current user's latest return for every combination of the requested extra
+    80C / 80D / NPS amounts and regimes, with the savings against the tax as filed.
+    """
+    count = len(request.regimes) * len(request.extra_80c) * len(request.extra_80d) * len(request.extra_nps)
+    if count > MAX_SCENARIOS:
+        raise HTTPException(status_code=400, detail=f"Too many scenarios ({count}); at most {MAX_SCENARIOS} per request")
+    latest = itr_service.load_latest_itr(db, current_user.pan)
+    db.rollback() # legacy filings may have been re-extracted on the way; this is a read-only view
+    if latest is None:
+        raise HTTPException(status_code=404, detail="No ITR found for this user")
+    ay, raw_itr = latest
+
+    start = time.perf_counter()
+    base = rule_engine.tax_base(raw_itr)
+    filed = tax_engine.REGIMES[rule_engine.filed_regime(raw_itr)]
+    current = tax_engine.what_if(regime=[tax_engine.OLD, tax_engine.NEW], **base)["total"].tolist()
+    current = dict(zip(tax_engine.REGIMES, current))
+    grid = tax_engine.what_if_grid(
+        base, request.extra_80c, request.extra_80d, request.extra_nps,
+        regimes=[tax_engine.regime_index(regime) for regime in request.regimes],
+    )
+    columns = [grid[key].tolist() for key in ("regime", "extra_80c", "extra_80d", "extra_nps", "total")]
+    scenarios = [
+        {"regime": tax_engine.REGIMES[regime], "extra_80c": extra_80c, "extra_80d": extra_80d, "extra_nps": extra_nps,
+         "tax": tax, "savings": current[filed] - tax}
+        for regime, extra_80c, extra_80d, extra_nps, tax in zip(*columns)
+    ]
+    elapsed = (time.perf_counter() - start) * 1000
+    return {"ay": ay, "filed_regime": filed, "current": current, "scenarios": scenarios, "timings": {"what_if": elapsed}}
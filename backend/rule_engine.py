@@ -1,56 +1,574 @@
+import hashlib
 import json
+import os
+import time
 import logging
+import threading
 from typing import List, Dict, Optional
 from datetime import date
+from functools import lru_cache
+import numpy as np
+from . import itr_extractor, ais_classifier, capital_gains, tax_engine
 
 # ==========================================
 # 1. Data Models (Standardized Objects)
 # ==========================================
+# Slotted (no per-instance __dict__) and immutable once built: the batch engine keeps
+# thousands of them alive at once, and a record shared between engines, tables and
+# traces can never be changed under them.
 
-class RawITR:
+class _FrozenRecord:
+    """Base of the engine's records; subclasses list their fields in __slots__ and set them with _init."""
+    __slots__ = ()
+
+    def _init(self, **fields):
+        for name, value in fields.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    # Pickling (process pools) goes through _init, since __setattr__ is blocked
+    def __getstate__(self):
+        return self.to_dict()
+
+    def __setstate__(self, state):
+        self._init(**state)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{name}={value!r}' for name, value in self.to_dict().items())})"
+
+class RawITR(_FrozenRecord):
     """Standardized ITR Data Object"""
+    __slots__ = (
+        "ay", "total_income", "tax_payable", "tax_paid", "house_property_income",
+        "capital_gains_stcg", "capital_gains_ltcg", "deductions_80c", "deductions_80d",
+        "deductions_80ccd_1b", "tds_claimed", "residential_status", "opt_out_new_regime",
+        "opt_in_new_regime",
+    )
+
     def __init__(self, ay, total_income, tax_payable, tax_paid, 
                  house_property_income=0, capital_gains_stcg=0, capital_gains_ltcg=0,
                  deductions_80c=0, deductions_80d=0, deductions_80ccd_1b=0, tds_claimed=0,
-                 residential_status="RES", opt_out_new_regime="N"):
-        self.ay = ay
-        self.total_income = float(total_income)
-        self.tax_payable = float(tax_payable)
-        self.tax_paid = float(tax_paid)
-        self.house_property_income = float(house_property_income)
-        self.capital_gains_stcg = float(capital_gains_stcg)
-        self.capital_gains_ltcg = float(capital_gains_ltcg)
-        self.deductions_80c = float(deductions_80c)
-        self.deductions_80d = float(deductions_80d)
-        self.deductions_80ccd_1b = float(deductions_80ccd_1b)
-        self.tds_claimed = float(tds_claimed)
-        self.residential_status = residential_status # "RES" or "NRI"
-        self.opt_out_new_regime = opt_out_new_regime # "Y" (Old) or "N" (New)
-
-class RawAIS:
+                 residential_status="RES", opt_out_new_regime="N", opt_in_new_regime="N"):
+        self._init(
+            ay=ay,
+            total_income=float(total_income),
+            tax_payable=float(tax_payable),
+            tax_paid=float(tax_paid),
+            house_property_income=float(house_property_income),
+            capital_gains_stcg=float(capital_gains_stcg),
+            capital_gains_ltcg=float(capital_gains_ltcg),
+            deductions_80c=float(deductions_80c),
+            deductions_80d=float(deductions_80d),
+            deductions_80ccd_1b=float(deductions_80ccd_1b),
+            tds_claimed=float(tds_claimed),
+            residential_status=residential_status, # "RES" or "NRI"
+            opt_out_new_regime=opt_out_new_regime, # "Y" (Old) or "N" (New), from AY 2024-25
+            opt_in_new_regime=opt_in_new_regime, # "Y" (New) or "N" (Old), up to AY 2023-24
+        )
+
+@lru_cache(maxsize=4096)
+def _classify_security(description: str) -> tuple:
+    """(is equity, is short-term) for an AIS securities-sale description."""
+    desc = description.lower()
+    return "equity" in desc, "short term" in desc
+
+class SecuritiesSales(_FrozenRecord):
+    """
+    AIS securities sales in columnar form: one amount and one flag per classification
+    (equity, short-term) per sale, read-only arrays classified once at normalization.
+    """
+    __slots__ = ("amounts", "equity", "short_term", "short_term_equity")
+
+    def __init__(self, amounts=(), equity=(), short_term=()):
+        amounts = np.array(amounts, dtype=np.float64)
+        equity = np.array(equity, dtype=bool)
+        short_term = np.array(short_term, dtype=bool)
+        for column in (amounts, equity, short_term):
+            column.flags.writeable = False
+        self._init(
+            amounts=amounts,
+            equity=equity,
+            short_term=short_term,
+            short_term_equity=float(amounts[equity & short_term].sum()), # what the STCG check compares
+        )
+
+    @classmethod
+    def from_entries(cls, entries: list) -> "SecuritiesSales":
+        """Builds the columns from AIS entry dicts ({"amount", "description", ...})."""
+        if not entries:
+            return EMPTY_SECURITIES
+        amounts, equity, short_term = [], [], []
+        for entry in entries:
+            amounts.append(float(entry.get("amount", 0) or 0))
+            is_equity, is_short_term = _classify_security(str(entry.get("description") or ""))
+            equity.append(is_equity)
+            short_term.append(is_short_term)
+        return cls(amounts, equity, short_term)
+
+    def __len__(self):
+        return len(self.amounts)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(
+            np.array_equal(getattr(self, name), getattr(other, name)) for name in ("amounts", "equity", "short_term")
+        )
+
+    def digest(self) -> str:
+        """Content hash of the columns, for input fingerprints."""
+        digest = hashlib.blake2b(digest_size=16)
+        for column in (self.amounts, self.equity, self.short_term):
+            digest.update(column.tobytes())
+        return digest.hexdigest()
+
+EMPTY_SECURITIES = SecuritiesSales()
+
+class CapitalGains(_FrozenRecord):
+    """
+    Gains realized by the AIS securities sales, from FIFO lot matching (capital_gains.py).
+    matched_sales is 0 when no sale could be matched to a purchase, e.g. AIS data without
+    quantities or security ids; the rules then fall back to the sale descriptions.
+    """
+    __slots__ = ("stcg", "ltcg", "matched_sales", "unmatched_proceeds")
+
+    def __init__(self, stcg=0, ltcg=0, matched_sales=0, unmatched_proceeds=0):
+        self._init(
+            stcg=float(stcg),
+            ltcg=float(ltcg),
+            matched_sales=int(matched_sales),
+            unmatched_proceeds=float(unmatched_proceeds), # sold units with no purchase on record
+        )
+
+    @classmethod
+    def from_entries(cls, purchases: list, sales: list, period=None) -> "CapitalGains":
+        """Matches AIS purchase / sale entry dicts; `period` (see capital_gains.fy_period) limits the sales counted."""
+        if not sales:
+            return NO_CAPITAL_GAINS
+        ledger = capital_gains.TradeLedger.from_entries(purchases or [], sales)
+        if not len(ledger):
+            return NO_CAPITAL_GAINS
+        return cls(**capital_gains.realized_gains(ledger, period))
+
+NO_CAPITAL_GAINS = CapitalGains()
+
+class RawAIS(_FrozenRecord):
     """Standardized AIS Data Object"""
-    def __init__(self, rent_received=0, total_tds_deposited=0, sale_of_securities=None, interest_income=0):
-        self.rent_received = float(rent_received)
-        self.total_tds_deposited = float(total_tds_deposited)
-        self.sale_of_securities = sale_of_securities if sale_of_securities else []
-        self.interest_income = float(interest_income) # Savings + FD Interest
+    __slots__ = ("rent_received", "total_tds_deposited", "sale_of_securities", "interest_income", "capital_gains")
 
-class RiskResult:
+    def __init__(self, rent_received=0, total_tds_deposited=0, sale_of_securities=None, interest_income=0, capital_gains=None):
+        # Securities may also be given as AIS entry dicts; they are classified here
+        if not isinstance(sale_of_securities, SecuritiesSales):
+            sale_of_securities = SecuritiesSales.from_entries(sale_of_securities)
+        self._init(
+            rent_received=float(rent_received),
+            total_tds_deposited=float(total_tds_deposited),
+            sale_of_securities=sale_of_securities,
+            interest_income=float(interest_income), # Savings + FD Interest
+            capital_gains=capital_gains or NO_CAPITAL_GAINS,
+        )
+
+class RiskResult(_FrozenRecord):
     """Standard Output for Risks"""
-    def __init__(self, title, severity, description, amount_involved, solutions):
-        self.title = title
-        self.severity = severity
-        self.description = description
-        self.amount_involved = float(amount_involved)
-        self.solutions = json.dumps(solutions) 
-
-class OpportunityResult:
+    __slots__ = ("title", "severity", "description", "amount_involved", "solutions", "risk_code")
+
+    def __init__(self, title, severity, description, amount_involved, solutions, risk_code=None):
+        self._init(
+            title=title,
+            severity=severity,
+            description=description,
+            amount_involved=float(amount_involved),
+            solutions=json.dumps(solutions),
+            risk_code=risk_code,
+        )
+
+class OpportunityResult(_FrozenRecord):
     """Standard Output for Opportunities"""
+    __slots__ = ("title", "description", "potential_savings", "opp_code")
+
     def __init__(self, title, description, potential_savings, opp_code):
-        self.title = title
-        self.description = description
-        self.potential_savings = float(potential_savings)
-        self.opp_code = opp_code
+        self._init(
+            title=title,
+            description=description,
+            potential_savings=float(potential_savings),
+            opp_code=opp_code,
+        )
+
+# ==========================================
+# Result Builders
+# ==========================================
+# One per result code, shared by the scalar engines below and the batch engine
+# (batch_rule_engine.py), so both emit identical records.
+
+def rental_mismatch_risk(rent_received, house_property_income) -> RiskResult:
+    return RiskResult(
+        title="Rental Income Mismatch",
+        severity="High",
+        description=f"AIS shows ₹{rent_received:,.0f} rent, but ITR declares only ₹{house_property_income:,.0f}.",
+        amount_involved=rent_received - house_property_income,
+        solutions=["Reconcile with Form 26AS/AIS", "Revise Return"],
+        risk_code="RISK_RENTAL_MISMATCH"
+    )
+
+def stcg_unreported_risk(risky_stcg) -> RiskResult:
+    return RiskResult(
+        title="Capital Gains Discrepancy",
+        severity="Medium",
+        description="AIS indicates Short Term Capital Gains which are missing in ITR.",
+        amount_involved=risky_stcg,
+        solutions=["Verify Broker Statement", "Report STCG in Schedule CG"],
+        risk_code="RISK_STCG_UNREPORTED"
+    )
+
+def stcg_underreported_risk(computed_stcg, reported_stcg) -> RiskResult:
+    diff = computed_stcg - reported_stcg
+    return RiskResult(
+        title="Short Term Capital Gains Under-reported",
+        severity="Medium",
+        description=f"Your AIS trades show ₹{computed_stcg:,.0f} of short term capital gains (FIFO), but the ITR reports ₹{reported_stcg:,.0f}.",
+        amount_involved=diff,
+        solutions=["Verify Broker Statement", "Report STCG in Schedule CG"],
+        risk_code="RISK_STCG_UNDERREPORTED"
+    )
+
+def ltcg_underreported_risk(computed_ltcg, reported_ltcg) -> RiskResult:
+    diff = computed_ltcg - reported_ltcg
+    return RiskResult(
+        title="Long Term Capital Gains Under-reported",
+        severity="Medium",
+        description=f"Your AIS trades show ₹{computed_ltcg:,.0f} of long term capital gains (FIFO), but the ITR reports ₹{reported_ltcg:,.0f}.",
+        amount_involved=diff,
+        solutions=["Verify Broker Statement", "Report LTCG in Schedule CG"],
+        risk_code="RISK_LTCG_UNDERREPORTED"
+    )
+
+def tds_underclaim_risk(total_tds_deposited, tds_claimed) -> RiskResult:
+    diff = total_tds_deposited - tds_claimed
+    return RiskResult(
+        title="Unclaimed TDS Credit",
+        severity="Medium",
+        description=f"You have ₹{diff:,.0f} unclaimed TDS appearing in AIS.",
+        amount_involved=diff,
+        solutions=["Update ITR to claim full TDS", "Check Form 26AS"],
+        risk_code="RISK_TDS_UNDERCLAIM"
+    )
+
+def tds_overclaim_risk(total_tds_deposited, tds_claimed) -> RiskResult:
+    diff = tds_claimed - total_tds_deposited
+    return RiskResult(
+        title="Mismatch in TDS claimed vs Form 26AS",
+        severity="High",
+        description=f"TDS amount claimed ₹{diff:,.0f} more than reflected in 26AS.",
+        amount_involved=diff,
+        solutions=["Revise Return immediately", "Pay the difference with interest", "Check for manual Challan entries"],
+        risk_code="RISK_TDS_OVERCLAIM"
+    )
+
+def interest_undeclared_risk(interest_income) -> RiskResult:
+    return RiskResult(
+        title="Interest income not declared",
+        severity="High",
+        description=f"FD/Savings interest of ₹{interest_income:,.0f} from AIS not reported in ITR.",
+        amount_involved=interest_income,
+        solutions=["Add Income from Other Sources", "Check Savings/FD Interest statement"],
+        risk_code="RISK_INTEREST_UNDECLARED"
+    )
+
+def schedule_al_risk(total_income) -> RiskResult:
+    return RiskResult(
+        title="High Income Disclosure",
+        severity="Medium",
+        description=f"Gross Total Income is ₹{total_income:,.0f} (> ₹50L). Ensure 'Schedule AL' is filled.",
+        amount_involved=total_income,
+        solutions=["Verify Schedule AL is filed", "Check for foreign assets"],
+        risk_code="RISK_SCHEDULE_AL"
+    )
+
+def tax_demand_risk(tax_payable, tax_paid) -> RiskResult:
+    return RiskResult(
+        title="Outstanding Tax Demand",
+        severity="High",
+        description=f"Net Tax Liability (₹{tax_payable:,.0f}) exceeds Taxes Paid (₹{tax_paid:,.0f}).",
+        amount_involved=tax_payable - tax_paid,
+        solutions=["Pay Self-Assessment Tax", "Check for challan mismatch"],
+        risk_code="RISK_TAX_DEMAND"
+    )
+
+def residential_status_risk() -> RiskResult:
+    return RiskResult(
+        title="Residential Status Mismatch",
+        severity="High",
+        description="You identified as NRI in the questionnaire, but your ITR was filed as Resident.",
+        amount_involved=0,
+        solutions=["File Revised Return as NRI", "Check 182-day rule"],
+        risk_code="RISK_RESIDENTIAL_STATUS"
+    )
+
+def cg_not_reported_risk() -> RiskResult:
+    return RiskResult(
+        title="Missing Capital Gains",
+        severity="Medium",
+        description="You indicated Capital Gains income in your profile, but Schedule CG in ITR is empty.",
+        amount_involved=0,
+        solutions=["Verify Capital Gains Report", "Check if gains were below basic exemption"],
+        risk_code="RISK_CG_NOT_REPORTED"
+    )
+
+LIMIT_80C = tax_engine.LIMIT_80C
+
+def opportunity_80c(deductions_80c, savings) -> OpportunityResult:
+    return OpportunityResult(
+        title="Maximize 80C Deductions",
+        description=f"You have claimed ₹{deductions_80c:,.0f} out of ₹1.5L. Invest remaining to save tax.",
+        potential_savings=savings,
+        opp_code="OPP_80C"
+    )
+
+def opportunity_80d(savings) -> OpportunityResult:
+    return OpportunityResult(
+        title="Health Insurance (80D)",
+        description="You haven't claimed Health Insurance. Save up to ₹25k (Self) + ₹50k (Parents).",
+        potential_savings=savings,
+        opp_code="OPP_80D"
+    )
+
+def opportunity_nps(savings) -> OpportunityResult:
+    return OpportunityResult(
+        title="NPS Contribution (80CCD 1B)",
+        description="Invest ₹50,000 in NPS for additional deduction over and above 80C.",
+        potential_savings=savings,
+        opp_code="OPP_NPS"
+    )
+
+def opportunity_regime_switch(regime, filed_tax, other_tax) -> OpportunityResult:
+    return OpportunityResult(
+        title=f"Switch to the {regime.title()} Tax Regime",
+        description=f"Your income works out to ₹{filed_tax:,.0f} of tax under the regime you filed in and ₹{other_tax:,.0f} under the {regime} regime.",
+        potential_savings=filed_tax - other_tax,
+        opp_code="OPP_REGIME_SWITCH"
+    )
+
+# ==========================================
+# Rule Registry
+# ==========================================
+# Every engine check is declared with the inputs it reads and the result codes it
+# can emit. Inputs are named "itr.<field>", "ais.<field>", "profile.<key>" or "date",
+# which lets the caller re-run only the rules whose inputs changed and keep the
+# stored results of all others (see itr_service).
+
+class Rule:
+    """A registered engine check"""
+    def __init__(self, name, engine, inputs, codes):
+        self.name = name
+        self.engine = engine # "risks", "opportunities" or "tax_calendar"
+        self.inputs = frozenset(inputs)
+        self.codes = tuple(codes)
+
+RULES: Dict[str, Rule] = {} # name -> Rule, in evaluation order
+
+def rule(*inputs, codes=()):
+    """Declares an engine method as a rule reading `inputs` and emitting `codes`."""
+    def register(check):
+        check.rule_inputs = inputs
+        check.rule_codes = codes
+        return check
+    return register
+
+def _register_rules(engine: str, engine_class):
+    engine_class.RULE_NAMES = []
+    for name, member in vars(engine_class).items():
+        if hasattr(member, "rule_inputs"):
+            RULES[name] = Rule(name, engine, member.rule_inputs, member.rule_codes)
+            engine_class.RULE_NAMES.append(name)
+    return engine_class
+
+def rules_reading(changed_inputs) -> set:
+    """Names of the rules that read any of `changed_inputs`."""
+    changed_inputs = set(changed_inputs)
+    return {name for name, registered in RULES.items() if registered.inputs & changed_inputs}
+
+def run_rules(engine, rules=None, trace: Optional[list] = None):
+    """
+    Runs the engine's registered checks in declaration order, or only those named in `rules`.
+    With a `trace` list every call is traced (see below) and appended to it.
+    """
+    for name in engine.RULE_NAMES:
+        if rules is None or name in rules:
+            if trace is None:
+                getattr(engine, name)()
+            else:
+                trace.append(_traced_call(engine, name))
+
+# ==========================================
+# Rule Tracing
+# ==========================================
+# Opt-in instrumentation of the engines. In a traced run every rule call records its
+# wall time, the RawITR / RawAIS fields and profile keys it actually read (the engine's
+# inputs are swapped for read-recording proxies during the call), the result codes it
+# emitted, and any exception. A failing rule is recorded and the remaining rules still
+# run. Traces are aggregated into RULE_STATS, the per-rule counters of this process.
+# RULE_TRACE=1 traces every evaluate_all call; otherwise only callers asking for it.
+
+RULE_TRACE = os.getenv("RULE_TRACE", "0") == "1"
+
+class RuleTrace:
+    """What one rule did in one traced evaluation"""
+    def __init__(self, rule: str, engine: str):
+        self.rule = rule
+        self.engine = engine
+        self.outcome = "passed" # "fired", "passed", "skipped" or "error"
+        self.codes = [] # result codes emitted (quarters for the tax calendar)
+        self.inputs = {} # input name ("itr.tax_paid", "profile.newRegime", ...) -> value read
+        self.duration_ms = 0.0
+        self.error = None
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+def _traced_value(value):
+    # Entry lists and securities sales are summarized so traces stay small
+    if isinstance(value, (list, SecuritiesSales)):
+        return {"entries": len(value)}
+    if isinstance(value, CapitalGains):
+        return value.to_dict()
+    return value
+
+class _ReadRecorder:
+    """Proxy recording which attributes of a RawITR / RawAIS a rule reads"""
+    def __init__(self, target, prefix: str, reads: dict):
+        self._target = target
+        self._prefix = prefix
+        self._reads = reads
+
+    def __getattr__(self, name):
+        value = getattr(self._target, name)
+        self._reads[f"{self._prefix}.{name}"] = _traced_value(value)
+        return value
+
+class _ProfileRecorder(dict):
+    """Copy of the questionnaire answers recording the keys a rule looks up"""
+    def __init__(self, profile: dict, reads: dict):
+        super().__init__(profile)
+        self._reads = reads
+
+    def get(self, key, default=None):
+        value = super().get(key, default)
+        self._reads[f"profile.{key}"] = _traced_value(value)
+        return value
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        self._reads[f"profile.{key}"] = _traced_value(value)
+        return value
+
+def _result_code(item):
+    if isinstance(item, dict):
+        return item.get("quarter")
+    return getattr(item, "risk_code", None) or getattr(item, "opp_code", None)
+
+def _traced_call(engine, name: str) -> RuleTrace:
+    entry = RuleTrace(name, RULES[name].engine)
+    saved = {attr: getattr(engine, attr) for attr in ("itr", "ais", "profile") if hasattr(engine, attr)}
+    for attr, value in saved.items():
+        setattr(engine, attr, _ProfileRecorder(value, entry.inputs) if attr == "profile" else _ReadRecorder(value, attr, entry.inputs))
+    # A value cached by an earlier rule would hide this rule's reads
+    for attr in getattr(engine, "CACHES", ()):
+        setattr(engine, attr, None)
+    before = len(getattr(engine, engine.RESULTS))
+    start = time.perf_counter()
+    try:
+        getattr(engine, name)()
+    except Exception as e:
+        entry.outcome = "error"
+        entry.error = f"{type(e).__name__}: {e}"
+        logging.exception(f"Rule {name} failed")
+    finally:
+        entry.duration_ms = (time.perf_counter() - start) * 1000
+        for attr, value in saved.items():
+            setattr(engine, attr, value)
+
+    if "date" in RULES[name].inputs:
+        entry.inputs["date"] = date.today().isoformat()
+    if entry.outcome != "error":
+        produced = getattr(engine, engine.RESULTS)[before:]
+        entry.codes = [_result_code(item) for item in produced]
+        entry.outcome = "fired" if produced else "passed"
+    return entry
+
+def _skipped_traces(engine, rules, inputs: dict) -> List[RuleTrace]:
+    """Trace entries for rules an engine did not run at all."""
+    entries = []
+    for name in engine.RULE_NAMES:
+        if rules is None or name in rules:
+            entry = RuleTrace(name, RULES[name].engine)
+            entry.outcome = "skipped"
+            entry.inputs = dict(inputs)
+            entries.append(entry)
+    return entries
+
+class RuleStats:
+    """
+    Per-rule counters aggregated from traces. Thread-safe; snapshots are plain dicts,
+    so worker processes can hand theirs to the API process (see job_pool).
+    """
+    COUNTERS = ("calls", "fired", "passed", "skipped", "errors")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rules: Dict[str, dict] = {}
+
+    def _counters(self, rule_name: str) -> dict:
+        counters = self._rules.get(rule_name)
+        if counters is None:
+            counters = self._rules[rule_name] = {**dict.fromkeys(self.COUNTERS, 0), "total_ms": 0.0, "max_ms": 0.0}
+        return counters
+
+    def record(self, traces: List[RuleTrace]):
+        with self._lock:
+            for entry in traces:
+                counters = self._counters(entry.rule)
+                counters["calls"] += 1
+                counters["errors" if entry.outcome == "error" else entry.outcome] += 1
+                counters["total_ms"] += entry.duration_ms
+                counters["max_ms"] = max(counters["max_ms"], entry.duration_ms)
+
+    def merge(self, snapshot: Dict[str, dict]):
+        with self._lock:
+            for rule_name, other in snapshot.items():
+                counters = self._counters(rule_name)
+                for key in self.COUNTERS + ("total_ms",):
+                    counters[key] += other[key]
+                counters["max_ms"] = max(counters["max_ms"], other["max_ms"])
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            return {rule_name: dict(counters) for rule_name, counters in self._rules.items()}
+
+    def drain(self) -> Dict[str, dict]:
+        """Returns the counters and resets them."""
+        with self._lock:
+            rules, self._rules = self._rules, {}
+            return rules
+
+    def summary(self) -> List[dict]:
+        """One row per rule, most total time first, with the mean duration of a call."""
+        rows = [
+            {"rule": rule_name, "engine": RULES[rule_name].engine if rule_name in RULES else None, **counters,
+             "mean_ms": counters["total_ms"] / counters["calls"] if counters["calls"] else 0.0}
+            for rule_name, counters in self.snapshot().items()
+        ]
+        return sorted(rows, key=lambda row: row["total_ms"], reverse=True)
+
+RULE_STATS = RuleStats()
 
 # ==========================================
 # 2. Data Normalizer (The Cleaner)
@@ -59,337 +577,366 @@ class OpportunityResult:
 class DataNormalizer:
     @staticmethod
     def normalize_itr(itr_json: dict) -> RawITR:
-        def get_val(path, root=itr_json, default=0):
-            val = root
-            for key in path:
-                if isinstance(val, dict):
-                    val = val.get(key, {})
-                else:
-                    return default
-            if isinstance(val, (int, float)):
-                return float(val)
-            if isinstance(val, str) and val.replace('.','',1).isdigit():
-                return float(val)
-            return default
-
-        def get_str(path, root=itr_json, default=""):
-            val = root
-            for key in path:
-                val = val.get(key, {}) if isinstance(val, dict) else {}
-            return str(val) if isinstance(val, str) else default
-
-        itr_root = itr_json.get("ITR", {})
-        form_type = next(iter(itr_root)) if itr_root else "Unknown"
-        form_data = itr_root.get(form_type, {})
-
-        # Default Values
-        gross_total_income = 0.0
-        tax_payable = 0.0
-        tax_paid = 0.0
-        hp_income = 0.0
-        stcg = 0.0
-        ltcg = 0.0
-        ded_80c = 0.0
-        ded_80d = 0.0
-        ded_80ccd = 0.0
-        tds_claimed = 0.0
-        res_status = "RES"
-        opt_out_new = "N"
-
-        ay = form_data.get(f"Form_{form_type}", {}).get("AssessmentYear", "Unknown")
-
-        if "ITR1" in form_type or "ITR4" in form_type:
-            gross_total_income = get_val([f"{form_type}_IncomeDeductions", "GrossTotIncome"], form_data)
-            tax_payable = get_val([f"{form_type}_TaxComputation", "NetTaxLiability"], form_data)
-            tax_paid = get_val(["TaxPaid", "TaxesPaid", "TotalTaxesPaid"], form_data)
-            hp_income = get_val([f"{form_type}_IncomeDeductions", "IncomeFromHP"], form_data)
-            ded_80c = get_val([f"{form_type}_IncomeDeductions", "UsrDeductUndChapVIA", "Section80C"], form_data)
-            tds_claimed = get_val(["TDS", "TotalTDSClaimed"], form_data)
-            
-            res_status = get_str(["FilingStatus", "ResidentialStatus"], form_data, "RES")
-            opt_out_new = get_str(["FilingStatus", "OptOutNewTaxRegime"], form_data, "N")
-            
-        else:
-            # ITR-2 / ITR-3
-            gross_total_income = get_val(["PartB-TI", "GrossTotalIncome"], form_data)
-            tax_payable = get_val(["PartB_TTI", "ComputationOfTaxLiability", "NetTaxLiability"], form_data)
-            tax_paid = get_val(["PartB_TTI", "TaxPaid", "TaxesPaid", "TotalTaxesPaid"], form_data)
-            
-            hp_income = get_val(["ScheduleHP", "TotalIncomeHP"], form_data)
-            stcg = get_val(["ScheduleCGFor23", "ShortTermCapGainFor23", "TotalSTCG"], form_data)
-            ltcg = get_val(["ScheduleCGFor23", "LongTermCapGain23", "TotalLTCG"], form_data)
-            
-            via = form_data.get("ScheduleVIA", {}).get("UsrDeductUndChapVIA", {})
-            ded_80c = get_val(["Section80C"], via)
-            ded_80d = get_val(["Section80D"], via)
-            ded_80ccd = get_val(["Section80CCD1B"], via)
-            
-            tds_claimed = get_val(["ScheduleTDS1", "TotalTDSClaimed"], form_data)
-            
-            filing_stat = form_data.get("PartA_GEN1", {}).get("FilingStatus", {})
-            res_status = filing_stat.get("ResidentialStatus", "RES")
-            opt_out_new = filing_stat.get("OptOutNewTaxRegime", "N")
+        return DataNormalizer.from_fields(itr_extractor.extract_itr(itr_json))
 
+    @staticmethod
+    def from_fields(fields) -> RawITR:
+        """Builds the RawITR from fields already pulled by itr_extractor."""
         return RawITR(
-            ay=ay,
-            total_income=gross_total_income,
-            tax_payable=tax_payable,
-            tax_paid=tax_paid,
-            house_property_income=hp_income,
-            capital_gains_stcg=stcg if "ITR1" not in form_type else 0,
-            capital_gains_ltcg=ltcg if "ITR1" not in form_type else 0,
-            deductions_80c=ded_80c,
-            deductions_80d=ded_80d if "ITR1" not in form_type else 0,
-            deductions_80ccd_1b=ded_80ccd if "ITR1" not in form_type else 0,
-            tds_claimed=tds_claimed,
-            residential_status=res_status,
-            opt_out_new_regime=opt_out_new
+            ay=fields["ay"],
+            total_income=itr_extractor.gross_income(fields),
+            tax_payable=fields["tax_payable"],
+            tax_paid=fields["tax_paid"],
+            house_property_income=fields["house_property_income"],
+            capital_gains_stcg=fields["capital_gains_stcg"],
+            capital_gains_ltcg=fields["capital_gains_ltcg"],
+            deductions_80c=fields["deductions_80c"],
+            deductions_80d=fields["deductions_80d"],
+            deductions_80ccd_1b=fields["deductions_80ccd_1b"],
+            tds_claimed=fields["tds_claimed"],
+            residential_status=fields["residential_status"],
+            opt_out_new_regime=fields["opt_out_new_regime"],
+            opt_in_new_regime=fields["opt_in_new_regime"]
+        )
+
+    @staticmethod
+    def from_filing(filing) -> RawITR:
+        """Builds the RawITR from the normalized columns stored on an ITR_Filing row."""
+        return RawITR(
+            ay=filing.ay,
+            total_income=filing.gross_total_income or filing.total_income or 0,
+            tax_payable=filing.tax_payable or 0,
+            tax_paid=filing.tax_paid or 0,
+            house_property_income=filing.house_property_income or 0,
+            capital_gains_stcg=filing.capital_gains_stcg or 0,
+            capital_gains_ltcg=filing.capital_gains_ltcg or 0,
+            deductions_80c=filing.deductions_80c or 0,
+            deductions_80d=filing.deductions_80d or 0,
+            deductions_80ccd_1b=filing.deductions_80ccd_1b or 0,
+            tds_claimed=filing.tds_claimed or 0,
+            residential_status=filing.residential_status or "RES",
+            opt_out_new_regime=filing.opt_out_new_regime or "N",
+            opt_in_new_regime=filing.opt_in_new_regime or "N"
         )
 
     @staticmethod
-    def normalize_ais(ais_list: list) -> RawAIS:
-        ais = RawAIS()
-        if not ais_list: return ais
+    def from_aggregates(totals, securities: list = None, gains: CapitalGains = None) -> RawAIS:
+        """
+        Builds the RawAIS from per-category totals, i.e. (category, amount) pairs such as
+        AIS_Aggregate rows, plus the individual securities-sale entries and the FIFO gains.
+        """
+        rent_received = total_tds_deposited = interest_income = 0.0
+        for category, amount in totals:
+            kind = ais_classifier.classify(category)
+            if kind == ais_classifier.RENT:
+                rent_received += amount or 0
+            elif kind == ais_classifier.TDS:
+                total_tds_deposited += amount or 0
+            elif kind == ais_classifier.INTEREST:
+                interest_income += amount or 0
+        return RawAIS(rent_received, total_tds_deposited, securities, interest_income, gains)
+
+    @staticmethod
+    def normalize_ais(ais_list: list, ay: Optional[str] = None) -> RawAIS:
+        """
+        RawAIS of raw AIS entries. With the return's `ay`, FIFO gains count only the sales
+        of the FY it assesses, as when the AIS is loaded from the database.
+        """
+        if not ais_list: return RawAIS()
+        rent_received = total_tds_deposited = interest_income = 0.0
+        securities, purchases = [], []
         for entry in ais_list:
             try:
                 category = entry.get("informationCategory", "") or entry.get("infoCategory", "")
                 amount = float(entry.get("amount", 0) or 0)
                 
-                if "Rent received" in category:
-                    ais.rent_received += amount
-                elif "TDS" in category or "Tax Deducted" in category:
-                    ais.total_tds_deposited += amount
-                # --- NEW: Interest Income Check ---
-                elif "Interest from savings" in category or "Interest from deposits" in category:
-                    ais.interest_income += amount
-                # ----------------------------------
-                elif "Sale of securities" in category or "SFT-017" in category:
-                    ais.sale_of_securities.append(entry)
+                kind = ais_classifier.classify(category)
+                if kind == ais_classifier.RENT:
+                    rent_received += amount
+                elif kind == ais_classifier.TDS:
+                    total_tds_deposited += amount
+                elif kind == ais_classifier.INTEREST:
+                    interest_income += amount
+                elif kind == ais_classifier.SECURITIES_SALE:
+                    securities.append(entry)
+                elif kind == ais_classifier.SECURITIES_PURCHASE:
+                    purchases.append(entry)
             except Exception:
                 continue
-        return ais
+        gains = CapitalGains.from_entries(purchases, securities, capital_gains.ay_period(ay) if ay else None)
+        return RawAIS(rent_received, total_tds_deposited, securities, interest_income, gains)
+
+# Computed gains may exceed the reported ones by this much (rounding, charges) before it is a risk
+CG_TOLERANCE = 10000
+
+def short_term_equity_sales(sale_of_securities: SecuritiesSales) -> float:
+    """Total of the AIS securities sales described as short-term equity."""
+    return sale_of_securities.short_term_equity
+
+def is_new_regime(user_profile: dict) -> bool:
+    return "New Regime" in user_profile.get("newRegime", "")
+
+def declares_nri(user_profile: dict) -> bool:
+    return user_profile.get("residentialStatus", "") == "NRI"
+
+def declares_capital_gains(user_profile: dict) -> bool:
+    return "Capital Gains (Stocks/Property)" in user_profile.get("income_sources", [])
+
+# --- Tax computation inputs (see tax_engine) ---
+
+# The RawITR fields tax_base reads, for the rules computing tax
+TAX_INPUTS = (
+    "itr.ay", "itr.total_income", "itr.capital_gains_stcg", "itr.capital_gains_ltcg",
+    "itr.deductions_80c", "itr.deductions_80d", "itr.deductions_80ccd_1b", "itr.opt_out_new_regime",
+    "itr.opt_in_new_regime",
+)
+
+def filed_regime(itr: RawITR) -> int:
+    """
+    tax_engine.OLD or NEW: the regime the return was filed under. Up to AY 2023-24 the
+    old regime is the default and the return opts in to section 115BAC; from AY 2024-25
+    the new regime is the default and the return opts out of it.
+    """
+    if tax_engine.ay_index(itr.ay) < tax_engine.ay_index(tax_engine.NEW_REGIME_DEFAULT_AY):
+        return tax_engine.NEW if itr.opt_in_new_regime == "Y" else tax_engine.OLD
+    return tax_engine.OLD if itr.opt_out_new_regime == "Y" else tax_engine.NEW
+
+def tax_base(itr: RawITR) -> dict:
+    """
+    tax_engine.what_if arguments for a return. RawITR.total_income is the gross total
+    income (before chapter VI-A deductions) and includes the capital gains, which are
+    taxed separately at their special rates.
+    """
+    gains = itr.capital_gains_stcg + itr.capital_gains_ltcg
+    return {
+        "ay": tax_engine.ay_index(itr.ay), "gross_income": max(itr.total_income - gains, 0.0),
+        "claimed_80c": itr.deductions_80c, "claimed_80d": itr.deductions_80d, "claimed_nps": itr.deductions_80ccd_1b,
+        "stcg": itr.capital_gains_stcg, "ltcg": itr.capital_gains_ltcg,
+    }
+
+TAX_BASE_AMOUNTS = ("gross_income", "claimed_80c", "claimed_80d", "claimed_nps", "stcg", "ltcg") # tax_base keys but the AY
+
+# What-if scenarios computed for every return in one pass: the claimed deductions under the
+# old regime, each deduction opportunity taken up (old regime), and the new regime
+TAX_SCENARIOS = ("old", "fill_80c", "claim_80d", "claim_nps", "new")
+EXTRA_80D = 25000 # self / family health insurance
+EXTRA_NPS = tax_engine.LIMIT_NPS
+REGIME_SWITCH_MIN = 1000 # the other regime must save at least this much to be suggested
+
+def scenario_taxes(itrs: List[RawITR]) -> Dict[str, np.ndarray]:
+    """Total tax of each return under each of TAX_SCENARIOS: scenario name -> array aligned with `itrs`."""
+    if not itrs:
+        return {name: np.empty(0) for name in TAX_SCENARIOS}
+    bases = [tax_base(itr) for itr in itrs]
+    # Returns along the rows, scenarios along the columns
+    column = {key: np.array([base[key] for base in bases])[:, None] for key in bases[0]}
+    scenario = np.array(TAX_SCENARIOS)
+    gap_80c = np.maximum(tax_engine.LIMIT_80C - column["claimed_80c"], 0.0)
+    totals = tax_engine.what_if(
+        ay=column["ay"], regime=np.where(scenario == "new", tax_engine.NEW, tax_engine.OLD),
+        gross_income=column["gross_income"], claimed_80c=column["claimed_80c"], claimed_80d=column["claimed_80d"],
+        claimed_nps=column["claimed_nps"], stcg=column["stcg"], ltcg=column["ltcg"],
+        extra_80c=np.where(scenario == "fill_80c", gap_80c, 0.0),
+        extra_80d=np.where(scenario == "claim_80d", EXTRA_80D, 0.0),
+        extra_nps=np.where(scenario == "claim_nps", EXTRA_NPS, 0.0),
+    )["total"]
+    return {name: totals[:, position] for position, name in enumerate(TAX_SCENARIOS)}
+
+# Advance tax is projected on last year's return grown by this much, at the current year's rates
+INCOME_GROWTH = 0.10
+
+def projected_taxes(itrs: List[RawITR], fy_start: int) -> np.ndarray:
+    """Tax on each return's income grown by INCOME_GROWTH, for the FY starting in `fy_start`, in the filed regime."""
+    bases = [tax_base(itr) for itr in itrs]
+    column = {key: np.array([base[key] for base in bases], dtype=np.float64) for key in TAX_BASE_AMOUNTS}
+    for key in ("gross_income", "stcg", "ltcg"):
+        column[key] *= 1 + INCOME_GROWTH
+    regime = np.array([filed_regime(itr) for itr in itrs], dtype=np.intp)
+    return tax_engine.what_if(ay=tax_engine.ay_index(str(fy_start + 1)), regime=regime, **column)["total"]
+
+def projected_tax(itr: RawITR, fy_start: int) -> float:
+    return float(projected_taxes([itr], fy_start)[0])
 
 # ==========================================
 # 3. Risk Engine (The Muscle)
 # ==========================================
 
-from .ai_engine import AIEngine
-
 class RiskEngine:
+    RESULTS = "risks"
+
     def __init__(self, itr: RawITR, ais: RawAIS, user_profile: Optional[Dict] = None):
         self.itr = itr
         self.ais = ais
         self.profile = user_profile or {}
         self.risks = []
-        self.ai = AIEngine()
-
-    def execute(self) -> List["RiskResult"]:
-        # Standard Math Checks
-        self._check_rental_mismatch()
-        self._check_capital_gains_misclass()
-        self._check_tds_mismatch() # Covers Under & Over Claim
-        self._check_interest_mismatch() # New Check
-        self._check_high_income_disclosure()
-        self._check_tax_liability_mismatch()
-        
-        # Questionnaire Checks
-        self._check_residential_status_mismatch()
-        self._check_declared_income_sources()
 
-        # Enrich with AI
-        for risk in self.risks:
-            try:
-                explanation = self.ai.generate_risk_explanation(
-                    risk_data={
-                        "title": risk.title,
-                        "description": risk.description,
-                        "amount_involved": risk.amount_involved,
-                        "severity": risk.severity
-                    },
-                    user_profile=self.profile
-                )
-                
-                current_solutions = json.loads(risk.solutions)
-                current_solutions.append(f"AI Insight: {explanation}")
-                risk.solutions = json.dumps(current_solutions)
-            except Exception as e:
-                pass 
-                
+    def execute(self, rules=None, trace: Optional[list] = None) -> List["RiskResult"]:
+        """Runs every registered check in declaration order, or only those named in `rules`."""
+        # Standard Math Checks, then Questionnaire Checks
+        run_rules(self, rules, trace)
+
+        # AI explanations are added after persistence (services/enrichment_service.py)
+        # so a slow or failing LLM never blocks rule evaluation.
         return self.risks
 
+    @rule("ais.rent_received", "itr.house_property_income", codes=("RISK_RENTAL_MISMATCH",))
     def _check_rental_mismatch(self):
         if self.ais.rent_received > 0:
             diff = self.ais.rent_received - self.itr.house_property_income
             if diff > 50000:
-                self.risks.append(RiskResult(
-                    title="Rental Income Mismatch",
-                    severity="High",
-                    description=f"AIS shows ₹{self.ais.rent_received:,.0f} rent, but ITR declares only ₹{self.itr.house_property_income:,.0f}.",
-                    amount_involved=diff,
-                    solutions=["Reconcile with Form 26AS/AIS", "Revise Return"]
-                ))
+                self.risks.append(rental_mismatch_risk(self.ais.rent_received, self.itr.house_property_income))
 
+    @rule("ais.sale_of_securities", "ais.capital_gains", "itr.capital_gains_stcg", codes=("RISK_STCG_UNREPORTED", "RISK_STCG_UNDERREPORTED"))
     def _check_capital_gains_misclass(self):
-        risky_stcg = 0
-        for txn in self.ais.sale_of_securities:
-            desc = txn.get("description", "").lower()
-            amt = float(txn.get("amount", 0))
-            if "equity" in desc and "short term" in desc: 
-                risky_stcg += amt
-        
+        gains = self.ais.capital_gains
+        if gains.matched_sales:
+            # Exact FIFO figures from the AIS purchase / sale lots
+            if gains.stcg - self.itr.capital_gains_stcg > CG_TOLERANCE:
+                self.risks.append(stcg_underreported_risk(gains.stcg, self.itr.capital_gains_stcg))
+            return
+        risky_stcg = short_term_equity_sales(self.ais.sale_of_securities)
         if risky_stcg > 100000 and self.itr.capital_gains_stcg == 0:
-             self.risks.append(RiskResult(
-                title="Capital Gains Discrepancy",
-                severity="Medium",
-                description="AIS indicates Short Term Capital Gains which are missing in ITR.",
-                amount_involved=risky_stcg,
-                solutions=["Verify Broker Statement", "Report STCG in Schedule CG"]
-            ))
-
-    def _check_tds_mismatch(self):
+             self.risks.append(stcg_unreported_risk(risky_stcg))
+
+    @rule("ais.capital_gains", "itr.capital_gains_ltcg", codes=("RISK_LTCG_UNDERREPORTED",))
+    def _check_ltcg_underreported(self):
+        gains = self.ais.capital_gains
+        if gains.matched_sales and gains.ltcg - self.itr.capital_gains_ltcg > CG_TOLERANCE:
+            self.risks.append(ltcg_underreported_risk(gains.ltcg, self.itr.capital_gains_ltcg))
+
+    @rule("ais.total_tds_deposited", "itr.tds_claimed", codes=("RISK_TDS_UNDERCLAIM", "RISK_TDS_OVERCLAIM"))
+    def _check_tds_mismatch(self): # Covers Under & Over Claim
         # 1. Under-Claim (You lost money)
         if self.ais.total_tds_deposited > (self.itr.tds_claimed + 1000):
-            diff = self.ais.total_tds_deposited - self.itr.tds_claimed
-            self.risks.append(RiskResult(
-                title="Unclaimed TDS Credit",
-                severity="Medium",
-                description=f"You have ₹{diff:,.0f} unclaimed TDS appearing in AIS.",
-                amount_involved=diff,
-                solutions=["Update ITR to claim full TDS", "Check Form 26AS"]
-            ))
+            self.risks.append(tds_underclaim_risk(self.ais.total_tds_deposited, self.itr.tds_claimed))
             
         # 2. Over-Claim (You claimed too much - DANGEROUS)
         elif self.itr.tds_claimed > (self.ais.total_tds_deposited + 1000):
-            diff = self.itr.tds_claimed - self.ais.total_tds_deposited
-            self.risks.append(RiskResult(
-                title="Mismatch in TDS claimed vs Form 26AS",
-                severity="High",
-                description=f"TDS amount claimed ₹{diff:,.0f} more than reflected in 26AS.",
-                amount_involved=diff,
-                solutions=["Revise Return immediately", "Pay the difference with interest", "Check for manual Challan entries"]
-            ))
+            self.risks.append(tds_overclaim_risk(self.ais.total_tds_deposited, self.itr.tds_claimed))
 
+    @rule("ais.interest_income", "itr.total_income", codes=("RISK_INTEREST_UNDECLARED",))
     def _check_interest_mismatch(self):
         # Check if AIS Interest exists but Total Income is suspiciously low or missing 'Other Sources' logic
         # For MVP, if AIS Interest > 0 and Total Income < AIS Interest (Implying it wasn't added)
         if self.ais.interest_income > 5000:
              if self.itr.total_income < self.ais.interest_income:
-                 self.risks.append(RiskResult(
-                    title="Interest income not declared",
-                    severity="High",
-                    description=f"FD/Savings interest of ₹{self.ais.interest_income:,.0f} from AIS not reported in ITR.",
-                    amount_involved=self.ais.interest_income,
-                    solutions=["Add Income from Other Sources", "Check Savings/FD Interest statement"]
-                ))
+                 self.risks.append(interest_undeclared_risk(self.ais.interest_income))
 
+    @rule("itr.total_income", codes=("RISK_SCHEDULE_AL",))
     def _check_high_income_disclosure(self):
         if self.itr.total_income > 5000000:
-            self.risks.append(RiskResult(
-                title="High Income Disclosure",
-                severity="Medium",
-                description=f"Gross Total Income is ₹{self.itr.total_income:,.0f} (> ₹50L). Ensure 'Schedule AL' is filled.",
-                amount_involved=self.itr.total_income,
-                solutions=["Verify Schedule AL is filed", "Check for foreign assets"]
-            ))
+            self.risks.append(schedule_al_risk(self.itr.total_income))
 
+    @rule("itr.tax_payable", "itr.tax_paid", codes=("RISK_TAX_DEMAND",))
     def _check_tax_liability_mismatch(self):
         if self.itr.tax_payable > (self.itr.tax_paid + 100):
-             diff = self.itr.tax_payable - self.itr.tax_paid
-             self.risks.append(RiskResult(
-                title="Outstanding Tax Demand",
-                severity="High",
-                description=f"Net Tax Liability (₹{self.itr.tax_payable:,.0f}) exceeds Taxes Paid (₹{self.itr.tax_paid:,.0f}).",
-                amount_involved=diff,
-                solutions=["Pay Self-Assessment Tax", "Check for challan mismatch"]
-            ))
+             self.risks.append(tax_demand_risk(self.itr.tax_payable, self.itr.tax_paid))
 
     # --- QUESTIONNAIRE CHECKS ---
+    @rule("profile.residentialStatus", "itr.residential_status", codes=("RISK_RESIDENTIAL_STATUS",))
     def _check_residential_status_mismatch(self):
-        user_status = self.profile.get("residentialStatus", "")
-        if user_status == "NRI" and "RES" in self.itr.residential_status:
-             self.risks.append(RiskResult(
-                title="Residential Status Mismatch",
-                severity="High",
-                description="You identified as NRI in the questionnaire, but your ITR was filed as Resident.",
-                amount_involved=0,
-                solutions=["File Revised Return as NRI", "Check 182-day rule"]
-            ))
+        if declares_nri(self.profile) and "RES" in self.itr.residential_status:
+             self.risks.append(residential_status_risk())
 
+    @rule("profile.income_sources", "itr.capital_gains_ltcg", "itr.capital_gains_stcg", codes=("RISK_CG_NOT_REPORTED",))
     def _check_declared_income_sources(self):
-        sources = self.profile.get("income_sources", [])
-        if "Capital Gains (Stocks/Property)" in sources:
+        if declares_capital_gains(self.profile):
             total_cg = self.itr.capital_gains_ltcg + self.itr.capital_gains_stcg
             if total_cg == 0:
-                 self.risks.append(RiskResult(
-                    title="Missing Capital Gains",
-                    severity="Medium",
-                    description="You indicated Capital Gains income in your profile, but Schedule CG in ITR is empty.",
-                    amount_involved=0,
-                    solutions=["Verify Capital Gains Report", "Check if gains were below basic exemption"]
-                ))
+                 self.risks.append(cg_not_reported_risk())
+
+_register_rules("risks", RiskEngine)
 
 # ==========================================
 # 4. Opportunity Engine (The Savings)
 # ==========================================
 
 class OpportunityEngine:
+    RESULTS = "opportunities"
+
     def __init__(self, itr: RawITR, user_profile: Optional[Dict] = None):
         self.itr = itr
         self.profile = user_profile or {}
         self.opportunities = []
+        self._taxes = None
 
-    def execute(self) -> List[OpportunityResult]:
-        user_regime = self.profile.get("newRegime", "")
-        is_new_regime = "New Regime" in user_regime
-        
-        if not is_new_regime:
-            self._check_80c()
-            self._check_80d()
-            self._check_nps()
+    CACHES = ("_taxes",) # cleared before each traced rule (see _traced_call)
+
+    # Deductions are only relevant under the old regime; the regime comparison always runs
+    DEDUCTION_RULES = ("_check_80c", "_check_80d", "_check_nps")
+
+    def execute(self, rules=None, trace: Optional[list] = None) -> List[OpportunityResult]:
+        """Runs every registered check, or only those named in `rules`."""
+        if is_new_regime(self.profile):
+            skipped = [name for name in self.DEDUCTION_RULES if rules is None or name in rules]
+            if trace is not None:
+                trace.extend(_skipped_traces(self, skipped, {"profile.newRegime": self.profile.get("newRegime")}))
+            rules = [name for name in self.RULE_NAMES if name not in self.DEDUCTION_RULES and (rules is None or name in rules)]
+        run_rules(self, rules, trace)
         return self.opportunities
 
+    def scenario_taxes(self) -> Dict[str, float]:
+        """Tax under each of TAX_SCENARIOS, computed once for all rules."""
+        if self._taxes is None:
+            self._taxes = {name: float(total[0]) for name, total in scenario_taxes([self.itr]).items()}
+        return self._taxes
+
+    def _saving(self, scenario: str) -> float:
+        taxes = self.scenario_taxes()
+        return taxes["old"] - taxes[scenario]
+
+    @rule(*TAX_INPUTS, "profile.newRegime", codes=("OPP_80C",))
     def _check_80c(self):
-        limit = 150000
-        gap = limit - self.itr.deductions_80c
+        gap = LIMIT_80C - self.itr.deductions_80c
         if gap > 5000:
-            self.opportunities.append(OpportunityResult(
-                title="Maximize 80C Deductions",
-                description=f"You have claimed ₹{self.itr.deductions_80c:,.0f} out of ₹1.5L. Invest remaining to save tax.",
-                potential_savings=gap * 0.30,
-                opp_code="OPP_80C"
-            ))
+            savings = self._saving("fill_80c")
+            if savings > 0:
+                self.opportunities.append(opportunity_80c(self.itr.deductions_80c, savings))
 
+    @rule(*TAX_INPUTS, "profile.newRegime", codes=("OPP_80D",))
     def _check_80d(self):
         if self.itr.deductions_80d == 0:
-            self.opportunities.append(OpportunityResult(
-                title="Health Insurance (80D)",
-                description="You haven't claimed Health Insurance. Save up to ₹25k (Self) + ₹50k (Parents).",
-                potential_savings=25000 * 0.30,
-                opp_code="OPP_80D"
-            ))
+            savings = self._saving("claim_80d")
+            if savings > 0:
+                self.opportunities.append(opportunity_80d(savings))
 
+    @rule(*TAX_INPUTS, "profile.newRegime", codes=("OPP_NPS",))
     def _check_nps(self):
         if self.itr.deductions_80ccd_1b == 0:
-            self.opportunities.append(OpportunityResult(
-                title="NPS Contribution (80CCD 1B)",
-                description="Invest ₹50,000 in NPS for additional deduction over and above 80C.",
-                potential_savings=50000 * 0.30,
-                opp_code="OPP_NPS"
-            ))
+            savings = self._saving("claim_nps")
+            if savings > 0:
+                self.opportunities.append(opportunity_nps(savings))
+
+    @rule(*TAX_INPUTS, codes=("OPP_REGIME_SWITCH",))
+    def _check_regime(self):
+        taxes = self.scenario_taxes()
+        filed, other = ("old", "new") if filed_regime(self.itr) == tax_engine.OLD else ("new", "old")
+        if taxes[filed] - taxes[other] >= REGIME_SWITCH_MIN:
+            self.opportunities.append(opportunity_regime_switch(other, taxes[filed], taxes[other]))
+
+_register_rules("opportunities", OpportunityEngine)
 
 # ==========================================
 # 5. Public API Functions
 # ==========================================
 
 class TaxCalendarEngine:
-    def __init__(self, itr: RawITR):
+    RESULTS = "schedule"
+
+    def __init__(self, itr: RawITR, estimated_tax: Optional[float] = None):
         self.itr = itr
+        self.estimated_tax = estimated_tax # projected_tax for the current FY, if already computed
         self.schedule = []
 
-    def execute(self) -> List[Dict]:
-        estimated_tax = self.itr.tax_paid * 1.10 
+    def execute(self, rules=None, trace: Optional[list] = None) -> List[Dict]:
+        run_rules(self, rules, trace)
+        return self.schedule
+
+    @rule(*TAX_INPUTS, "date")
+    def advance_tax_schedule(self) -> List[Dict]:
         today = date.today()
         year = today.year if today.month > 3 else today.year - 1
+        estimated_tax = self.estimated_tax if self.estimated_tax is not None else projected_tax(self.itr, year)
         
         deadlines = [
             {"quarter": "Q1", "due_date": f"{year}-06-15", "percent": 0.15},
@@ -413,34 +960,85 @@ class TaxCalendarEngine:
                 "status": status,
                 "reminder": f"Pay {int(item['percent']*100)}% of tax by {item['due_date']}"
             })
+        self.schedule = results
         return results
 
-def evaluate_risks(itr_json: dict, ais_data: list = None, user_profile: dict = None) -> list:
+_register_rules("tax_calendar", TaxCalendarEngine)
+
+ENGINES = ("risks", "opportunities", "tax_calendar")
+
+# Bump whenever a rule's logic or output changes, so stored results are re-evaluated
+RULE_ENGINE_VERSION = "6"
+
+class EvaluationResult:
+    """Combined output of all engines for one ITR/AIS pair"""
+    def __init__(self):
+        self.risks = []
+        self.opportunities = []
+        self.tax_calendar = []
+        self.timings = {} # stage -> milliseconds
+        self.trace = [] # RuleTrace dicts of a traced evaluation
+
+def evaluate_all(itr_json: dict, ais_data: list = None, user_profile: dict = None, engines=ENGINES, rules=None,
+                 trace: Optional[bool] = None) -> EvaluationResult:
+    """
+    Normalizes the ITR/AIS once and runs the requested engines over the shared RawITR/RawAIS.
+    itr_json / ais_data may also be an already-normalized RawITR / RawAIS.
+    `rules` (names from RULES) limits evaluation to those rules; engines with none selected are skipped.
+    A failing engine yields an empty list without affecting the others.
+    `trace` (default: RULE_TRACE) records a RuleTrace per rule in result.trace and RULE_STATS.
+    """
+    result = EvaluationResult()
+    if rules is not None:
+        engines = [engine for engine in engines if any(RULES[name].engine == engine for name in rules)]
+    traces = [] if (RULE_TRACE if trace is None else trace) else None
+
+    start = time.perf_counter()
     try:
-        raw_itr = DataNormalizer.normalize_itr(itr_json)
-        raw_ais = DataNormalizer.normalize_ais(ais_data if ais_data else [])
-        engine = RiskEngine(raw_itr, raw_ais, user_profile)
-        risk_objects = engine.execute()
-        return [vars(r) for r in risk_objects]
+        raw_itr = itr_json if isinstance(itr_json, RawITR) else DataNormalizer.normalize_itr(itr_json)
+        if isinstance(ais_data, RawAIS):
+            raw_ais = ais_data
+        else:
+            raw_ais = DataNormalizer.normalize_ais(ais_data if ais_data else [], raw_itr.ay) if "risks" in engines else None
     except Exception as e:
-        print(f"Risk Engine Error: {e}")
-        return []
+        logging.exception(f"Normalization Error: {e}")
+        return result
+    result.timings["normalize"] = (time.perf_counter() - start) * 1000
+
+    if "risks" in engines:
+        start = time.perf_counter()
+        try:
+            result.risks = [r.to_dict() for r in RiskEngine(raw_itr, raw_ais, user_profile).execute(rules, traces)]
+        except Exception as e:
+            logging.exception(f"Risk Engine Error: {e}")
+        result.timings["risks"] = (time.perf_counter() - start) * 1000
+
+    if "opportunities" in engines:
+        start = time.perf_counter()
+        try:
+            result.opportunities = [o.to_dict() for o in OpportunityEngine(raw_itr, user_profile).execute(rules, traces)]
+        except Exception as e:
+            logging.exception(f"Opp Engine Error: {e}")
+        result.timings["opportunities"] = (time.perf_counter() - start) * 1000
+
+    if "tax_calendar" in engines:
+        start = time.perf_counter()
+        try:
+            result.tax_calendar = TaxCalendarEngine(raw_itr).execute(rules, traces)
+        except Exception as e:
+            logging.exception(f"Tax Calendar Error: {e}")
+        result.timings["tax_calendar"] = (time.perf_counter() - start) * 1000
+
+    if traces is not None:
+        RULE_STATS.record(traces)
+        result.trace = [entry.to_dict() for entry in traces]
+    return result
+
+def evaluate_risks(itr_json: dict, ais_data: list = None, user_profile: dict = None) -> list:
+    return evaluate_all(itr_json, ais_data, user_profile, engines=("risks",)).risks
 
 def evaluate_opportunities(itr_json: dict, user_profile: dict = None) -> list:
-    try:
-        raw_itr = DataNormalizer.normalize_itr(itr_json)
-        engine = OpportunityEngine(raw_itr, user_profile)
-        opp_objects = engine.execute()
-        return [vars(o) for o in opp_objects]
-    except Exception as e:
-        print(f"Opp Engine Error: {e}")
-        return []
+    return evaluate_all(itr_json, user_profile=user_profile, engines=("opportunities",)).opportunities
 
 def evaluate_tax_calendar(itr_json: dict) -> list:
-    try:
-        raw_itr = DataNormalizer.normalize_itr(itr_json)
-        engine = TaxCalendarEngine(raw_itr)
-        return engine.execute()
-    except Exception as e:
-        print(f"Tax Calendar Error: {e}")
-        return []
\ No newline at end of file
+    return evaluate_all(itr_json, engines=("tax_calendar",)).tax_calendar
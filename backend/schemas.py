@@ -46,6 +46,8 @@ class UserProfile(BaseModel):
 
 # Dashboard Response Models
 class RiskSchema(BaseModel):
+    id: Optional[int] = None
+    risk_code: Optional[str] = None # Stable per (PAN, AY), see rule_engine.RULES
     ay: Optional[str] = None
     title: str
     severity: str
@@ -56,6 +58,8 @@ class RiskSchema(BaseModel):
         orm_mode = True
 
 class OpportunitySchema(BaseModel):
+    id: Optional[int] = None
+    opp_code: Optional[str] = None
     ay: Optional[str] = None
     title: str
     description: str
@@ -113,3 +117,23 @@ class DashboardResponse(BaseModel):
     opportunities: List[OpportunitySchema]
     advance_tax: List[AdvanceTaxSchema]
     tds_tcs: List[TDSSchema]
+
+# Tax What-If
+class WhatIfRequest(BaseModel):
+    # Every combination of the listed amounts and regimes is evaluated
+    extra_80c: List[float] = [0]
+    extra_80d: List[float] = [0]
+    extra_nps: List[float] = [0]
+    regimes: List[str] = ["old", "new"]
+
+    @validator("extra_80c", "extra_80d", "extra_nps")
+    def check_amounts(cls, v):
+        if not v or any(amount < 0 for amount in v):
+            raise ValueError("must be a non-empty list of non-negative amounts")
+        return v
+
+    @validator("regimes")
+    def check_regimes(cls, v):
+        if not v or any(str(regime).lower() not in ("old", "new") for regime in v):
+            raise ValueError('must be a non-empty list of "old" / "new"')
+        return [str(regime).lower() for regime in v]
@@ -0,0 +1,187 @@
+from sqlalchemy import insert, update, delete
+from sqlalchemy.orm import Session
+from typing import Callable, List, Optional, Sequence, Tuple
+
+# ==========================================
+# Bulk Write Path
+# ==========================================
+# executemany-style inserts and set-based upserts for ingestion tables.
+# These bypass per-object ORM bookkeeping (identity map, unit-of-work flush),
+# which dominates the cost of ingesting thousands of AIS/TDS rows.
+
+def insert_rows(db: Session, model, rows: List[dict]) -> int:
+    """Inserts all rows with a single executemany. Returns the number inserted."""
+    if not rows:
+        return 0
+    db.execute(insert(model), rows)
+    return len(rows)
+
+def insert_rows_returning_ids(db: Session, model, rows: List[dict]) -> List[int]:
+    """Like insert_rows, but returns the new primary keys in row order."""
+    if not rows:
+        return []
+    return list(db.scalars(insert(model).returning(model.id, sort_by_parameter_order=True), rows))
+
+def upsert_rows(db: Session, model, rows: List[dict], key_fields: Sequence[str], scope: Sequence) -> int:
+    """
+    Set-based upsert: one SELECT loads the existing keys inside `scope` (filter
+    expressions), then matching rows are updated and the rest inserted, each with
+    a single executemany. Returns the number of rows written.
+    """
+    if not rows:
+        return 0
+
+    key_columns = [getattr(model, field) for field in key_fields]
+    existing = {
+        tuple(row[1:]): row[0]
+        for row in db.query(model.id, *key_columns).filter(*scope)
+    }
+
+    updates, inserts = [], []
+    for row in rows:
+        row_id = existing.get(tuple(row[field] for field in key_fields))
+        if row_id is None:
+            inserts.append(row)
+        else:
+            updates.append({"id": row_id, **row})
+
+    if updates:
+        db.execute(update(model), updates)
+    if inserts:
+        db.execute(insert(model), inserts)
+    return len(rows)
+
+DELETE_CHUNK_SIZE = 500 # Stay well below SQLite's bound-parameter limit
+
+def delete_ids(db: Session, model, ids: List[int]) -> int:
+    for start in range(0, len(ids), DELETE_CHUNK_SIZE):
+        chunk = ids[start:start + DELETE_CHUNK_SIZE]
+        db.execute(delete(model).where(model.id.in_(chunk)).execution_options(synchronize_session=False))
+    return len(ids)
+
+class KeyedSync:
+    """
+    Makes the rows of a table match an incoming set identified by `key_field`,
+    with rows arriving in batches so the full set never has to be in memory:
+    new keys are inserted, keys whose `value_fields` changed are updated, and on
+    finish() keys that were not seen (or rows without a key) inside the final
+    scope are deleted. Unchanged rows are not touched.
+    Only the keys seen so far are retained between batches, so memory is O(keys), not
+    O(rows): finish() needs the complete key set to know which stored rows are stale
+    (roughly 100 bytes per key, e.g. ~10 MB for 100k rows).
+    on_insert / on_delete, if given, receive the inserted rows and the deleted rows
+    (as dicts of `tracked_fields`), e.g. to maintain derived totals.
+    """
+    def __init__(self, db: Session, model, key_field: str, value_fields: Sequence[str], owner_scope: Sequence,
+                 tracked_fields: Sequence[str] = (), on_insert: Optional[Callable] = None, on_delete: Optional[Callable] = None):
+        self.db = db
+        self.model = model
+        self.key_field = key_field
+        self.value_fields = tuple(value_fields)
+        self.owner_scope = tuple(owner_scope)
+        self.tracked_fields = tuple(tracked_fields)
+        self.on_insert = on_insert
+        self.on_delete = on_delete
+        self.seen_keys = set()
+        self.inserted = 0
+        self.updated = 0
+        self.deleted = 0
+
+    def apply(self, rows: List[dict]):
+        key_column = getattr(self.model, self.key_field)
+        value_columns = [getattr(self.model, field) for field in self.value_fields]
+
+        keys = [row[self.key_field] for row in rows]
+        existing = {}
+        for start in range(0, len(keys), DELETE_CHUNK_SIZE):
+            chunk = keys[start:start + DELETE_CHUNK_SIZE]
+            query = self.db.query(self.model.id, key_column, *value_columns).filter(*self.owner_scope, key_column.in_(chunk))
+            for row in query:
+                # Duplicate keys are left out here and removed in finish()
+                existing.setdefault(row[1], (row[0], tuple(row[2:])))
+
+        inserts, updates = [], []
+        for row in rows:
+            key = row[self.key_field]
+            if key in self.seen_keys:
+                continue
+            self.seen_keys.add(key)
+            current = existing.get(key)
+            if current is None:
+                inserts.append(row)
+            elif current[1] != tuple(row[field] for field in self.value_fields):
+                updates.append({"id": current[0], **{field: row[field] for field in self.value_fields}})
+
+        if updates:
+            self.db.execute(update(self.model), updates)
+        if inserts:
+            self.db.execute(insert(self.model), inserts)
+            if self.on_insert:
+                self.on_insert(inserts)
+        self.inserted += len(inserts)
+        self.updated += len(updates)
+
+    def finish(self, scope: Sequence) -> Tuple[int, int, int]:
+        """Deletes rows inside `scope` that were not part of the incoming set."""
+        key_column = getattr(self.model, self.key_field)
+        tracked_columns = [getattr(self.model, field) for field in self.tracked_fields]
+        kept = set()
+        stale_ids = []
+        stale_rows = []
+        for row in self.db.query(self.model.id, key_column, *tracked_columns).filter(*self.owner_scope, *scope):
+            key = row[1]
+            if key is None or key not in self.seen_keys or key in kept:
+                stale_ids.append(row[0])
+                if self.on_delete:
+                    stale_rows.append(dict(zip(self.tracked_fields, row[2:])))
+            else:
+                kept.add(key)
+        self.deleted = delete_ids(self.db, self.model, stale_ids)
+        if stale_rows:
+            self.on_delete(stale_rows)
+        return self.inserted, self.updated, self.deleted
+
+def sync_rows(db: Session, model, rows: List[dict], key_field: str, value_fields: Sequence[str], scope: Sequence) -> Tuple[int, int, int]:
+    """KeyedSync for a complete in-memory set of rows. Returns (inserted, updated, deleted)."""
+    sync = KeyedSync(db, model, key_field, value_fields, owner_scope=scope)
+    sync.apply(rows)
+    return sync.finish(())
+
+def reconcile_rows(db: Session, model, rows: List[dict], key_field: str, compare_fields: Sequence[str],
+                   scope: Sequence, force: bool = False) -> Tuple[List[int], int, int]:
+    """
+    Makes the rows inside `scope` match `rows`, one row per `key_field` value, keeping
+    primary keys stable: rows whose `compare_fields` are unchanged are left alone (with
+    any columns not in `rows`), changed ones are updated in place (all of them if
+    `force`), new keys inserted, and rows whose key disappeared (or is NULL / duplicated)
+    deleted. Returns (ids of inserted or updated rows, unchanged count, deleted count).
+    """
+    key_column = getattr(model, key_field)
+    compare_columns = [getattr(model, field) for field in compare_fields]
+
+    existing = {}
+    stale_ids = []
+    for row in db.query(model.id, key_column, *compare_columns).filter(*scope).order_by(model.id):
+        if row[1] is None or row[1] in existing:
+            stale_ids.append(row[0])
+        else:
+            existing[row[1]] = (row[0], tuple(row[2:]))
+
+    changed_ids, updates, inserts = [], [], []
+    unchanged = 0
+    for row in rows:
+        current = existing.pop(row[key_field], None)
+        if current is None:
+            inserts.append(row)
+        elif force or current[1] != tuple(row[field] for field in compare_fields):
+            updates.append({"id": current[0], **row})
+            changed_ids.append(current[0])
+        else:
+            unchanged += 1
+    stale_ids.extend(row_id for row_id, _ in existing.values())
+
+    if updates:
+        db.execute(update(model), updates)
+    changed_ids.extend(insert_rows_returning_ids(db, model, inserts))
+    deleted = delete_ids(db, model, stale_ids)
+    return changed_ids, unchanged, deleted
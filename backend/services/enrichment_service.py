@@ -0,0 +1,111 @@
+from sqlalchemy.orm import Session
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import partial
+from typing import List
+from .. import models, database, explanations
+from ..ai_engine import get_ai_engine
+import json
+import logging
+import os
+
+# Hard latency budget for AI enrichment on the request path (login, sync, questionnaire).
+AI_ENRICHMENT_BUDGET_SECONDS = float(os.getenv("AI_ENRICHMENT_BUDGET_SECONDS", "1.5"))
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="ai-enrich")
+
+def _risk_data(risk: models.Risk) -> dict:
+    return {
+        "risk_code": risk.risk_code,
+        "title": risk.title,
+        "description": risk.description,
+        "amount_involved": risk.amount_involved,
+        "severity": risk.severity
+    }
+
+def _append_insight(risk: models.Risk, explanation: str, label: str = "AI Insight"):
+    solutions = json.loads(risk.solutions) if risk.solutions else []
+    solutions.append(f"{label}: {explanation}")
+    risk.solutions = json.dumps(solutions)
+
+def _risk_version(db: Session, risk: models.Risk) -> tuple:
+    """
+    What a late explanation is checked against before it is written: the fingerprint of
+    the evaluation that stored the row and the row's solutions. Row ids survive
+    re-evaluation, so the id alone does not tell whether the row was rewritten since.
+    """
+    fingerprint = db.query(models.User.rules_fingerprint).filter(models.User.pan == risk.user_pan).scalar()
+    return fingerprint, risk.solutions
+
+def _complete_late_explanation(risk_id: int, version: tuple, future):
+    """
+    Done-callback for explanations that missed the budget.
+    Writes the insight onto the stored Risk row using its own session, unless a newer
+    evaluation or enrichment has changed the row since the call was submitted.
+    """
+    if future.cancelled() or future.exception() is not None:
+        return
+    explanation = future.result()
+    if not explanation:
+        return
+
+    db = database.SessionLocal()
+    try:
+        risk = db.query(models.Risk).filter(models.Risk.id == risk_id).first()
+        if risk is None or _risk_version(db, risk) != version:
+            logging.info(f"Dropping late AI explanation for risk {risk_id}: row changed since it was requested.")
+            return
+        _append_insight(risk, explanation)
+        db.commit()
+    except Exception as e:
+        logging.error(f"Late AI enrichment failed for risk {risk_id}: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+def enrich_risks(db: Session, risks: List[models.Risk], user_profile: dict = None):
+    """
+    Adds explanations to already-persisted Risk rows.
+    Known risk types are explained instantly from local templates; only the rest go
+    to the LLM, which is waited on for at most AI_ENRICHMENT_BUDGET_SECONDS. Anything
+    still running after that is filled in by a background callback once the LLM answers.
+    """
+    if not risks:
+        return
+
+    novel_risks = []
+    for risk in risks:
+        explanation = explanations.render_explanation(_risk_data(risk), user_profile)
+        if explanation:
+            _append_insight(risk, explanation, label="Insight")
+        else:
+            novel_risks.append(risk)
+    db.commit()
+
+    if not novel_risks:
+        return
+
+    ai = get_ai_engine()
+    if not ai.available:
+        logging.info("AI enrichment skipped (AI disabled or circuit breaker open).")
+        return
+
+    futures = {}
+    versions = {}
+    for risk in novel_risks:
+        versions[risk.id] = _risk_version(db, risk)
+        futures[_executor.submit(ai.generate_risk_explanation, _risk_data(risk), user_profile)] = risk
+
+    done, pending = wait(futures, timeout=AI_ENRICHMENT_BUDGET_SECONDS)
+
+    for future in done:
+        explanation = future.result()
+        if explanation:
+            _append_insight(futures[future], explanation)
+    db.commit()
+
+    for future in pending:
+        risk_id = futures[future].id
+        future.add_done_callback(partial(_complete_late_explanation, risk_id, versions[risk_id]))
+
+    if pending:
+        logging.info(f"AI enrichment: {len(done)} explanations inline, {len(pending)} deferred to background.")
@@ -1,5 +1,9 @@
 from sqlalchemy.orm import Session
-from .. import models, rule_engine
+from contextlib import contextmanager
+from datetime import date
+from .. import database, models, rule_engine, batch_rule_engine, itr_extractor, artifact_codec
+from . import enrichment_service, bulk_writer, sync_service
+import hashlib
 import json
 import logging
 
@@ -8,190 +12,527 @@ def process_itr_data(db: Session, pan: str, itr_json: dict):
     Processes a single ITR JSON:
     1. Extracts key fields.
     2. Upserts ITR_Filing record.
-    3. Runs Rule Engine to generate Risks/Opportunities.
+    3. Runs Rule Engine to generate Risks/Opportunities/Advance Tax
+       (once per batch when called inside rule_batch).
     """
     try:
-        # 1. Extract Fields (Same as before)
-        itr_root = itr_json.get("ITR", {})
-        form_type = next(iter(itr_root)) if itr_root else "Unknown"
-        form_data = itr_root.get(form_type, {})
-        
-        # Defaults
-        ay = "Unknown"
-        ack_num = "UNKNOWN_ACK"
-        filing_date = "Unknown"
-        total_income = 0.0
-        tax_payable = 0.0
-        refund = "0"
-        
-        # Branch Logic based on Form Type (ITR-1/ITR-4 vs ITR-2/ITR-3)
-        if "ITR1" in form_type or "ITR4" in form_type:
-             ay = form_data.get(f"Form_{form_type}", {}).get("AssessmentYear", "Unknown")
-             personal_info = form_data.get("PersonalInfo", {})
-             filing_status = form_data.get("FilingStatus", {})
-             ack_num = filing_status.get("AcknowledgementNumber", filing_status.get("ReceiptNo", "Pending"))
-             filing_date = filing_status.get("DateOfFiling", filing_status.get("OrigRetFiledDate", "Unknown"))
-             if filing_date == "Unknown":
-                 creation_info = form_data.get("CreationInfo", {})
-                 filing_date = creation_info.get("JSONCreationDate", "Unknown")
-             inc_ded = form_data.get(f"{form_type}_IncomeDeductions", {})
-             total_income = float(inc_ded.get("TotalIncome", 0))
-             tax_comp = form_data.get(f"{form_type}_TaxComputation", {})
-             tax_payable = float(tax_comp.get("NetTaxLiability", 0))
-             refund = form_data.get("Refund", {}).get("RefundDue", "0")
-        else:
-            ay = form_data.get(f"Form_{form_type}", {}).get("AssessmentYear", "Unknown")
-            personal_info = form_data.get("PartA_GEN1", {}).get("PersonalInfo", {})
-            filing_status = form_data.get("PartA_GEN1", {}).get("FilingStatus", {})
-            ack_num = filing_status.get("AcknowledgementNumber", filing_status.get("ReceiptNo", "Pending"))
-            filing_date = filing_status.get("DateOfFiling", filing_status.get("OrigRetFiledDate", "Unknown"))
-            if filing_date == "Unknown":
-                creation_info = form_data.get("CreationInfo", {})
-                filing_date = creation_info.get("JSONCreationDate", "Unknown")
-            part_b_ti = form_data.get("PartB-TI", {})
-            total_income = float(part_b_ti.get("TotalIncome", 0))
-            part_b_tti = form_data.get("PartB_TTI", {})
-            tax_payable = float(part_b_tti.get("NetTaxLiability", 0))
-            refund = part_b_tti.get("Refund", {}).get("RefundDue", "0")
-
-        # Upsert User Name & DOB if available
-        user = db.query(models.User).filter(models.User.pan == pan).first()
-        if user and personal_info:
-            first = personal_info.get("AssesseeName", {}).get("FirstName", "")
-            mid = personal_info.get("AssesseeName", {}).get("MiddleName", "")
-            last = personal_info.get("AssesseeName", {}).get("SurNameOrOrgName", "")
-            full_name = f"{first} {mid} {last}".replace("  ", " ").strip()
-            if full_name: user.name = full_name
+        # A byte-identical return is already stored and evaluated: nothing to do
+        content_hash = artifact_codec.content_hash(itr_json)
+        if itr_unchanged(db, pan, content_hash):
+            logging.info(f"ITR for {pan} unchanged ({content_hash}), skipped.")
+            return True, "Unchanged, skipped"
+        return store_itr(db, pan, prepare_itr(itr_json, content_hash))
+    except Exception as e:
+        logging.error(f"Error processing ITR: {e}")
+        return False, str(e)
+
+def itr_unchanged(db: Session, pan: str, content_hash: str) -> bool:
+    return db.query(models.ITR_Filing.id).filter(
+        models.ITR_Filing.user_pan == pan,
+        models.ITR_Filing.content_hash == content_hash
+    ).first() is not None
+
+def prepare_itr(itr_json: dict, content_hash: str = None) -> dict:
+    """
+    The CPU-bound half of ITR ingestion (hashing, compression, field extraction), without
+    database access. The result is picklable, so it can be computed in a worker process.
+    """
+    raw_blob = artifact_codec.encode(itr_json)
+    fields = itr_extractor.extract_itr(itr_json)
+    prepared = {
+        "content_hash": content_hash or artifact_codec.content_hash(itr_json),
+        "raw_blob": raw_blob,
+        "fields": fields,
+        "ack_num": fields["ack_num"],
+    }
+    if prepared["ack_num"] == "Pending":
+        json_hash = hashlib.md5(json.dumps(itr_json).encode()).hexdigest()[:8]
+        prepared["ack_num"] = f"PENDING-{fields['ay']}-{json_hash}"
+    return prepared
+
+def store_itr(db: Session, pan: str, prepared: dict):
+    """Writes a prepare_itr result: upserts the ITR_Filing and updates the user's name and DOB."""
+    try:
+        # Commits and runs the Rule Engine on exit, or defers both to an enclosing rule_batch
+        with ingestion(db, pan):
+            # 1. Extracted Fields (single pass, shared with the normalizer and profile)
+            raw_blob = prepared["raw_blob"]
+            content_hash = prepared["content_hash"]
+            fields = prepared["fields"]
+            form_type = fields["form_type"]
+            ay = fields["ay"]
+            ack_num = prepared["ack_num"]
+            filing_date = fields["filing_date"]
+            total_income = fields["total_income"]
+            tax_payable = fields["tax_payable"]
+            refund = fields["refund_due"]
+
+            # Upsert User Name & DOB if available
+            user = db.query(models.User).filter(models.User.pan == pan).first()
+            if user:
+                full_name = itr_extractor.full_name(fields)
+                if full_name: user.name = full_name
             
-            dob = personal_info.get("DOB")
-            if dob:
-                try:
-                    if "-" in dob:
-                        parts = dob.split("-")
-                        if len(parts[0]) == 4: # YYYY-MM-DD -> DD-MM-YYYY
-                             dob = f"{parts[2]}-{parts[1]}-{parts[0]}"
-                except: pass
-                user.dob = dob
-            db.add(user)
-
-        # Upsert ITR Filing
-        if ack_num == "Pending":
-            import hashlib
-            json_hash = hashlib.md5(json.dumps(itr_json).encode()).hexdigest()[:8]
-            ack_num = f"PENDING-{ay}-{json_hash}"
-        
-        existing_itr = db.query(models.ITR_Filing).filter(models.ITR_Filing.ack_num == ack_num).first()
-        if existing_itr:
-            existing_itr.ay = ay
-            existing_itr.filing_date = filing_date
-            existing_itr.total_income = total_income
-            existing_itr.tax_payable = tax_payable
-            existing_itr.itr_type = form_type
-            existing_itr.refund_amount = str(refund)
-            existing_itr.raw_data = json.dumps(itr_json)
-        else:
-            new_itr = models.ITR_Filing(
-                user_pan=pan, ack_num=ack_num, ay=ay, filing_date=filing_date,
-                total_income=total_income, tax_payable=tax_payable, itr_type=form_type,
-                status="Filed", refund_amount=str(refund), raw_data=json.dumps(itr_json)
-            )
-            db.add(new_itr)
-        
-        # 4. Generate Advance Tax Schedule
-        adv_tax_schedule = rule_engine.evaluate_tax_calendar(itr_json)
-        for tax in adv_tax_schedule:
-            exists = db.query(models.AdvanceTax).filter(
-                models.AdvanceTax.user_pan == pan,
-                models.AdvanceTax.quarter == tax['quarter'],
-                models.AdvanceTax.section == tax['section']
-            ).first()
-            if exists:
-                exists.amount = str(tax['amount'])
-                exists.status = tax['status']
-                exists.due_date = tax['due_date']
-                exists.reminder = tax.get('reminder', '')
-            else:
-                db.add(models.AdvanceTax(user_pan=pan, **tax))
+                dob = fields["dob"]
+                if dob:
+                    try:
+                        if "-" in dob:
+                            parts = dob.split("-")
+                            if len(parts[0]) == 4: # YYYY-MM-DD -> DD-MM-YYYY
+                                 dob = f"{parts[2]}-{parts[1]}-{parts[0]}"
+                    except: pass
+                    user.dob = dob
+                db.add(user)
 
-        db.commit()
-        
-        # 5. Run Rule Engine for User
-        run_rules_for_user(db, pan)
+            # Upsert ITR Filing
+            existing_itr = db.query(models.ITR_Filing).filter(models.ITR_Filing.ack_num == ack_num).first()
+            if existing_itr:
+                existing_itr.ay = ay
+                existing_itr.filing_date = filing_date
+                existing_itr.total_income = total_income
+                existing_itr.tax_payable = tax_payable
+                existing_itr.itr_type = form_type
+                existing_itr.refund_amount = str(refund)
+                existing_itr.raw_blob = raw_blob
+                existing_itr.raw_data = None
+                existing_itr.content_hash = content_hash
+                apply_extracted_fields(existing_itr, fields)
+            else:
+                new_itr = models.ITR_Filing(
+                    user_pan=pan, ack_num=ack_num, ay=ay, filing_date=filing_date,
+                    total_income=total_income, tax_payable=tax_payable, itr_type=form_type,
+                    status="Filed", refund_amount=str(refund), raw_blob=raw_blob, content_hash=content_hash
+                )
+                apply_extracted_fields(new_itr, fields)
+                db.add(new_itr)
         
         return True, "Processed successfully"
     
     except Exception as e:
         logging.error(f"Error processing ITR: {e}")
-        db.rollback()
         return False, str(e)
 
+def apply_extracted_fields(filing: models.ITR_Filing, fields):
+    """Copies the normalized ITR fields onto the filing's columns."""
+    # Seeded / legacy rows may carry only the summary total income
+    filing.gross_total_income = itr_extractor.gross_income(fields) or filing.total_income or 0.0
+    filing.tax_paid = fields["tax_paid"]
+    filing.house_property_income = fields["house_property_income"]
+    filing.capital_gains_stcg = fields["capital_gains_stcg"]
+    filing.capital_gains_ltcg = fields["capital_gains_ltcg"]
+    filing.deductions_80c = fields["deductions_80c"]
+    filing.deductions_80d = fields["deductions_80d"]
+    filing.deductions_80ccd_1b = fields["deductions_80ccd_1b"]
+    filing.tds_claimed = fields["tds_claimed"]
+    filing.residential_status = fields["residential_status"]
+    filing.opt_out_new_regime = fields["opt_out_new_regime"]
+    filing.opt_in_new_regime = fields["opt_in_new_regime"]
+    filing.assessee_name = itr_extractor.full_name(fields)
+    filing.assessee_dob = str(fields["dob"]) if fields["dob"] else None
+    filing.address = itr_extractor.format_address(fields)
+    filing.phone = itr_extractor.format_phone(fields)
+    filing.email = fields["email"]
+    filing.fields_extracted = True
+
+def reprocess_filing(db: Session, filing: models.ITR_Filing):
+    """
+    Re-extracts the normalized columns from the stored raw JSON.
+    This is the only path that loads the raw return; used for filings stored before
+    the columns existed or after an extractor change. Legacy uncompressed raw_data
+    is migrated to raw_blob on the way.
+    Runs in a savepoint and leaves the commit to the caller, so it is safe inside a rule_batch.
+    Returns False if the raw JSON could not be extracted; fields_extracted then stays False.
+    """
+    try:
+        database.begin_transaction(db)
+        with db.begin_nested():
+            if filing.raw_blob:
+                fields = itr_extractor.extract_itr_raw(filing.raw_blob)
+            else:
+                itr_json = filing.raw_json
+                filing.raw_blob = artifact_codec.encode(itr_json)
+                filing.raw_data = None
+                fields = itr_extractor.extract_itr(itr_json)
+            # Keep summary values of seeded/legacy rows whose raw JSON lacks them
+            if fields["tax_payable"]:
+                filing.tax_payable = fields["tax_payable"]
+            apply_extracted_fields(filing, fields)
+        return True
+    except Exception as e:
+        logging.error(f"Reprocessing filing {filing.ack_num} failed: {e}")
+        return False
+
+def _upsert_advance_tax(db: Session, pan: str, schedule: list):
+    rows = [{
+        "user_pan": pan,
+        "quarter": tax['quarter'],
+        "section": tax['section'],
+        "due_date": tax['due_date'],
+        "amount": str(tax['amount']),
+        "status": tax['status'],
+        "reminder": tax.get('reminder', '')
+    } for tax in schedule]
+    bulk_writer.upsert_rows(
+        db, models.AdvanceTax, rows,
+        key_fields=("user_pan", "quarter", "section"),
+        scope=(models.AdvanceTax.user_pan == pan,)
+    )
+
+def _format_timings(timings: dict) -> str:
+    return ", ".join(f"{stage}={ms:.2f}" for stage, ms in timings.items())
+
+# Risk rows carry an explanation for the user's risk appetite, so it counts as an input of every risk rule
+ENRICHMENT_INPUTS = {"profile.risk"}
+
+def rule_inputs(ay: str, raw_itr: rule_engine.RawITR, raw_ais: rule_engine.RawAIS, user_profile: dict) -> dict:
+    """
+    Flat snapshot of everything the rules read, named like the rule registry's inputs
+    ("itr.<field>", "ais.<field>", "profile.<key>", "date"), plus the AY and rule-engine version.
+    """
+    inputs = {
+        "version": rule_engine.RULE_ENGINE_VERSION,
+        "ay": ay,
+        "date": date.today().isoformat(), # the advance tax schedule depends on it
+    }
+    for field, value in raw_itr.to_dict().items():
+        inputs[f"itr.{field}"] = value
+    for field, value in raw_ais.to_dict().items():
+        # The securities columns can be long; their hash is enough to detect a change
+        if field == "sale_of_securities":
+            value = value.digest()
+        elif field == "capital_gains":
+            value = value.to_dict()
+        inputs[f"ais.{field}"] = value
+    for key, value in user_profile.items():
+        inputs[f"profile.{key}"] = value
+    return inputs
+
+def rules_to_rerun(previous: dict, inputs: dict):
+    """
+    Names of the rules whose inputs differ from the previous evaluation's,
+    or None if everything has to be re-evaluated (first run, new AY or rule-engine version).
+    """
+    if not previous or previous.get("version") != inputs["version"] or previous.get("ay") != inputs["ay"]:
+        return None
+    changed = {key for key in previous.keys() | inputs.keys() if previous.get(key) != inputs.get(key)}
+    rules = rule_engine.rules_reading(changed)
+    if changed & ENRICHMENT_INPUTS:
+        rules |= {name for name, registered in rule_engine.RULES.items() if registered.engine == "risks"}
+    return rules
+
+# Stored solutions get an explanation appended, so they are not compared
+RISK_COMPARE_FIELDS = ("title", "severity", "description", "amount_involved")
+OPPORTUNITY_COMPARE_FIELDS = ("title", "description", "potential_savings")
+
+def _codes_of(rules: set, engine: str) -> list:
+    return [code for name in rules if rule_engine.RULES[name].engine == engine for code in rule_engine.RULES[name].codes]
+
+def fy_for_ay(ay: str):
+    """The financial year ("2023-24") an assessment year ("2024-25") assesses, or None if unparseable."""
+    if ay and ay != "Unknown":
+        ay_str = ay.split("-")[0].strip()
+        if ay_str.isdigit():
+            ay_year = int(ay_str)
+            fy_year = ay_year - 1
+            return f"{fy_year}-{str(ay_year)[-2:]}"
+    return None
+
+def _load_profile(questionnaire_data) -> dict:
+    if questionnaire_data:
+        try:
+            return json.loads(questionnaire_data)
+        except ValueError:
+            pass
+    return {}
+
+def load_latest_itr(db: Session, pan: str):
+    """
+    (ay, RawITR) of the user's latest filing, or None if the user has no ITR or its
+    fields could not be extracted (an all-zero RawITR would yield bogus risks).
+    """
+    itr_record = db.query(models.ITR_Filing).filter(models.ITR_Filing.user_pan == pan).order_by(models.ITR_Filing.ay.desc()).first()
+    if not itr_record:
+        return None
+    if not itr_record.fields_extracted and not reprocess_filing(db, itr_record):
+        return None
+    return itr_record.ay, rule_engine.DataNormalizer.from_filing(itr_record)
+
+def load_user_inputs(db: Session, pan: str):
+    """
+    Loads what the Rule Engine evaluates for a user: (user, ay, RawITR, RawAIS, user_profile)
+    of the latest filing, or None if the user has no ITR or it could not be extracted.
+    """
+    # 1. Fetch Latest ITR
+    latest = load_latest_itr(db, pan)
+    if latest is None:
+        return None
+    ay, raw_itr = latest
+
+    # 2. Fetch User Profile (Questionnaire Data)
+    user = db.query(models.User).filter(models.User.pan == pan).first()
+    user_profile = _load_profile(user.questionnaire_data if user else None)
+
+    # 3. Fetch AIS Data (pre-aggregated per category at ingest)
+    raw_ais = None
+    try:
+        fy = fy_for_ay(ay)
+        if fy:
+            raw_ais = sync_service.load_raw_ais(db, pan, fy)
+    except Exception:
+        pass
+
+    if raw_ais is None:
+        raw_ais = rule_engine.RawAIS()
+    return user, ay, raw_itr, raw_ais, user_profile
+
+def _evaluate_user(db: Session, pan: str):
+    """
+    Runs the Rule Engine with Questionnaire Context and writes its results, without committing.
+    Only rules whose inputs changed since the stored evaluation are re-run; results of
+    the others are kept.
+    Returns (risk_ids, user_profile, timings) with the ids of new or changed risks, or None
+    if the user has no (extractable) ITR or nothing changed.
+    """
+    loaded = load_user_inputs(db, pan)
+    if loaded is None:
+        return None
+    user, ay, raw_itr, raw_ais, user_profile = loaded
+
+    # Stored results are still current if none of the inputs changed
+    inputs = rule_inputs(ay, raw_itr, raw_ais, user_profile)
+    fingerprint = artifact_codec.content_hash(inputs)
+    if user and user.rules_fingerprint == fingerprint:
+        logging.info(f"Rule Engine skipped for {pan} (inputs unchanged)")
+        return None
+
+    previous = previous_inputs(user)
+    rules = rules_to_rerun(previous, inputs)
+
+    # 4. Run the affected engines over a single normalization of the ITR/AIS
+    result = rule_engine.evaluate_all(raw_itr, raw_ais, user_profile=user_profile, rules=rules)
+    if rules is not None:
+        logging.info(f"Re-evaluating {len(rules)} of {len(rule_engine.RULES)} rules for {pan}: {', '.join(sorted(rules))}")
+
+    risk_ids = store_evaluation(db, user, pan, ay, inputs, fingerprint, previous, rules, result)
+    return risk_ids, user_profile, result.timings
+
+def trace_rules_for_user(db: Session, pan: str):
+    """
+    Runs every rule for the user's latest filing in trace mode, without storing anything.
+    Returns the per-rule trace and timings, or None if the user has no ITR.
+    """
+    loaded = load_user_inputs(db, pan)
+    if loaded is None:
+        return None
+    user, ay, raw_itr, raw_ais, user_profile = loaded
+    result = rule_engine.evaluate_all(raw_itr, raw_ais, user_profile=user_profile, trace=True)
+    return {
+        "pan": pan,
+        "ay": ay,
+        "rule_engine_version": rule_engine.RULE_ENGINE_VERSION,
+        "timings": result.timings,
+        "trace": result.trace,
+    }
+
+def previous_inputs(user: models.User):
+    """The rule inputs stored with the user's last evaluation, or None."""
+    if user and user.rules_inputs:
+        try:
+            return json.loads(user.rules_inputs)
+        except ValueError:
+            return None
+    return None
+
+def store_evaluation(db: Session, user: models.User, pan: str, ay: str, inputs: dict, fingerprint: str,
+                     previous: dict, rules, result: rule_engine.EvaluationResult) -> list:
+    """
+    Writes an evaluation of `rules` (None: all) to the results of (pan, ay) and records
+    its inputs on the user, without committing. Returns the ids of new or changed risks.
+    """
+    # 5. Risks (PASS USER PROFILE)
+    # Upserted by (PAN, AY, risk_code) within the re-run rules (all risks on a full run):
+    # unchanged risks keep their row, id and explanation; risks that disappeared are deleted.
+    risk_scope = [models.Risk.user_pan == pan, models.Risk.ay == ay]
+    if rules is not None:
+        risk_scope.append(models.Risk.risk_code.in_(_codes_of(rules, "risks")))
+    # Explanations depend on the risk appetite, so a change to it rewrites every re-run risk
+    reexplain = previous is None or previous.get("profile.risk") != inputs.get("profile.risk")
+    risk_ids, risks_kept, risks_deleted = bulk_writer.reconcile_rows(
+        db, models.Risk, [dict(risk, user_pan=pan, ay=ay) for risk in result.risks],
+        key_field="risk_code", compare_fields=RISK_COMPARE_FIELDS, scope=risk_scope, force=reexplain
+    )
+
+    # 6. Opportunities (PASS USER PROFILE)
+    opp_scope = [models.Opportunity.user_pan == pan, models.Opportunity.ay == ay]
+    if rules is not None:
+        opp_scope.append(models.Opportunity.opp_code.in_(_codes_of(rules, "opportunities")))
+    opp_ids, opps_kept, opps_deleted = bulk_writer.reconcile_rows(
+        db, models.Opportunity, [dict(opp, user_pan=pan, ay=ay) for opp in result.opportunities],
+        key_field="opp_code", compare_fields=OPPORTUNITY_COMPARE_FIELDS, scope=opp_scope
+    )
+    logging.info(
+        f"Rule results for {pan}: risks ~{len(risk_ids)} ={risks_kept} -{risks_deleted}, "
+        f"opportunities ~{len(opp_ids)} ={opps_kept} -{opps_deleted}"
+    )
+
+    # 7. Advance Tax Schedule
+    if rules is None or "advance_tax_schedule" in rules:
+        _upsert_advance_tax(db, pan, result.tax_calendar)
+    if user:
+        user.rules_fingerprint = fingerprint
+        user.rules_inputs = json.dumps(inputs)
+    return risk_ids
+
+def load_rule_table(db: Session, pans: list) -> batch_rule_engine.RuleTable:
+    """
+    Loads the rule inputs of many users into a columnar RuleTable, keyed by (pan, ay) of
+    each user's latest filing, with a fixed number of queries per chunk of PANs.
+    Users without a filing, or whose latest filing could not be extracted, are left out.
+    """
+    records = []
+    for start in range(0, len(pans), bulk_writer.DELETE_CHUNK_SIZE):
+        chunk = pans[start:start + bulk_writer.DELETE_CHUNK_SIZE]
+        latest = {}
+        for filing in db.query(models.ITR_Filing).filter(models.ITR_Filing.user_pan.in_(chunk)).order_by(models.ITR_Filing.ay.desc()):
+            latest.setdefault(filing.user_pan, filing)
+        profiles = {
+            pan: _load_profile(questionnaire_data)
+            for pan, questionnaire_data in db.query(models.User.pan, models.User.questionnaire_data).filter(models.User.pan.in_(chunk))
+        }
+        for pan, filing in list(latest.items()):
+            if not filing.fields_extracted and not reprocess_filing(db, filing):
+                del latest[pan]
+        ais_by_key = sync_service.load_raw_ais_many(
+            db, [(pan, fy_for_ay(filing.ay)) for pan, filing in latest.items() if fy_for_ay(filing.ay)]
+        )
+        for pan in chunk:
+            filing = latest.get(pan)
+            if filing is None:
+                continue
+            records.append((
+                (pan, filing.ay),
+                rule_engine.DataNormalizer.from_filing(filing),
+                ais_by_key.get((pan, fy_for_ay(filing.ay))),
+                profiles.get(pan, {})
+            ))
+    return batch_rule_engine.RuleTable.from_records(records)
+
+def _enrich(db: Session, risk_ids: list, user_profile: dict):
+    # AI Enrichment (bounded; risks are already stored with deterministic solutions)
+    if risk_ids:
+        risk_rows = db.query(models.Risk).filter(models.Risk.id.in_(risk_ids)).all()
+        enrichment_service.enrich_risks(db, risk_rows, user_profile)
+
 def run_rules_for_user(db: Session, pan: str):
     """
-    Runs the Rule Engine with Questionnaire Context.
+    Runs the Rule Engine with Questionnaire Context and commits the results.
     """
     try:
-        # 1. Fetch Latest ITR
-        itr_record = db.query(models.ITR_Filing).filter(models.ITR_Filing.user_pan == pan).order_by(models.ITR_Filing.ay.desc()).first()
-        if not itr_record:
+        evaluation = _evaluate_user(db, pan)
+        if evaluation is None:
             return
+        risk_ids, user_profile, timings = evaluation
+        db.commit()
+        logging.info(f"Rule Engine executed for {pan} (timings ms: {_format_timings(timings)})")
 
-        itr_json = json.loads(itr_record.raw_data)
-        ay = itr_record.ay
+        # 8. AI Enrichment
+        _enrich(db, risk_ids, user_profile)
 
-        # 2. Fetch User Profile (Questionnaire Data)
-        user = db.query(models.User).filter(models.User.pan == pan).first()
-        user_profile = {}
-        if user and user.questionnaire_data:
-            try:
-                user_profile = json.loads(user.questionnaire_data)
-            except:
-                user_profile = {}
+    except Exception as e:
+        logging.error(f"Rule Execution Failed for {pan}: {e}")
+        db.rollback()
+
+def run_rules_job(pan: str):
+    """run_rules_for_user with its own session, as a job_pool job."""
+    db = database.SessionLocal()
+    try:
+        run_rules_for_user(db, pan)
+    finally:
+        db.close()
+
+# ==========================================
+# Coalesced Re-evaluation
+# ==========================================
+# Ingestion inside a rule_batch only marks the PAN dirty; the Rule Engine then runs
+# once per dirty PAN when the batch closes, instead of once per ingested file.
 
-        # 3. Fetch AIS Data
-        ais_entries = []
+RULE_BATCH_KEY = "rule_batch" # Session.info key holding the dirty PANs of the open batch
+
+@contextmanager
+def ingestion(db: Session, pan: str):
+    """
+    Wraps the writes of one ingested artifact. Outside a rule_batch the rows are
+    committed and the rules run immediately. Inside one, the writes go into a
+    savepoint (a failing artifact does not discard the rest of the batch) and the
+    PAN is marked dirty.
+    """
+    batch = db.info.get(RULE_BATCH_KEY)
+    if batch is None:
         try:
-             if ay and ay != "Unknown":
-                ay_str = ay.split("-")[0].strip()
-                if ay_str.isdigit():
-                    ay_year = int(ay_str)
-                    fy_year = ay_year - 1
-                    fy = f"{fy_year}-{str(ay_year)[-2:]}"
-                    
-                    ais_records = db.query(models.AIS_Entry).filter(
-                        models.AIS_Entry.user_pan == pan,
-                        models.AIS_Entry.fy == fy
-                    ).all()
-                    
-                    for entry in ais_records:
-                        ais_entries.append({
-                            "informationCategory": entry.category,
-                            "amount": entry.amount,
-                            "description": entry.description,
-                            "source": entry.source
-                        })
+            yield
+            db.commit()
         except Exception:
-            pass
+            db.rollback()
+            raise
+        run_rules_for_user(db, pan)
+    else:
+        database.begin_transaction(db)
+        with db.begin_nested():
+            yield
+        batch.add(pan)
 
-        # 4. Run Rule Engine - Risks (PASS USER PROFILE)
-        # Standard: Clear old risks for this AY/User before adding new ones
-        db.query(models.Risk).filter(models.Risk.user_pan == pan, models.Risk.ay == ay).delete()
-        
-        risks = rule_engine.evaluate_risks(itr_json, ais_entries, user_profile=user_profile)
-        
-        for risk in risks:
-            db.add(models.Risk(user_pan=pan, ay=ay, **risk))
+@contextmanager
+def rule_batch(db: Session, evaluate: bool = True):
+    """
+    Coalesces rule evaluation for everything ingested inside the block.
+    On exit the ingested rows and one evaluation per dirty PAN are committed in a
+    single transaction; AI enrichment follows the commit.
+    A nested rule_batch runs in a savepoint and hands its dirty PANs to the outer
+    batch, so only the outermost batch commits and evaluation happens once, when it
+    closes. An exception rolls back just the nested batch's rows.
+    With evaluate=False the rows are committed and the yielded dirty set is left to
+    the caller to evaluate (e.g. in bulk, see tools/reevaluate.py).
+    """
+    outer = db.info.get(RULE_BATCH_KEY)
+    dirty = set()
+    db.info[RULE_BATCH_KEY] = dirty
+    if outer is not None:
+        try:
+            database.begin_transaction(db)
+            with db.begin_nested():
+                yield dirty
+        finally:
+            db.info[RULE_BATCH_KEY] = outer
+        outer.update(dirty)
+        return
 
-        # 5. Run Rule Engine - Opportunities (PASS USER PROFILE)
-        # Clear old opportunities
-        db.query(models.Opportunity).filter(models.Opportunity.user_pan == pan, models.Opportunity.ay == ay).delete()
+    try:
+        yield dirty
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.info.pop(RULE_BATCH_KEY, None)
 
-        opps = rule_engine.evaluate_opportunities(itr_json, user_profile=user_profile)
-        
-        for opp in opps:
-            db.add(models.Opportunity(user_pan=pan, ay=ay, **opp))
-        
+    if not evaluate:
         db.commit()
-        logging.info(f"Rule Engine executed for {pan}")
+        return
 
-    except Exception as e:
-        logging.error(f"Rule Execution Failed for {pan}: {e}")
\ No newline at end of file
+    evaluations = []
+    for pan in sorted(dirty):
+        try:
+            with db.begin_nested():
+                evaluation = _evaluate_user(db, pan)
+        except Exception as e:
+            logging.error(f"Rule Execution Failed for {pan}: {e}")
+            continue
+        if evaluation is not None:
+            evaluations.append((pan, evaluation))
+    db.commit()
+
+    for pan, (risk_ids, user_profile, timings) in evaluations:
+        logging.info(f"Rule Engine executed for {pan} (timings ms: {_format_timings(timings)})")
+        try:
+            _enrich(db, risk_ids, user_profile)
+        except Exception as e:
+            logging.error(f"AI enrichment failed for {pan}: {e}")
@@ -0,0 +1,158 @@
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from typing import Dict, Optional
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from .. import rule_engine
+
+# ==========================================
+# CPU Job Pool
+# ==========================================
+# JSON parsing, ITR extraction and rule evaluation hold the GIL, so running them on
+# the API's request threads stalls every other request in the process. Handlers hand
+# them to a dedicated process pool instead and either wait for the result or return a
+# job handle to poll via /api/jobs. Async handlers wait with run_async, on the event
+# loop, so no threadpool thread is held while a job runs.
+# Back-pressure: at most JOB_QUEUE_LIMIT jobs are queued or running; submit() beyond
+# that raises PoolBusy, which handlers turn into 503 + Retry-After.
+# Rule counters (rule_engine.RULE_STATS) collected in a worker travel back with each
+# job's result and are merged into the API process, where /api/debug reads them.
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", str(min(4, os.cpu_count() or 1))))
+JOB_QUEUE_LIMIT = int(os.getenv("JOB_QUEUE_LIMIT", str(JOB_WORKERS * 8)))
+JOB_WAIT_SECONDS = float(os.getenv("JOB_WAIT_SECONDS", "30"))
+JOB_INTERACTIVE_WAIT_SECONDS = float(os.getenv("JOB_INTERACTIVE_WAIT_SECONDS", "2")) # login, questionnaire
+JOB_TTL_SECONDS = 15 * 60 # finished jobs stay pollable this long
+RETRY_AFTER_SECONDS = 5
+
+class PoolBusy(Exception):
+    """Raised by submit() when the pool already holds JOB_QUEUE_LIMIT jobs."""
+
+def _init_worker():
+    logging.basicConfig(level=logging.INFO)
+
+def _run_job(fn, args):
+    """Worker: returns fn's result together with the rule counters gathered since the last job."""
+    value = fn(*args)
+    return value, rule_engine.RULE_STATS.drain()
+
+class Job:
+    """Handle of a submitted job"""
+    def __init__(self, job_id: str, future):
+        self.id = job_id # random, so knowing it is what entitles a client to poll the job
+        self.future = future
+        self.finished_at = None
+
+    @property
+    def done(self) -> bool:
+        return self.future.done()
+
+    @property
+    def status(self) -> str:
+        if not self.future.done():
+            return "running" if self.future.running() else "queued"
+        return "failed" if self.future.exception() is not None else "done"
+
+    def result(self, timeout: float = None):
+        """The job's return value; raises its exception, or concurrent.futures.TimeoutError."""
+        return self.future.result(timeout)[0]
+
+    def to_dict(self) -> dict:
+        data = {"job_id": self.id, "status": self.status}
+        if self.status == "done":
+            data["result"] = self.result()
+        elif self.status == "failed":
+            data["error"] = str(self.future.exception())
+        return data
+
+class JobPool:
+    def __init__(self, workers: int = JOB_WORKERS, queue_limit: int = JOB_QUEUE_LIMIT):
+        # spawn: forking a process that runs server threads can copy held locks
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker
+        )
+        self._slots = threading.BoundedSemaphore(queue_limit)
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args) -> Job:
+        """Queues fn(*args) (a picklable module-level function) in a worker process."""
+        if not self._slots.acquire(blocking=False):
+            raise PoolBusy()
+        try:
+            future = self._executor.submit(_run_job, fn, args)
+        except Exception:
+            self._slots.release()
+            raise
+        job = Job(uuid.uuid4().hex, future)
+        future.add_done_callback(lambda _: self._finish(job))
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        return job
+
+    def _finish(self, job: Job):
+        job.finished_at = time.monotonic()
+        self._slots.release()
+        if not job.future.cancelled() and job.future.exception() is None:
+            rule_engine.RULE_STATS.merge(job.future.result()[1])
+
+    def _prune(self):
+        cutoff = time.monotonic() - JOB_TTL_SECONDS
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished_at and job.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def run(self, fn, *args, timeout: float = JOB_WAIT_SECONDS) -> Job:
+        """
+        Submits fn(*args) and waits up to `timeout` seconds for it. A job that is still
+        running afterwards (job.done is False) keeps going and stays pollable.
+        Raises PoolBusy.
+        """
+        job = self.submit(fn, *args)
+        try:
+            job.future.exception(timeout)
+        except FutureTimeout:
+            pass
+        return job
+
+    async def run_async(self, fn, *args, timeout: float = JOB_WAIT_SECONDS) -> Job:
+        """
+        run() for async handlers: waits up to `timeout` seconds on the event loop instead
+        of blocking a thread. Raises PoolBusy.
+        """
+        job = self.submit(fn, *args)
+        if timeout > 0:
+            waiter = asyncio.wrap_future(job.future)
+            # A failed job is reported through the Job; don't let asyncio log it as unretrieved
+            waiter.add_done_callback(lambda done: done.cancelled() or done.exception())
+            await asyncio.wait({waiter}, timeout=timeout)
+        return job
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+def get_pool() -> JobPool:
+    """Returns the process-wide JobPool, started on first use."""
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = JobPool()
+        return _shared_pool
+
+def shutdown():
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is not None:
+            _shared_pool.shutdown()
+            _shared_pool = None
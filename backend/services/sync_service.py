@@ -1,108 +1,500 @@
 
+from sqlalchemy import or_, func, update
 from sqlalchemy.orm import Session
-from .. import models, rule_engine
+from .. import models, rule_engine, ais_classifier, artifact_codec, capital_gains
+from . import bulk_writer
+import hashlib
 import json
 import logging
 import os
 
-def process_ais_data(db: Session, pan: str, ais_data: dict):
+try:
+    import ijson
+except ImportError: # pragma: no cover - optional streaming parser
+    ijson = None
+
+def ais_entry_key(fy, category, source, date, amount: float, description) -> str:
     """
-    Processes AIS JSON data and populates AIS_Entry and TDS_Entry tables.
+    Stable natural key of an AIS transaction: FY, category, source, date, amount
+    and a hash of the whitespace/case-normalized description.
     """
-    try:
-        logging.info(f"Processing AIS Data for {pan}")
-        
-        # 1. Clear existing AIS entries for this PAN (or maybe strictly by FY if available)
-        # ForMVP, let's clear all to avoid duplicates on re-sync
-        db.query(models.AIS_Entry).filter(models.AIS_Entry.user_pan == pan).delete()
-        db.query(models.TDS_Entry).filter(models.TDS_Entry.user_pan == pan).delete()
-        
-        count_ais = 0
-        count_tds = 0
-
-        # Disclaimer: The structure of AIS JSON varies. We will try to find lists of data.
-        # Often it comes as { "AIS": { "TaxpayerInfo": ..., "TDS": [ ... ] } }
-        
-        # Helper to recursively find lists of dicts that look like transactions
-        def extract_transactions(data, parent_key=""):
-            transactions = []
-            if isinstance(data, dict):
-                for k, v in data.items():
-                    transactions.extend(extract_transactions(v, k))
-            elif isinstance(data, list):
-                for item in data:
-                    if isinstance(item, dict):
-                        # Heuristic to identify if this dict is a transaction
-                        # It should have some amount and description fields
-                        if any(key.lower() in ['amount', 'count', 'date'] for key in item.keys()):
-                             # Add context from parent key
-                             item['_parent_category'] = parent_key
-                             transactions.append(item)
-            return transactions
-
-        all_transactions = extract_transactions(ais_data)
-        
-        for item in all_transactions:
-            # Map to AIS_Entry
-            # We look for common keys
-            amount = item.get("amount", item.get("Amount", item.get("gross_amount", 0)))
-            description = item.get("description", item.get("Description", item.get("Narration", "")))
-            category = item.get("information_category", item.get("InformationCategory", item.get("_parent_category", "Unknown")))
-            source = item.get("source", item.get("Source", "AIS"))
-            fy = item.get("financial_year", item.get("FY", "Unknown"))
-            
-            # TDS Specific Checks
-            if "TDS" in category.upper() or "TCS" in category.upper():
-                # Map to TDS_Entry
-                tds_entry = models.TDS_Entry(
-                    user_pan=pan,
-                    type="TDS" if "TDS" in category.upper() else "TCS",
-                    section=item.get("section", item.get("Section", "Unknown")),
-                    date=item.get("date", item.get("Date", "Unknown")),
-                    tds_amount=str(amount), # Storing gross amount as TDS amount for now or look for specific tax field
-                    total_amount=str(item.get("total_amount", item.get("TotalAmount", amount)))
-                )
-                # Refine TDS Amount if available
-                if "tax_deposited" in item:
-                     tds_entry.tds_amount = str(item["tax_deposited"])
-                elif "TDS_Deposited" in item:
-                     tds_entry.tds_amount = str(item["TDS_Deposited"])
-                
-                db.add(tds_entry)
-                count_tds += 1
-
-            # Always add to AIS_Entry for comprehensive view
-            try:
-                amt_float = float(str(amount).replace(",", ""))
-            except:
-                amt_float = 0.0
-
-            ais_entry = models.AIS_Entry(
-                user_pan=pan,
-                fy=fy,
-                category=category,
-                description=description,
-                amount=amt_float,
-                source=source
-            )
-            db.add(ais_entry)
-            count_ais += 1
+    desc_norm = " ".join(str(description or "").lower().split())
+    desc_hash = hashlib.blake2b(desc_norm.encode(), digest_size=8).hexdigest()
+    raw_key = f"{fy}|{category}|{source}|{date}|{amount:.2f}|{desc_hash}"
+    return hashlib.blake2b(raw_key.encode(), digest_size=16).hexdigest()
 
+# Rows handed to the database per batch while an AIS file is being parsed
+AIS_BATCH_SIZE = int(os.getenv("AIS_BATCH_SIZE", "1000"))
+
+def _looks_like_transaction(item: dict) -> bool:
+    # Heuristic: a transaction has some amount / count / date field
+    return any(key.lower() in ['amount', 'count', 'date'] for key in item.keys())
+
+def iter_transactions(data):
+    """
+    Yields (transaction, parent_key) for every dict inside a list that looks like
+    an AIS transaction, in document order. parent_key is the key holding the list
+    and is used as the category when the transaction has none.
+    Iterative (explicit stack) and read-only: the input is never modified.
+    """
+    stack = [(data, "")]
+    while stack:
+        value, parent_key = stack.pop()
+        if isinstance(value, dict):
+            stack.extend((v, k) for k, v in reversed(value.items()))
+        elif isinstance(value, list):
+            for item in value:
+                if isinstance(item, dict) and _looks_like_transaction(item):
+                    yield item, parent_key
+
+def _iter_transactions_stream(f):
+    """
+    Same as iter_transactions, driven by ijson parse events so that only one
+    transaction is materialized at a time. Numbers come out as json.load returns them
+    (integers as int, anything else as float), so stored values such as tds_amount do
+    not depend on which path parsed the document.
+    """
+    frames = [] # ["map", current_key] or ["array", parent_key]
+    builder = None
+    depth = 0 # nesting inside the transaction being built, or inside a skipped subtree
+    for _, event, value in ijson.parse(f):
+        if event == "number" and not isinstance(value, int):
+            value = float(value) # ijson yields Decimal for non-integers
+        if depth:
+            if builder is not None:
+                builder.event(event, value)
+            if event in ("start_map", "start_array"):
+                depth += 1
+            elif event in ("end_map", "end_array"):
+                depth -= 1
+                if not depth and builder is not None:
+                    item, builder = builder.value, None
+                    if _looks_like_transaction(item):
+                        yield item, frames[-1][1]
+            continue
+
+        if event == "map_key":
+            frames[-1][1] = value
+        elif event == "start_map":
+            if frames and frames[-1][0] == "array":
+                builder = ijson.ObjectBuilder()
+                builder.event(event, value)
+                depth = 1
+            else:
+                frames.append(["map", None])
+        elif event == "start_array":
+            if frames and frames[-1][0] == "array":
+                depth = 1 # lists nested directly in lists are not scanned
+            else:
+                frames.append(["array", frames[-1][1] if frames else ""])
+        elif event in ("end_map", "end_array"):
+            frames.pop()
+
+def iter_transactions_from_file(file_path: str):
+    """Streams transactions out of an AIS JSON file (falls back to json.load without ijson)."""
+    if ijson is None:
+        with open(file_path, 'r') as f:
+            data = json.load(f)
+        yield from iter_transactions(data)
+        return
+
+    with open(file_path, 'rb') as f:
+        yield from _iter_transactions_stream(f)
+
+def transactions_hash(transactions) -> str:
+    """
+    Content hash of an AIS document: its (transaction, parent_key) pairs in document
+    order, hashed one at a time. They are all sync_ais stores, and iter_transactions
+    and the file stream yield the same pairs, so a document gets the same hash whether
+    it arrives as a dict, a file or through backfill.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for item, parent_key in transactions:
+        digest.update(artifact_codec.canonical_dumps([parent_key, item]))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+def _aggregate_category(category) -> str:
+    if category is None:
+        return ""
+    return category if isinstance(category, str) else str(category)
+
+class AggregateDelta:
+    """
+    Pending changes to AIS_Aggregate totals, keyed by (fy, category).
+    Fed by KeyedSync's insert/delete hooks and applied once per ingest.
+    """
+    def __init__(self):
+        self.deltas = {} # (fy, category) -> [amount, count]
+
+    def _add(self, rows, sign: int):
+        for row in rows:
+            delta = self.deltas.setdefault((row["fy"], _aggregate_category(row["category"])), [0.0, 0])
+            delta[0] += sign * (row["amount"] or 0)
+            delta[1] += sign
+
+    def added(self, rows):
+        self._add(rows, 1)
+
+    def removed(self, rows):
+        self._add(rows, -1)
+
+    def apply(self, db: Session, pan: str):
+        if not self.deltas:
+            return
+        fys = list({fy for fy, _ in self.deltas})
+        existing = {
+            (row.fy, row.category): row
+            for row in db.query(
+                models.AIS_Aggregate.id, models.AIS_Aggregate.fy, models.AIS_Aggregate.category,
+                models.AIS_Aggregate.total_amount, models.AIS_Aggregate.entry_count
+            ).filter(models.AIS_Aggregate.user_pan == pan, models.AIS_Aggregate.fy.in_(fys))
+        }
+
+        inserts, updates, emptied = [], [], []
+        for (fy, category), (amount, count) in self.deltas.items():
+            if not count and not amount:
+                continue
+            current = existing.get((fy, category))
+            if current is None:
+                if count > 0:
+                    inserts.append({"user_pan": pan, "fy": fy, "category": category, "total_amount": amount, "entry_count": count})
+            elif current.entry_count + count <= 0:
+                emptied.append(current.id)
+            else:
+                updates.append({
+                    "id": current.id,
+                    "total_amount": current.total_amount + amount,
+                    "entry_count": current.entry_count + count
+                })
+
+        bulk_writer.insert_rows(db, models.AIS_Aggregate, inserts)
+        if updates:
+            db.execute(update(models.AIS_Aggregate), updates)
+        bulk_writer.delete_ids(db, models.AIS_Aggregate, emptied)
+        self.deltas = {}
+
+def rebuild_ais_aggregates(db: Session, pan: str = None):
+    """Recomputes AIS_Aggregate from AIS_Entry, for one PAN or for everyone."""
+    aggregate_query = db.query(models.AIS_Aggregate)
+    entry_query = db.query(
+        models.AIS_Entry.user_pan, models.AIS_Entry.fy, models.AIS_Entry.category,
+        func.sum(models.AIS_Entry.amount), func.count(models.AIS_Entry.id)
+    )
+    if pan is not None:
+        aggregate_query = aggregate_query.filter(models.AIS_Aggregate.user_pan == pan)
+        entry_query = entry_query.filter(models.AIS_Entry.user_pan == pan)
+    aggregate_query.delete(synchronize_session=False)
+
+    totals = {}
+    for user_pan, fy, category, amount, count in entry_query.group_by(
+        models.AIS_Entry.user_pan, models.AIS_Entry.fy, models.AIS_Entry.category
+    ):
+        # None and "" (and non-string categories) share one aggregate row
+        total = totals.setdefault((user_pan, fy, _aggregate_category(category)), [0.0, 0])
+        total[0] += amount or 0
+        total[1] += count
+
+    bulk_writer.insert_rows(db, models.AIS_Aggregate, [
+        {"user_pan": user_pan, "fy": fy, "category": category, "total_amount": amount, "entry_count": count}
+        for (user_pan, fy, category), (amount, count) in totals.items()
+    ])
+
+def backfill_ais_aggregates(db: Session):
+    """One-time fill of AIS_Aggregate for databases that predate the table."""
+    if db.query(models.AIS_Aggregate.id).first() is None and db.query(models.AIS_Entry.id).first() is not None:
+        rebuild_ais_aggregates(db)
         db.commit()
-        db.commit()
-        logging.info(f"Ingested {count_ais} AIS entries and {count_tds} TDS entries.")
-        
-        # Trigger Rule Engine
-        from . import itr_service
-        itr_service.run_rules_for_user(db, pan)
-        
+        logging.info("Backfilled AIS aggregates from existing AIS entries.")
+
+def load_raw_ais(db: Session, pan: str, fy: str) -> rule_engine.RawAIS:
+    """
+    Builds the rule engine's RawAIS for one FY from the FY's AIS_Aggregate totals.
+    Raw entries are only read for the FY's securities-sale categories, whose individual
+    descriptions the capital gains check inspects, and for FIFO only the trades of
+    the securities sold in the FY (earlier purchases included): the cost grows with
+    the FY's sales and those securities' lot history, not with the PAN's AIS rows.
+    """
+    totals = db.query(models.AIS_Aggregate.category, models.AIS_Aggregate.total_amount).filter(
+        models.AIS_Aggregate.user_pan == pan,
+        models.AIS_Aggregate.fy == fy
+    ).all()
+
+    securities = []
+    sold = set()
+    security_categories = [category for category, _ in totals if ais_classifier.classify(category) == ais_classifier.SECURITIES_SALE]
+    if security_categories:
+        for entry in db.query(
+            models.AIS_Entry.category, models.AIS_Entry.amount, models.AIS_Entry.description, models.AIS_Entry.source,
+            models.AIS_Entry.security
+        ).filter(
+            models.AIS_Entry.user_pan == pan,
+            models.AIS_Entry.fy == fy,
+            models.AIS_Entry.category.in_(security_categories)
+        ):
+            securities.append({
+                "informationCategory": entry.category,
+                "amount": entry.amount,
+                "description": entry.description,
+                "source": entry.source
+            })
+            if entry.security is not None:
+                sold.add(entry.security)
+
+    trades = []
+    sold = sorted(sold)
+    for start in range(0, len(sold), bulk_writer.DELETE_CHUNK_SIZE):
+        trades.extend(db.query(*_TRADE_COLUMNS).filter(
+            models.AIS_Entry.user_pan == pan,
+            models.AIS_Entry.security.in_(sold[start:start + bulk_writer.DELETE_CHUNK_SIZE]),
+            models.AIS_Entry.quantity.isnot(None)
+        ))
+    return rule_engine.DataNormalizer.from_aggregates(totals, securities, _realized_gains(trades, fy))
+
+# Entries carrying a quantity are the securities trades FIFO lot matching works on
+_TRADE_COLUMNS = (
+    models.AIS_Entry.category, models.AIS_Entry.amount, models.AIS_Entry.description,
+    models.AIS_Entry.date, models.AIS_Entry.security, models.AIS_Entry.quantity,
+)
+
+def _realized_gains(trades, fy: str) -> rule_engine.CapitalGains:
+    """FIFO gains of the FY's sales, matched against the user's purchases of every FY."""
+    purchases, sales = [], []
+    for category, amount, description, date, security, quantity in trades:
+        kind = ais_classifier.classify(category)
+        if kind == ais_classifier.SECURITIES_SALE or kind == ais_classifier.SECURITIES_PURCHASE:
+            (sales if kind == ais_classifier.SECURITIES_SALE else purchases).append({
+                "amount": amount, "description": description, "date": date, "security": security, "quantity": quantity
+            })
+    return rule_engine.CapitalGains.from_entries(purchases, sales, capital_gains.fy_period(fy))
+
+def load_raw_ais_many(db: Session, pan_fys) -> dict:
+    """
+    load_raw_ais for many (pan, fy) pairs with one aggregate and one securities query
+    per chunk of PANs, plus the trades of the securities sold in the wanted FYs.
+    Returns {(pan, fy): RawAIS}; pairs without AIS data get an empty RawAIS.
+    """
+    wanted = set(pan_fys)
+    pans = sorted({pan for pan, _ in wanted})
+    totals, securities, trades = {}, {}, {}
+    sold = set() # (pan, security) of the wanted FYs' sales
+    for start in range(0, len(pans), bulk_writer.DELETE_CHUNK_SIZE):
+        chunk = pans[start:start + bulk_writer.DELETE_CHUNK_SIZE]
+        security_categories = set()
+        for pan, fy, category, amount in db.query(
+            models.AIS_Aggregate.user_pan, models.AIS_Aggregate.fy, models.AIS_Aggregate.category, models.AIS_Aggregate.total_amount
+        ).filter(models.AIS_Aggregate.user_pan.in_(chunk)):
+            if (pan, fy) in wanted:
+                totals.setdefault((pan, fy), []).append((category, amount))
+                if ais_classifier.classify(category) == ais_classifier.SECURITIES_SALE:
+                    security_categories.add(category)
+        if security_categories:
+            for entry in db.query(
+                models.AIS_Entry.user_pan, models.AIS_Entry.fy, models.AIS_Entry.category,
+                models.AIS_Entry.amount, models.AIS_Entry.description, models.AIS_Entry.source, models.AIS_Entry.security
+            ).filter(
+                models.AIS_Entry.user_pan.in_(chunk),
+                models.AIS_Entry.category.in_(security_categories)
+            ):
+                if (entry.user_pan, entry.fy) in wanted:
+                    securities.setdefault((entry.user_pan, entry.fy), []).append({
+                        "informationCategory": entry.category,
+                        "amount": entry.amount,
+                        "description": entry.description,
+                        "source": entry.source
+                    })
+                    if entry.security is not None:
+                        sold.add((entry.user_pan, entry.security))
+        sold_securities = sorted({security for pan, security in sold if pan in chunk})
+        for security_start in range(0, len(sold_securities), bulk_writer.DELETE_CHUNK_SIZE):
+            for pan, *trade in db.query(models.AIS_Entry.user_pan, *_TRADE_COLUMNS).filter(
+                models.AIS_Entry.user_pan.in_(chunk),
+                models.AIS_Entry.security.in_(sold_securities[security_start:security_start + bulk_writer.DELETE_CHUNK_SIZE]),
+                models.AIS_Entry.quantity.isnot(None)
+            ):
+                if (pan, trade[4]) in sold: # the ISIN may be sold by another PAN of the chunk
+                    trades.setdefault(pan, []).append(trade)
+
+    return {
+        key: rule_engine.DataNormalizer.from_aggregates(
+            totals.get(key, ()), securities.get(key), _realized_gains(trades.get(key[0], ()), key[1])
+        )
+        for key in wanted
+    }
+
+def _ingest_transactions(db: Session, pan: str, transactions):
+    """
+    Maps transactions to AIS_Entry / TDS_Entry rows and syncs them in batches of
+    AIS_BATCH_SIZE, so at most one batch of rows is in memory. What still grows with
+    the file is one entry key per transaction (the occurrence counts below and the
+    KeyedSync key sets, together roughly 200 bytes per transaction): deletes can only
+    run once the whole document has been seen, and an AIS document usually covers a
+    single FY, so they cannot be issued per FY earlier.
+    AIS_Aggregate totals are adjusted by the inserted / deleted entries.
+    Everything runs in the caller's transaction; nothing is committed here.
+    """
+    # Amount, category and FY are part of entry_key, so updates never change the totals
+    aggregates = AggregateDelta()
+    ais_sync = bulk_writer.KeyedSync(
+        db, models.AIS_Entry, key_field="entry_key", value_fields=("description", "security", "quantity"),
+        owner_scope=(models.AIS_Entry.user_pan == pan,),
+        tracked_fields=("fy", "category", "amount"), on_insert=aggregates.added, on_delete=aggregates.removed
+    )
+    tds_sync = bulk_writer.KeyedSync(
+        db, models.TDS_Entry, key_field="entry_key", value_fields=("type", "section", "tds_amount", "total_amount"),
+        owner_scope=(models.TDS_Entry.user_pan == pan,)
+    )
+
+    ais_rows = []
+    tds_rows = []
+    seen_keys = {}
+    covered_fys = set()
+    count_ais = count_tds = 0
+    for item, parent_key in transactions:
+        # Map to AIS_Entry
+        # We look for common keys
+        amount = item.get("amount", item.get("Amount", item.get("gross_amount", 0)))
+        description = item.get("description", item.get("Description", item.get("Narration", "")))
+        category = item.get("information_category", item.get("InformationCategory", parent_key))
+        source = item.get("source", item.get("Source", "AIS"))
+        fy = item.get("financial_year", item.get("FY", "Unknown"))
+        date = item.get("date", item.get("Date", "Unknown"))
+
+        try:
+            amt_float = float(str(amount).replace(",", ""))
+        except:
+            amt_float = 0.0
+
+        # Identical transactions in one file are told apart by their occurrence number
+        entry_key = ais_entry_key(fy, category, source, date, amt_float, description)
+        occurrence = seen_keys.get(entry_key, 0)
+        seen_keys[entry_key] = occurrence + 1
+        if occurrence:
+            entry_key = f"{entry_key}#{occurrence}"
+
+        security, quantity = capital_gains.trade_fields(item)
+
+        # TDS Specific Checks
+        kind = ais_classifier.classify(category)
+        if kind == ais_classifier.TDS or kind == ais_classifier.TCS:
+            # Map to TDS_Entry
+            # Storing gross amount as TDS amount unless a specific tax field is present
+            tds_amount = amount
+            if "tax_deposited" in item:
+                 tds_amount = item["tax_deposited"]
+            elif "TDS_Deposited" in item:
+                 tds_amount = item["TDS_Deposited"]
+
+            tds_rows.append({
+                "user_pan": pan,
+                "type": "TDS" if kind == ais_classifier.TDS else "TCS",
+                "section": item.get("section", item.get("Section", "Unknown")),
+                "date": date,
+                "tds_amount": str(tds_amount),
+                "total_amount": str(item.get("total_amount", item.get("TotalAmount", amount))),
+                "fy": fy,
+                "entry_key": entry_key
+            })
+
+        # Always add to AIS_Entry for comprehensive view
+        ais_rows.append({
+            "user_pan": pan,
+            "fy": fy,
+            "category": category,
+            "description": description,
+            "amount": amt_float,
+            "source": source,
+            "date": date,
+            "security": security if quantity else None,
+            "quantity": quantity if security else None,
+            "entry_key": entry_key
+        })
+        covered_fys.add(fy)
+
+        if len(ais_rows) >= AIS_BATCH_SIZE:
+            ais_sync.apply(ais_rows)
+            tds_sync.apply(tds_rows)
+            count_ais += len(ais_rows)
+            count_tds += len(tds_rows)
+            ais_rows, tds_rows = [], []
+
+    ais_sync.apply(ais_rows)
+    tds_sync.apply(tds_rows)
+    count_ais += len(ais_rows)
+    count_tds += len(tds_rows)
+
+    # Deletes are limited to the FYs this file covers.
+    # Entries of other FYs are left untouched; legacy rows without a key are replaced.
+    covered_fys = list(covered_fys)
+    ais_delta = ais_sync.finish((models.AIS_Entry.fy.in_(covered_fys),))
+    tds_delta = tds_sync.finish((or_(models.TDS_Entry.fy.in_(covered_fys), models.TDS_Entry.fy.is_(None)),))
+    aggregates.apply(db, pan)
+    logging.info(
+        f"Ingested {count_ais} AIS entries and {count_tds} TDS entries "
+        f"(AIS +{ais_delta[0]} ~{ais_delta[1]} -{ais_delta[2]}, TDS +{tds_delta[0]} ~{tds_delta[1]} -{tds_delta[2]})."
+    )
+    return count_ais, covered_fys
+
+def _record_snapshot(db: Session, pan: str, content_hash: str, fys: list, entry_count: int):
+    """Records an ingested AIS document and drops the snapshots it supersedes (any shared FY)."""
+    covered = set(fys)
+    superseded = [
+        snapshot_id for snapshot_id, snapshot_fys in db.query(models.AIS_Snapshot.id, models.AIS_Snapshot.fys).filter(
+            models.AIS_Snapshot.user_pan == pan
+        )
+        if covered.intersection(json.loads(snapshot_fys or "[]"))
+    ]
+    bulk_writer.delete_ids(db, models.AIS_Snapshot, superseded)
+    bulk_writer.insert_rows(db, models.AIS_Snapshot, [{
+        "user_pan": pan, "content_hash": content_hash, "fys": json.dumps(sorted(covered, key=str)), "entry_count": entry_count
+    }])
+
+def sync_ais(db: Session, pan: str, transactions, content_hash: str):
+    """Ingests (transaction, parent_key) pairs of one AIS document identified by `content_hash`."""
+    from . import itr_service
+    try:
+        # An identical AIS document is already reflected in the stored entries: nothing to do
+        if db.query(models.AIS_Snapshot.id).filter(
+            models.AIS_Snapshot.user_pan == pan,
+            models.AIS_Snapshot.content_hash == content_hash
+        ).first():
+            logging.info(f"AIS for {pan} unchanged ({content_hash}), skipped.")
+            return True, "Unchanged, skipped"
+
+        # Commits and triggers the Rule Engine, or defers both to an enclosing rule_batch
+        with itr_service.ingestion(db, pan):
+            count_ais, covered_fys = _ingest_transactions(db, pan, transactions)
+            _record_snapshot(db, pan, content_hash, covered_fys, count_ais)
+
         return True, f"Synced {count_ais} records."
 
     except Exception as e:
         logging.error(f"Error processing AIS: {e}")
-        db.rollback()
         return False, str(e)
 
+def process_ais_data(db: Session, pan: str, ais_data: dict):
+    """
+    Processes AIS JSON data and populates AIS_Entry and TDS_Entry tables.
+    """
+    logging.info(f"Processing AIS Data for {pan}")
+
+    # Disclaimer: The structure of AIS JSON varies. We will try to find lists of data.
+    # Often it comes as { "AIS": { "TaxpayerInfo": ..., "TDS": [ ... ] } }
+    return sync_ais(db, pan, iter_transactions(ais_data), transactions_hash(iter_transactions(ais_data)))
+
+def process_ais_file(db: Session, pan: str, file_path: str):
+    """
+    Like process_ais_data, but parses the AIS JSON file incrementally instead of
+    loading the whole document (one streaming pass for the hash, one to ingest).
+    """
+    logging.info(f"Processing AIS File for {pan}: {file_path}")
+    try:
+        content_hash = transactions_hash(iter_transactions_from_file(file_path))
+    except Exception as e:
+        logging.error(f"Error reading AIS file {file_path}: {e}")
+        return False, str(e)
+    return sync_ais(db, pan, iter_transactions_from_file(file_path), content_hash)
+
 def process_26as_file(db: Session, pan: str, file_path: str):
     """
     Logs the download of 26AS file.
@@ -0,0 +1,200 @@
+import numpy as np
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Optional
+
+# ==========================================
+# Tax Computation (Slabs, Rebate, Surcharge, Cess)
+# ==========================================
+# Income tax of an individual (resident, below 60) per assessment year and regime.
+# The rules below are compiled once at import into read-only NumPy lookup tables
+# (AY x regime x slab), so any number of returns or what-if scenarios are computed
+# in one vectorized pass: every argument of compute_tax / what_if broadcasts.
+#
+# Income taxed at slab rates is given separately from equity capital gains, which
+# are taxed at their special rates (111A short term, 112A long term above the
+# exemption). Simplifications: the 87A rebate is set against slab tax only, and
+# AY 2025-26 gains use the rates in force from 23 July 2024 for the whole year.
+
+OLD, NEW = 0, 1 # regime indexes
+REGIMES = ("old", "new")
+NEW_REGIME_DEFAULT_AY = "2024-25" # first AY taxed under the new regime unless the return opts out
+
+CESS_RATE = 0.04 # health and education cess on tax + surcharge
+SPECIAL_SURCHARGE_CAP = 0.15 # surcharge on 111A / 112A gains never exceeds this
+
+# Chapter VI-A deductions the what-if scenarios vary (old regime only)
+LIMIT_80C = 150000
+LIMIT_80D = 75000 # self / family 25,000 + senior-citizen parents 50,000
+LIMIT_NPS = 50000 # 80CCD(1B), over and above 80C
+
+# Slabs: (upper bound of the slab or None for the top slab, rate)
+OLD_SLABS = ((250000, 0.0), (500000, 0.05), (1000000, 0.20), (None, 0.30))
+NEW_SLABS_115BAC = (
+    (250000, 0.0), (500000, 0.05), (750000, 0.10), (1000000, 0.15), (1250000, 0.20), (1500000, 0.25), (None, 0.30),
+)
+NEW_SLABS_FY2023 = ((300000, 0.0), (600000, 0.05), (900000, 0.10), (1200000, 0.15), (1500000, 0.20), (None, 0.30))
+NEW_SLABS_FY2024 = ((300000, 0.0), (700000, 0.05), (1000000, 0.10), (1200000, 0.15), (1500000, 0.20), (None, 0.30))
+NEW_SLABS_FY2025 = (
+    (400000, 0.0), (800000, 0.05), (1200000, 0.10), (1600000, 0.15), (2000000, 0.20), (2400000, 0.25), (None, 0.30),
+)
+
+# Surcharge: (total income above which it applies, rate)
+SURCHARGE = ((5000000, 0.10), (10000000, 0.15), (20000000, 0.25), (50000000, 0.37))
+SURCHARGE_CAPPED = SURCHARGE[:-1] + ((50000000, 0.25),) # new regime from AY 2024-25
+
+def _regime(slabs, rebate_limit, rebate_max, rebate_relief=False, surcharge=SURCHARGE) -> dict:
+    # rebate_relief: tax above the rebate limit may not exceed the income above it
+    return {"slabs": slabs, "rebate_limit": rebate_limit, "rebate_max": rebate_max,
+            "rebate_relief": rebate_relief, "surcharge": surcharge}
+
+OLD_REGIME = _regime(OLD_SLABS, 500000, 12500)
+
+# AY -> regimes and capital gains rates; AYs outside the table use the nearest one
+AY_RULES = {
+    "2021-22": {"old": OLD_REGIME, "new": _regime(NEW_SLABS_115BAC, 500000, 12500),
+                "stcg_rate": 0.15, "ltcg_rate": 0.10, "ltcg_exemption": 100000},
+    "2022-23": {"old": OLD_REGIME, "new": _regime(NEW_SLABS_115BAC, 500000, 12500),
+                "stcg_rate": 0.15, "ltcg_rate": 0.10, "ltcg_exemption": 100000},
+    "2023-24": {"old": OLD_REGIME, "new": _regime(NEW_SLABS_115BAC, 500000, 12500),
+                "stcg_rate": 0.15, "ltcg_rate": 0.10, "ltcg_exemption": 100000},
+    "2024-25": {"old": OLD_REGIME, "new": _regime(NEW_SLABS_FY2023, 700000, 25000, True, SURCHARGE_CAPPED),
+                "stcg_rate": 0.15, "ltcg_rate": 0.10, "ltcg_exemption": 100000},
+    "2025-26": {"old": OLD_REGIME, "new": _regime(NEW_SLABS_FY2024, 700000, 25000, True, SURCHARGE_CAPPED),
+                "stcg_rate": 0.20, "ltcg_rate": 0.125, "ltcg_exemption": 125000},
+    "2026-27": {"old": OLD_REGIME, "new": _regime(NEW_SLABS_FY2025, 1200000, 60000, True, SURCHARGE_CAPPED),
+                "stcg_rate": 0.20, "ltcg_rate": 0.125, "ltcg_exemption": 125000},
+}
+
+def _read_only(values, dtype=np.float64) -> np.ndarray:
+    array = np.array(values, dtype=dtype)
+    array.flags.writeable = False
+    return array
+
+class TaxTables:
+    """
+    AY_RULES as read-only arrays indexed [ay index, regime, ...]. Slabs are padded to a
+    common count; surcharge brackets start with a 0% bracket below the first threshold.
+    """
+    def __init__(self, rules: dict):
+        self.ays = tuple(sorted(rules))
+        depth = max(len(rules[ay][name]["slabs"]) for ay in self.ays for name in REGIMES)
+        lower, width, rate, surcharge_rate = [], [], [], []
+        rebate_limit, rebate_max, rebate_relief = [], [], []
+        for ay in self.ays:
+            rows = [[], [], [], [], [], [], []]
+            for name in REGIMES:
+                regime = rules[ay][name]
+                bounds = [0] + [upper for upper, _ in regime["slabs"][:-1]]
+                padding = depth - len(regime["slabs"])
+                # Padding slabs are empty: zero width, zero rate
+                rows[0].append(bounds + [bounds[-1]] * padding)
+                rows[1].append([b - a for a, b in zip(bounds, bounds[1:])] + [np.inf] + [0.0] * padding)
+                rows[2].append([slab_rate for _, slab_rate in regime["slabs"]] + [0.0] * padding)
+                rows[3].append([0.0] + [surcharge for _, surcharge in regime["surcharge"]])
+                rows[4].append(regime["rebate_limit"])
+                rows[5].append(regime["rebate_max"])
+                rows[6].append(regime["rebate_relief"])
+            for column, row in zip((lower, width, rate, surcharge_rate, rebate_limit, rebate_max, rebate_relief), rows):
+                column.append(row)
+        self.lower = _read_only(lower)
+        self.width = _read_only(width)
+        self.rate = _read_only(rate)
+        self.surcharge_threshold = _read_only([0.0] + [threshold for threshold, _ in SURCHARGE])
+        self.surcharge_rate = _read_only(surcharge_rate)
+        self.rebate_limit = _read_only(rebate_limit)
+        self.rebate_max = _read_only(rebate_max)
+        self.rebate_relief = _read_only(rebate_relief, dtype=bool)
+        self.stcg_rate = _read_only([rules[ay]["stcg_rate"] for ay in self.ays])
+        self.ltcg_rate = _read_only([rules[ay]["ltcg_rate"] for ay in self.ays])
+        self.ltcg_exemption = _read_only([rules[ay]["ltcg_exemption"] for ay in self.ays])
+        self.index = MappingProxyType({ay: position for position, ay in enumerate(self.ays)})
+
+TABLES = TaxTables(AY_RULES)
+
+@lru_cache(maxsize=256)
+def ay_index(ay: Optional[str]) -> int:
+    """Row of TABLES for an assessment year ("2024-25", "2024"), clamped to the known years; latest if unknown."""
+    try:
+        start = int(str(ay).strip()[:4])
+    except ValueError:
+        return len(TABLES.ays) - 1
+    known = [int(key[:4]) for key in TABLES.ays]
+    start = min(max(start, known[0]), known[-1])
+    return TABLES.index.get(f"{start}-{str(start + 1)[-2:]}", len(TABLES.ays) - 1)
+
+def regime_index(name: str) -> int:
+    """OLD / NEW for "old" / "new" (case-insensitive); raises ValueError for anything else."""
+    return REGIMES.index(str(name).strip().lower())
+
+def _slab_tax(ay, regime, income):
+    return (np.clip(income[..., None] - TABLES.lower[ay, regime], 0, TABLES.width[ay, regime]) * TABLES.rate[ay, regime]).sum(axis=-1)
+
+def compute_tax(ay, regime, income, stcg=0.0, ltcg=0.0) -> dict:
+    """
+    Tax on `income` at slab rates plus short / long-term equity gains at their special rates.
+    `ay` (see ay_index) and `regime` (OLD / NEW) are indexes; all arguments broadcast.
+    Returns arrays "slab_tax", "special_tax", "rebate", "surcharge", "cess" and "total"
+    (rounded to the rupee) of the broadcast shape.
+    """
+    ay, regime = np.asarray(ay, dtype=np.intp), np.asarray(regime, dtype=np.intp)
+    income, stcg, ltcg = (np.maximum(np.asarray(value, dtype=np.float64), 0.0) for value in (income, stcg, ltcg))
+    total_income = income + stcg + ltcg
+    slab_tax = _slab_tax(ay, regime, income)
+    special_tax = stcg * TABLES.stcg_rate[ay] + np.maximum(ltcg - TABLES.ltcg_exemption[ay], 0.0) * TABLES.ltcg_rate[ay]
+
+    # 87A rebate, with marginal relief just above the limit where the regime allows it
+    excess = total_income - TABLES.rebate_limit[ay, regime]
+    rebate = np.where(
+        excess <= 0, np.minimum(slab_tax, TABLES.rebate_max[ay, regime]),
+        np.where(TABLES.rebate_relief[ay, regime], np.maximum(slab_tax - excess, 0.0), 0.0),
+    )
+    tax = slab_tax - rebate + special_tax
+
+    surcharge = np.zeros_like(tax)
+    if total_income.max(initial=0.0) > TABLES.surcharge_threshold[1]:
+        # Surcharge by total income bracket, capped on the special-rate gains
+        bracket = np.searchsorted(TABLES.surcharge_threshold, total_income, side="left") - 1
+        surcharge_rate = TABLES.surcharge_rate[ay, regime, bracket]
+        surcharge = (slab_tax - rebate) * surcharge_rate + special_tax * np.minimum(surcharge_rate, SPECIAL_SURCHARGE_CAP)
+        # Marginal relief: crossing a threshold may not cost more than the income above it
+        over = total_income - TABLES.surcharge_threshold[bracket]
+        lower_rate = TABLES.surcharge_rate[ay, regime, np.maximum(bracket - 1, 0)]
+        at_threshold = _slab_tax(ay, regime, np.maximum(income - over, 0.0)) + special_tax
+        relief_cap = at_threshold * (1 + lower_rate) + over - tax
+        surcharge = np.where(bracket > 0, np.clip(relief_cap, 0.0, surcharge), 0.0)
+
+    cess = (tax + surcharge) * CESS_RATE
+    return {
+        "slab_tax": slab_tax, "special_tax": special_tax, "rebate": rebate,
+        "surcharge": surcharge, "cess": cess, "total": np.rint(tax + surcharge + cess),
+    }
+
+def what_if(ay, regime, gross_income, claimed_80c=0.0, claimed_80d=0.0, claimed_nps=0.0, stcg=0.0, ltcg=0.0,
+            extra_80c=0.0, extra_80d=0.0, extra_nps=0.0) -> dict:
+    """
+    compute_tax for income before the 80C / 80D / 80CCD(1B) deductions (`gross_income`), with
+    the claimed plus extra amounts deducted up to their limits under the old regime only.
+    """
+    deductions = (
+        np.minimum(np.add(claimed_80c, extra_80c), LIMIT_80C)
+        + np.minimum(np.add(claimed_80d, extra_80d), LIMIT_80D)
+        + np.minimum(np.add(claimed_nps, extra_nps), LIMIT_NPS)
+    )
+    income = np.subtract(gross_income, np.where(np.equal(regime, OLD), deductions, 0.0))
+    return compute_tax(ay, regime, income, stcg, ltcg)
+
+def what_if_grid(base: dict, extra_80c=(0.0,), extra_80d=(0.0,), extra_nps=(0.0,), regimes=(OLD, NEW)) -> dict:
+    """
+    Evaluates every combination of the extra amounts and regimes for one return in one pass.
+    `base` holds what_if's ay / gross_income / claimed_* / stcg / ltcg arguments.
+    Returns flat arrays "regime", "extra_80c", "extra_80d", "extra_nps" plus compute_tax's columns.
+    """
+    grid = np.meshgrid(
+        np.asarray(regimes, dtype=np.intp), np.asarray(extra_80c, dtype=np.float64),
+        np.asarray(extra_80d, dtype=np.float64), np.asarray(extra_nps, dtype=np.float64), indexing="ij",
+    )
+    regime, extra_80c, extra_80d, extra_nps = (axis.ravel() for axis in grid)
+    result = what_if(regime=regime, extra_80c=extra_80c, extra_80d=extra_80d, extra_nps=extra_nps, **base)
+    result.update(regime=regime, extra_80c=extra_80c, extra_80d=extra_80d, extra_nps=extra_nps)
+    return result
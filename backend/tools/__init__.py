@@ -0,0 +1,46 @@
+# ==========================================
+# Offline Tools
+# ==========================================
+# Command-line jobs run next to the API against the same database, e.g.
+#   python -m backend.tools.reevaluate --workers 8
+
+import time
+from .. import models, database
+from ..services import sync_service
+
+def prepare_database():
+    """Creates missing tables and upgrades older ones (see migrate.py); tools run it before touching data."""
+    models.Base.metadata.create_all(bind=database.engine)
+    database.upgrade_schema()
+    with database.SessionLocal() as db:
+        sync_service.backfill_ais_aggregates(db)
+
+def init_worker():
+    """Process-pool initializer: forked workers must not reuse the parent's pooled connections."""
+    database.engine.dispose(close=False)
+
+class Progress:
+    """Prints done/total, rate and elapsed time at most every `interval` seconds."""
+    def __init__(self, total: int, unit: str, interval: float = 1.0):
+        self.total = total
+        self.unit = unit
+        self.interval = interval
+        self.done = 0
+        self.started = time.perf_counter()
+        self.last_report = 0.0
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    @property
+    def rate(self) -> float:
+        return self.done / self.elapsed if self.elapsed > 0 else 0.0
+
+    def advance(self, count: int, **counters):
+        self.done += count
+        now = time.perf_counter()
+        if now - self.last_report >= self.interval or self.done >= self.total:
+            self.last_report = now
+            extra = "".join(f", {name} {value}" for name, value in counters.items())
+            print(f"[{self.done}/{self.total}] {self.rate:,.1f} {self.unit}/s, {self.elapsed:.1f}s{extra}", flush=True)
@@ -0,0 +1,240 @@
+"""
+Imports an archive of ITR and AIS JSON files (e.g. a CA firm's client records):
+
+    python -m backend.tools.backfill DIRECTORY [--state FILE] [--workers N] [--batch-size N]
+                                     [--no-evaluate] [--no-enrich]
+
+Worker processes parse files and do the CPU-bound part of ingestion (hashing, compression,
+ITR field extraction). The parent routes the results by PAN and writes them through
+the regular ingestion layer, one transaction per batch of files, with rule evaluation
+deferred. When all files are in, every touched PAN is evaluated once with the batch
+engine (see reevaluate.py).
+
+A file's PAN is read from the document (ITR PersonalInfo, or a "PAN" key of an AIS
+document), falling back to the last PAN-shaped name in its path, e.g. ABCDE1234F/ais.json.
+
+Progress is appended to a state file (default DIRECTORY/.backfill_state.jsonl): a re-run
+skips files already imported and evaluates PANs whose evaluation did not complete.
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from .. import models, database, artifact_codec
+from ..services import itr_service, sync_service, bulk_writer
+from . import prepare_database, init_worker, Progress, reevaluate
+
+DEFAULT_BATCH_SIZE = 100
+STATE_FILE_NAME = ".backfill_state.jsonl"
+PAN_PATTERN = re.compile(r"[A-Z]{5}[0-9]{4}[A-Z]")
+
+def _file_key(directory: str, path: str) -> str:
+    """Identifies a file version without reading it: relative path, size and mtime."""
+    stat = os.stat(path)
+    return f"{os.path.relpath(path, directory)}|{stat.st_size}|{stat.st_mtime_ns}"
+
+def list_files(directory: str, state_path: str) -> list:
+    paths = []
+    for folder, subfolders, files in os.walk(directory):
+        subfolders.sort()
+        for name in sorted(files):
+            path = os.path.join(folder, name)
+            if name.lower().endswith(".json") and os.path.abspath(path) != os.path.abspath(state_path):
+                paths.append(path)
+    return paths
+
+def load_state(state_path: str):
+    """Returns (keys of imported files, PANs imported since the last completed evaluation)."""
+    done, pending_pans = set(), set()
+    if not os.path.exists(state_path):
+        return done, pending_pans
+    with open(state_path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue # torn last line of an interrupted run
+            if record.get("evaluated"):
+                pending_pans.clear()
+            elif record.get("status") in ("imported", "unchanged"):
+                done.add(record["key"])
+                if record["status"] == "imported":
+                    pending_pans.add(record["pan"])
+    return done, pending_pans
+
+def _document_pan(data):
+    """PAN stated inside an AIS document, at the top level or one level down."""
+    if not isinstance(data, dict):
+        return None
+    candidates = [data] + [value for value in data.values() if isinstance(value, dict)]
+    for candidate in candidates:
+        for key in ("PAN", "pan", "Pan"):
+            value = candidate.get(key)
+            if isinstance(value, str) and PAN_PATTERN.fullmatch(value.strip().upper()):
+                return value.strip().upper()
+    return None
+
+def _path_pan(relpath: str):
+    matches = PAN_PATTERN.findall(relpath.upper())
+    return matches[-1] if matches else None
+
+def parse_file(directory: str, path: str) -> dict:
+    """
+    Worker: parses one file into {"key", "path", "kind", "pan", ...}: an ITR carries the
+    prepare_itr result, an AIS its transactions and content hash. Failures come back as
+    kind "error" instead of raising, so one bad file never fails its batch.
+    """
+    relpath = os.path.relpath(path, directory)
+    outcome = {"key": _file_key(directory, path), "path": relpath, "kind": "error", "pan": None}
+    try:
+        with open(path, "rb") as f:
+            raw = f.read()
+        data = artifact_codec.loads(raw)
+        if isinstance(data, dict) and "ITR" in data:
+            prepared = itr_service.prepare_itr(data)
+            pan = prepared["fields"].get("pan")
+            outcome.update(kind="itr", prepared=prepared)
+            outcome["pan"] = pan.strip().upper() if isinstance(pan, str) and pan.strip() else _path_pan(relpath)
+        else:
+            # Same hash the AIS sync uses on every route, so re-imports and re-downloads are skipped
+            transactions = list(sync_service.iter_transactions(data))
+            outcome.update(
+                kind="ais",
+                transactions=transactions,
+                content_hash=sync_service.transactions_hash(transactions),
+                pan=_document_pan(data) or _path_pan(relpath),
+            )
+        if not outcome["pan"]:
+            outcome.update(kind="error", message="No PAN in the document or its path")
+    except Exception as e:
+        outcome.update(kind="error", message=str(e))
+    return outcome
+
+def parse_chunk(directory: str, paths: list) -> list:
+    return [parse_file(directory, path) for path in paths]
+
+def _ensure_users(db, pans) -> int:
+    """Creates placeholder users for new PANs, as /api/data/upload does."""
+    pans = sorted(pans)
+    existing = set()
+    for start in range(0, len(pans), bulk_writer.DELETE_CHUNK_SIZE):
+        chunk = pans[start:start + bulk_writer.DELETE_CHUNK_SIZE]
+        existing.update(pan for (pan,) in db.query(models.User.pan).filter(models.User.pan.in_(chunk)))
+    return bulk_writer.insert_rows(db, models.User, [
+        {"pan": pan, "name": "Imported User", "password_hash": "TEMP_HASH"} for pan in pans if pan not in existing
+    ])
+
+def write_batch(db, parsed: list) -> list:
+    """
+    Ingests a batch of parsed files, grouped by PAN, in one transaction without evaluating.
+    Returns one state record per file.
+    """
+    records = []
+    ingestible = [item for item in parsed if item["kind"] != "error"]
+    # Route by PAN: each user's returns (oldest AY first) and AIS documents are written together
+    ingestible.sort(key=lambda item: (item["pan"], item["kind"] != "itr", str(item.get("prepared", {}).get("fields", {}).get("ay", ""))))
+
+    with itr_service.rule_batch(db, evaluate=False):
+        _ensure_users(db, {item["pan"] for item in ingestible})
+        for item in ingestible:
+            pan = item["pan"]
+            if item["kind"] == "itr":
+                prepared = item["prepared"]
+                if itr_service.itr_unchanged(db, pan, prepared["content_hash"]):
+                    success, message = True, "Unchanged, skipped"
+                else:
+                    success, message = itr_service.store_itr(db, pan, prepared)
+            else:
+                success, message = sync_service.sync_ais(db, pan, item["transactions"], item["content_hash"])
+            status = ("unchanged" if message == "Unchanged, skipped" else "imported") if success else "error"
+            records.append({"key": item["key"], "path": item["path"], "pan": pan, "status": status, "message": message})
+
+    for item in parsed:
+        if item["kind"] == "error":
+            records.append({"key": item["key"], "path": item["path"], "pan": item["pan"], "status": "error", "message": item["message"]})
+    return records
+
+def _chunks(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def run(directory: str, state_path: str, workers: int, batch_size: int) -> dict:
+    """Imports every file not yet recorded in the state file. Returns counts and the PANs awaiting evaluation."""
+    done, pending_pans = load_state(state_path)
+    paths = [path for path in list_files(directory, state_path) if _file_key(directory, path) not in done]
+    totals = {"imported": 0, "unchanged": 0, "failed": 0}
+    print(f"Importing {len(paths)} files from {directory} with {workers} workers"
+          f"{f' ({len(done)} already imported)' if done else ''}", flush=True)
+    progress = Progress(len(paths), "files")
+
+    with open(state_path, "a") as state, database.SessionLocal() as db:
+        def collect(parsed):
+            records = write_batch(db, parsed)
+            for record in records:
+                state.write(json.dumps(record) + "\n")
+                if record["status"] == "imported":
+                    pending_pans.add(record["pan"])
+                    totals["imported"] += 1
+                elif record["status"] == "unchanged":
+                    totals["unchanged"] += 1
+                else:
+                    logging.warning(f"{record['path']}: {record['message']}")
+                    totals["failed"] += 1
+            state.flush()
+            progress.advance(len(parsed), **totals)
+
+        if workers <= 1:
+            for chunk in _chunks(paths, batch_size):
+                collect(parse_chunk(directory, chunk))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+                # Bounded number of parsed batches in flight; the writer is the only consumer
+                pending = set()
+                for chunk in _chunks(paths, batch_size):
+                    if len(pending) >= workers * 2:
+                        finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in finished:
+                            collect(future.result())
+                    pending.add(pool.submit(parse_chunk, directory, chunk))
+                for future in as_completed(pending):
+                    collect(future.result())
+
+    totals["pending_pans"] = sorted(pending_pans)
+    return totals
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m backend.tools.backfill", description="Bulk-import ITR and AIS JSON files.")
+    parser.add_argument("directory", help="Directory searched recursively for *.json files")
+    parser.add_argument("--state", help=f"Resume state file (default: DIRECTORY/{STATE_FILE_NAME})")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Parser processes (1 parses in-process)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Files per worker task and per write transaction")
+    parser.add_argument("--no-evaluate", action="store_true", help="Only import; evaluate on a later run")
+    parser.add_argument("--no-enrich", action="store_true", help="Skip explanations for new or changed risks")
+    parser.add_argument("--verbose", action="store_true", help="Log every ingested file")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig()
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+    if not os.path.isdir(args.directory):
+        parser.error(f"{args.directory} is not a directory")
+    state_path = args.state or os.path.join(args.directory, STATE_FILE_NAME)
+
+    prepare_database()
+    totals = run(args.directory, state_path, args.workers, args.batch_size)
+    print(f"Imported {totals['imported']} files, {totals['unchanged']} unchanged, {totals['failed']} failed", flush=True)
+
+    pans = totals["pending_pans"]
+    if pans and not args.no_evaluate:
+        print(f"Evaluating {len(pans)} users", flush=True)
+        outcome = reevaluate.run(pans, args.workers, reevaluate.DEFAULT_CHUNK_SIZE, enrich=not args.no_enrich)
+        if not outcome["failed"]:
+            with open(state_path, "a") as state:
+                state.write(json.dumps({"evaluated": True}) + "\n")
+        print(f"Done: {outcome['evaluated']} evaluated, {outcome['failed']} failed", flush=True)
+    return 1 if totals["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
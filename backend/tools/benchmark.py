@@ -0,0 +1,292 @@
+"""
+Rule Engine benchmark over a synthetic corpus (see corpus.py):
+
+    python -m backend.tools.benchmark [--users N] [--sft-entries N] [--securities N]
+                                      [--stage NAME ...] [--rounds N] [--save FILE]
+                                      [--baseline FILE] [--threshold FRACTION]
+
+Every stage runs over the same generated users and reports throughput (users/s),
+p50 / p99 latency of one call, and the memory one call allocates, measured in a
+separate tracemalloc pass: the peak traced memory during the call, and the bytes and
+number of allocated blocks still alive after it (from tracemalloc snapshot statistics). The "ingest" stage drives the real ingestion path
+(process_itr_data + process_ais_data in one rule_batch, then enrichment) against a
+throwaway in-memory SQLite database, with the AI client replaced by an instant stub.
+
+--save writes the results as JSON; --baseline compares against such a file and exits
+with status 1 when a stage is slower (throughput or p99) or allocates more than the
+baseline by more than --threshold. Baselines are machine-specific: record one on the
+same machine before the change, e.g.
+
+    git stash && python -m backend.tools.benchmark --save /tmp/bench.json
+    git stash pop && python -m backend.tools.benchmark --baseline /tmp/bench.json
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict
+from unittest import mock
+import numpy as np
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from .. import models, database, rule_engine, batch_rule_engine, tax_engine
+from ..rule_engine import DataNormalizer, RiskEngine, OpportunityEngine, TaxCalendarEngine
+from ..services import itr_service, sync_service, enrichment_service
+from . import corpus
+
+DEFAULT_USERS = 500
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_THRESHOLD = 0.2
+WARMUP_CALLS = 20
+ALLOCATION_SAMPLES = 50
+
+# ==========================================
+# Stages
+# ==========================================
+# name -> factory(users, options): a context manager yielding (items, call), where
+# call(item) performs one operation and returns how many users it covered.
+# A fresh context is opened per round, so stages that consume their items
+# (ingest) always start from the same state.
+
+STAGES: Dict[str, callable] = {}
+
+def stage(name: str):
+    def register(factory):
+        STAGES[name] = contextmanager(factory)
+        return factory
+    return register
+
+def _normalized(users):
+    return [
+        (DataNormalizer.normalize_itr(user["itr"]), DataNormalizer.normalize_ais(user["ais"], user["ay"]), user["profile"])
+        for user in users
+    ]
+
+@stage("normalize_itr")
+def _normalize_itr(users, options):
+    def call(itr_json):
+        DataNormalizer.normalize_itr(itr_json)
+        return 1
+    yield [user["itr"] for user in users], call
+
+@stage("normalize_ais")
+def _normalize_ais(users, options):
+    def call(user):
+        DataNormalizer.normalize_ais(user["ais"], user["ay"])
+        return 1
+    yield users, call
+
+@stage("risks")
+def _risks(users, options):
+    def call(row):
+        raw_itr, raw_ais, profile = row
+        RiskEngine(raw_itr, raw_ais, profile).execute()
+        return 1
+    yield _normalized(users), call
+
+@stage("opportunities")
+def _opportunities(users, options):
+    def call(row):
+        raw_itr, _, profile = row
+        OpportunityEngine(raw_itr, profile).execute()
+        return 1
+    yield _normalized(users), call
+
+@stage("tax_calendar")
+def _tax_calendar(users, options):
+    def call(row):
+        TaxCalendarEngine(row[0]).execute()
+        return 1
+    yield _normalized(users), call
+
+@stage("what_if")
+def _what_if(users, options):
+    """One call evaluates a what-if grid (both regimes x extra 80C x 80D x NPS) for a user's return."""
+    extra_80c, extra_80d, extra_nps = np.linspace(0, 150000, 7), np.linspace(0, 75000, 4), np.linspace(0, 50000, 3)
+    def call(raw_itr):
+        tax_engine.what_if_grid(rule_engine.tax_base(raw_itr), extra_80c, extra_80d, extra_nps)
+        return 1
+    yield [DataNormalizer.normalize_itr(user["itr"]) for user in users], call
+
+@stage("evaluate_all")
+def _evaluate_all(users, options):
+    def call(user):
+        rule_engine.evaluate_all(user["itr"], user["ais"], user["profile"])
+        return 1
+    yield users, call
+
+@stage("evaluate_batch")
+def _evaluate_batch(users, options):
+    """One call evaluates a RuleTable of --batch-size users, table construction included."""
+    rows = [((user["pan"], user["ay"]), raw_itr, raw_ais, profile) for user, (raw_itr, raw_ais, profile) in zip(users, _normalized(users))]
+    chunks = [rows[start:start + options.batch_size] for start in range(0, len(rows), options.batch_size)]
+    def call(chunk):
+        batch_rule_engine.evaluate_batch(batch_rule_engine.RuleTable.from_records(chunk))
+        return len(chunk)
+    yield chunks, call
+
+class StubAI:
+    """Stands in for the AI client: answers instantly and never leaves the process."""
+    available = True
+
+    def generate_risk_explanation(self, risk_data: dict, user_profile: dict = None):
+        return f"{risk_data['description']} (benchmark stub)"
+
+@stage("ingest")
+def _ingest(users, options):
+    """One call stores a user's return and AIS and evaluates them, as /api/data/upload does."""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [
+            {"pan": user["pan"], "name": "Benchmark User", "password_hash": "TEMP_HASH", "questionnaire_data": json.dumps(user["profile"])}
+            for user in users
+        ])
+    documents = [(user["pan"], user["itr"], corpus.ais_document(user["pan"], user["fy"], user["ais"])) for user in users]
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+
+    def call(document):
+        pan, itr_json, ais_json = document
+        with itr_service.rule_batch(db):
+            itr_service.process_itr_data(db, pan, itr_json)
+            sync_service.process_ais_data(db, pan, ais_json)
+        return 1
+
+    try:
+        with mock.patch.object(enrichment_service, "get_ai_engine", lambda: StubAI()):
+            yield documents, call
+    finally:
+        db.close()
+        engine.dispose()
+
+# ==========================================
+# Measurement
+# ==========================================
+
+def measure(name: str, users: list, options) -> dict:
+    factory = STAGES[name]
+    with factory(users, options) as (items, call):
+        for item in items[:WARMUP_CALLS]:
+            call(item)
+
+    latencies = []
+    count = 0
+    elapsed = 0.0
+    for _ in range(options.rounds):
+        with factory(users, options) as (items, call):
+            for item in items:
+                start = time.perf_counter()
+                count += call(item)
+                latency = time.perf_counter() - start
+                latencies.append(latency)
+                elapsed += latency
+
+    # Separate pass: tracing slows every allocation down and would skew the timings
+    peaks, retained, blocks = [], [], []
+    with factory(users, options) as (items, call):
+        tracemalloc.start()
+        try:
+            for item in items[:ALLOCATION_SAMPLES]:
+                blocks_before = _allocated_blocks()
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                call(item)
+                current, peak = tracemalloc.get_traced_memory()
+                peaks.append(peak - before)
+                retained.append(current - before)
+                blocks.append(_allocated_blocks() - blocks_before)
+        finally:
+            tracemalloc.stop()
+
+    p50, p99 = np.percentile(np.array(latencies) * 1000, [50, 99])
+    return {
+        "users": count,
+        "ops_per_sec": count / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": float(p50),
+        "p99_ms": float(p99),
+        "peak_kib": float(np.mean(peaks)) / 1024,
+        "retained_kib": float(np.mean(retained)) / 1024,
+        "retained_blocks": float(np.mean(blocks)),
+    }
+
+_TRACEMALLOC_FILTER = tracemalloc.Filter(False, tracemalloc.__file__)
+
+def _allocated_blocks() -> int:
+    """Number of traced memory blocks currently allocated, excluding tracemalloc's own."""
+    snapshot = tracemalloc.take_snapshot().filter_traces([_TRACEMALLOC_FILTER])
+    return sum(stat.count for stat in snapshot.statistics("filename"))
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Human-readable regressions of `results` against `baseline` beyond `threshold` (a fraction)."""
+    regressions = []
+    for name, current in results["stages"].items():
+        base = baseline.get("stages", {}).get(name)
+        if not base:
+            continue
+        if current["ops_per_sec"] < base["ops_per_sec"] * (1 - threshold):
+            regressions.append(f"{name}: {current['ops_per_sec']:,.0f} users/s vs {base['ops_per_sec']:,.0f} in the baseline")
+        if current["p99_ms"] > base["p99_ms"] * (1 + threshold):
+            regressions.append(f"{name}: p99 {current['p99_ms']:.3f} ms vs {base['p99_ms']:.3f} ms in the baseline")
+        # Small allocations vary with interpreter state; only flag growth beyond 1 KiB as well
+        if current["peak_kib"] > base["peak_kib"] * (1 + threshold) + 1:
+            regressions.append(f"{name}: peak {current['peak_kib']:.1f} KiB/call vs {base['peak_kib']:.1f} KiB in the baseline")
+    return regressions
+
+def print_report(results: dict):
+    print(f"{'stage':<16}{'users/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'peak KiB':>11}{'kept KiB':>11}{'kept blocks':>13}")
+    for name, r in results["stages"].items():
+        print(
+            f"{name:<16}{r['ops_per_sec']:>12,.0f}{r['p50_ms']:>10.3f}{r['p99_ms']:>10.3f}"
+            f"{r['peak_kib']:>11.1f}{r['retained_kib']:>11.1f}{r.get('retained_blocks', 0):>13,.0f}"
+        )
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m backend.tools.benchmark", description="Benchmark the Rule Engine stages.")
+    parser.add_argument("--users", type=int, default=DEFAULT_USERS, help="Synthetic users in the corpus")
+    parser.add_argument("--sft-entries", type=int, default=corpus.DEFAULT_SFT_ENTRIES, help="SFT / TDS entries per AIS")
+    parser.add_argument("--securities", type=int, default=corpus.DEFAULT_SECURITIES, help="Securities sales per AIS")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stage", action="append", choices=list(STAGES), help="Stage to run (repeatable); default: all")
+    parser.add_argument("--rounds", type=int, default=3, help="Timed passes over the corpus per stage")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Users per RuleTable in evaluate_batch")
+    parser.add_argument("--save", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Results file to compare against; regressions exit with status 1")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Tolerated slowdown / growth, as a fraction")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig()
+    logging.getLogger().setLevel(logging.WARNING)
+    config = {"users": args.users, "sft_entries": args.sft_entries, "securities": args.securities, "seed": args.seed, "batch_size": args.batch_size}
+    users = list(corpus.generate_users(args.users, args.seed, args.sft_entries, args.securities))
+    print(f"Benchmarking {args.users} users ({args.sft_entries} SFT entries, {args.securities} securities sales each), "
+          f"{args.rounds} rounds", flush=True)
+
+    results = {"config": config, "stages": {}}
+    for name in args.stage or STAGES:
+        results["stages"][name] = measure(name, users, args)
+    print_report(results)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if not args.baseline:
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("config") != config:
+        print(f"Warning: baseline was recorded with {baseline.get('config')}, not {config}", flush=True)
+    regressions = compare(results, baseline, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}", flush=True)
+    if regressions:
+        return 1
+    print(f"No regressions beyond {args.threshold:.0%} of the baseline", flush=True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
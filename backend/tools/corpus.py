@@ -0,0 +1,229 @@
+"""
+Synthetic, reproducible ITR / AIS data for benchmarks and load tests:
+
+    python -m backend.tools.corpus OUTPUT_DIRECTORY [--users N] [--sft-entries N]
+                                   [--securities N] [--seed N]
+
+writes one folder per PAN with its return and AIS document, in the layout backfill.py
+imports. The generator functions are also used in-process by benchmark.py.
+
+Returns cover ITR-1 / ITR-4 (schedules directly under the form) and ITR-2 / ITR-3
+(Part A / Part B layout) with the paths itr_extractor reads. AIS lists are in the
+scraper's format (informationCategory / amount / description); their size is set by
+the number of SFT entries (interest, rent, TDS, dividends, ...) and of securities sales.
+Every sale carries an ISIN and a quantity and is preceded by a purchase of that ISIN
+one month to three years earlier, so the lot-level capital gains are exercised too.
+Figures are drawn so that every rule fires for a share of the users.
+"""
+import argparse
+import json
+import os
+import random
+import string
+import sys
+
+FORMS = ("ITR1", "ITR2", "ITR3", "ITR4")
+DEFAULT_AY = "2024-25"
+DEFAULT_SFT_ENTRIES = 20
+DEFAULT_SECURITIES = 50
+
+# (informationCategory, description, amount range)
+SFT_KINDS = (
+    ("Salary", "Salary received from employer", (300000, 3000000)),
+    ("Rent received", "Rent received from tenant", (60000, 600000)),
+    ("TDS", "TDS deducted u/s 192", (5000, 400000)),
+    ("Interest from savings bank", "Interest on savings account", (500, 60000)),
+    ("Interest from deposits", "Interest on fixed deposit", (2000, 200000)),
+    ("Dividend", "Dividend received", (100, 50000)),
+    ("SFT-003", "Cash deposits in current account", (100000, 2000000)),
+)
+
+SECURITY_DESCRIPTIONS = (
+    "Sale of listed equity shares - short term",
+    "Sale of listed equity shares - long term",
+    "Sale of equity oriented mutual fund units - short term",
+    "Sale of debt mutual fund units",
+)
+
+def generate_pan(rng: random.Random) -> str:
+    letters = string.ascii_uppercase
+    return (
+        "".join(rng.choice(letters) for _ in range(3)) + "P" + rng.choice(letters)
+        + f"{rng.randrange(10000):04d}" + rng.choice(letters)
+    )
+
+def fy_of(ay: str) -> str:
+    start = int(ay.split("-")[0])
+    return f"{start - 1}-{str(start)[-2:]}"
+
+def _amount(rng: random.Random, low: float, high: float, zero_share: float = 0.0) -> float:
+    if zero_share and rng.random() < zero_share:
+        return 0.0
+    return round(rng.uniform(low, high), 2)
+
+def _figures(rng: random.Random) -> dict:
+    """Headline figures shared by every form layout."""
+    gross = _amount(rng, 250000, 7500000)
+    deductions_80c = _amount(rng, 0, 150000, zero_share=0.2)
+    tax_payable = round(max(gross - deductions_80c - 500000, 0) * rng.uniform(0.05, 0.3), 2)
+    return {
+        "gross": gross,
+        "total": round(gross - deductions_80c, 2),
+        "tax_payable": tax_payable,
+        "tax_paid": round(tax_payable * rng.choice((1.0, 1.0, 0.8, 1.1)), 2),
+        "house_property": _amount(rng, 0, 300000, zero_share=0.6),
+        "stcg": _amount(rng, 0, 500000, zero_share=0.6),
+        "ltcg": _amount(rng, 0, 800000, zero_share=0.6),
+        "80c": deductions_80c,
+        "80d": _amount(rng, 0, 50000, zero_share=0.5),
+        "80ccd_1b": _amount(rng, 0, 50000, zero_share=0.6),
+        "tds": _amount(rng, 0, 400000, zero_share=0.1),
+    }
+
+def _personal_info(rng: random.Random, pan: str) -> dict:
+    return {
+        "PAN": pan,
+        "AssesseeName": {"FirstName": rng.choice(("ASHA", "RAVI", "MEERA", "ARJUN")), "SurNameOrOrgName": rng.choice(("RAO", "SHAH", "IYER"))},
+        "DOB": f"19{rng.randrange(60, 99)}-0{rng.randrange(1, 9)}-1{rng.randrange(0, 9)}",
+        "Address": {"CityOrTownOrDistrict": rng.choice(("PUNE", "CHENNAI", "DELHI")), "PinCode": rng.randrange(110001, 700000)},
+    }
+
+def _filing_status(rng: random.Random, index: int, ay: str) -> dict:
+    # Returns up to AY 2023-24 opt in to the new regime (115BAC), later ones opt out of it
+    regime_flag = "NewTaxRegime" if ay < "2024-25" else "OptOutNewTaxRegime"
+    return {
+        "AcknowledgementNumber": f"{index:015d}",
+        "ResidentialStatus": rng.choice(("RES", "RES", "RES", "NRI")),
+        regime_flag: rng.choice(("Y", "N")),
+    }
+
+def generate_itr(rng: random.Random, form: str, pan: str, ay: str = DEFAULT_AY, index: int = 0) -> dict:
+    """One return of the given form type (ITR1 / ITR2 / ITR3 / ITR4)."""
+    f = _figures(rng)
+    header = {"FormName": form, "AssessmentYear": ay}
+    if form in ("ITR1", "ITR4"):
+        body = {
+            f"Form_{form}": header,
+            "PersonalInfo": _personal_info(rng, pan),
+            "FilingStatus": _filing_status(rng, index, ay),
+            f"{form}_IncomeDeductions": {
+                "GrossTotIncome": f["gross"], "TotalIncome": f["total"], "IncomeFromHP": f["house_property"],
+                "UsrDeductUndChapVIA": {"Section80C": f["80c"]},
+            },
+            f"{form}_TaxComputation": {"NetTaxLiability": f["tax_payable"]},
+            "TaxPaid": {"TaxesPaid": {"TotalTaxesPaid": f["tax_paid"]}},
+            "TDS": {"TotalTDSClaimed": f["tds"]},
+            "Refund": {"RefundDue": max(round(f["tax_paid"] - f["tax_payable"], 2), 0)},
+        }
+    else:
+        body = {
+            f"Form_{form}": header,
+            "PartA_GEN1": {"PersonalInfo": _personal_info(rng, pan), "FilingStatus": _filing_status(rng, index, ay)},
+            "PartB-TI": {"GrossTotalIncome": f["gross"], "TotalIncome": f["total"]},
+            "PartB_TTI": {
+                "ComputationOfTaxLiability": {"NetTaxLiability": f["tax_payable"]},
+                "TaxPaid": {"TaxesPaid": {"TotalTaxesPaid": f["tax_paid"]}},
+                "Refund": {"RefundDue": max(round(f["tax_paid"] - f["tax_payable"], 2), 0)},
+            },
+            "ScheduleHP": {"TotalIncomeHP": f["house_property"]},
+            "ScheduleCGFor23": {
+                "ShortTermCapGainFor23": {"TotalSTCG": f["stcg"]},
+                "LongTermCapGain23": {"TotalLTCG": f["ltcg"]},
+            },
+            "ScheduleVIA": {"UsrDeductUndChapVIA": {
+                "Section80C": f["80c"], "Section80D": f["80d"], "Section80CCD1B": f["80ccd_1b"],
+            }},
+            "ScheduleTDS1": {"TotalTDSClaimed": f["tds"]},
+        }
+    return {"ITR": {form: body}}
+
+def generate_ais(rng: random.Random, fy: str, sft_entries: int = DEFAULT_SFT_ENTRIES, securities: int = DEFAULT_SECURITIES) -> list:
+    """An AIS transaction list with `sft_entries` SFT / TDS entries and `securities` securities sales."""
+    start = int(fy.split("-")[0])
+    entries = []
+    for _ in range(sft_entries):
+        category, description, (low, high) = rng.choice(SFT_KINDS)
+        entry = {
+            "informationCategory": category, "description": description,
+            "amount": _amount(rng, low, high), "date": f"{start}-{rng.randrange(4, 13):02d}-{rng.randrange(1, 29):02d}",
+        }
+        if category == "TDS":
+            entry["section"] = "192"
+        entries.append(entry)
+    holdings = [f"INE{rng.randrange(1000):03d}A01{rng.randrange(100):02d}" for _ in range(max(securities // 5, 1))]
+    for _ in range(securities):
+        isin = rng.choice(holdings)
+        description = rng.choice(SECURITY_DESCRIPTIONS)
+        quantity = rng.randrange(1, 500)
+        bought = rng.randrange(start - 3, start + 1)
+        entries.append({
+            "informationCategory": "Purchase of securities", "description": description.replace("Sale", "Purchase"),
+            "amount": _amount(rng, 500, 150000), "date": f"{bought}-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}",
+            "isin": isin, "quantity": quantity + rng.randrange(0, 50),
+        })
+        entries.append({
+            "informationCategory": "Sale of securities", "description": description,
+            "amount": _amount(rng, 1000, 200000), "date": f"{start + 1}-{rng.randrange(1, 4):02d}-{rng.randrange(1, 29):02d}",
+            "isin": isin, "quantity": quantity,
+        })
+    return entries
+
+def generate_profile(rng: random.Random) -> dict:
+    """Questionnaire answers as stored on User.questionnaire_data."""
+    sources = ["Salary"] + rng.sample(("House Property", "Capital Gains (Stocks/Property)", "Business", "Other Sources"), rng.randrange(0, 3))
+    return {
+        "risk": rng.choice(("Conservative", "Balanced", "Aggressive")),
+        "newRegime": rng.choice(("Old Regime", "New Regime")),
+        "residentialStatus": rng.choice(("Resident", "Resident", "NRI")),
+        "income_sources": sources,
+    }
+
+def ais_document(pan: str, fy: str, entries: list) -> dict:
+    """Wraps a generated AIS list into the AIS JSON layout ingestion reads."""
+    return {"PAN": pan, "AIS": {"SFT": [{
+        "information_category": entry["informationCategory"], "description": entry["description"],
+        "amount": entry["amount"], "date": entry["date"], "financial_year": fy,
+        **({"section": entry["section"], "tax_deposited": entry["amount"]} if "section" in entry else {}),
+        **({"isin": entry["isin"], "quantity": entry["quantity"]} if "isin" in entry else {}),
+    } for entry in entries]}}
+
+def generate_users(count: int, seed: int = 0, sft_entries: int = DEFAULT_SFT_ENTRIES, securities: int = DEFAULT_SECURITIES,
+                   ay: str = DEFAULT_AY, forms=FORMS):
+    """Yields {"pan", "ay", "fy", "itr", "ais", "profile"} for `count` users; the same seed gives the same users."""
+    rng = random.Random(seed)
+    pans = set()
+    fy = fy_of(ay)
+    for index in range(count):
+        pan = generate_pan(rng)
+        while pan in pans:
+            pan = generate_pan(rng)
+        pans.add(pan)
+        yield {
+            "pan": pan, "ay": ay, "fy": fy,
+            "itr": generate_itr(rng, forms[index % len(forms)], pan, ay, index),
+            "ais": generate_ais(rng, fy, sft_entries, securities),
+            "profile": generate_profile(rng),
+        }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m backend.tools.corpus", description="Write synthetic ITR / AIS JSON files.")
+    parser.add_argument("directory", help="Output directory (one folder per PAN)")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--sft-entries", type=int, default=DEFAULT_SFT_ENTRIES, help="SFT / TDS entries per AIS")
+    parser.add_argument("--securities", type=int, default=DEFAULT_SECURITIES, help="Securities sales per AIS")
+    parser.add_argument("--ay", default=DEFAULT_AY, help="Assessment year of the returns")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    for user in generate_users(args.users, args.seed, args.sft_entries, args.securities, args.ay):
+        folder = os.path.join(args.directory, user["pan"])
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, f"itr_{user['ay']}.json"), "w") as f:
+            json.dump(user["itr"], f)
+        with open(os.path.join(folder, f"ais_{user['fy']}.json"), "w") as f:
+            json.dump(ais_document(user["pan"], user["fy"], user["ais"]), f)
+    print(f"Wrote {args.users} users to {args.directory}", flush=True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,26 @@
+"""
+Brings an existing database up to the current models, once per deploy rather than on
+every API import:
+
+    python -m backend.tools.migrate
+
+Creates missing tables, adds missing columns and indexes (database.upgrade_schema) and
+fills AIS_Aggregate for databases that predate it. Safe to re-run: each step only does
+what is still missing.
+"""
+import argparse
+import logging
+import sys
+from . import prepare_database
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m backend.tools.migrate", description="Upgrade the database schema.")
+    parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    prepare_database()
+    print("Database schema is up to date.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
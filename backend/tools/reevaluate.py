@@ -0,0 +1,171 @@
+"""
+Re-runs the Rule Engine for every user, or a subset, without waiting for them to log in
+or sync, e.g. to roll out a rule fix (bump rule_engine.RULE_ENGINE_VERSION first):
+
+    python -m backend.tools.reevaluate [--pan PAN ...] [--pans-file FILE] [--stale-only]
+                                       [--force] [--workers N] [--chunk-size N] [--no-enrich]
+
+Worker processes each load a chunk of users into a RuleTable and evaluate it with the
+batch engine. Only this process writes: results are stored one chunk per transaction,
+with a savepoint per user, so a bad record never loses the rest of its chunk.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from .. import models, database, rule_engine, batch_rule_engine, artifact_codec
+from ..services import itr_service, enrichment_service, bulk_writer
+from . import prepare_database, init_worker, Progress
+
+DEFAULT_CHUNK_SIZE = 500
+
+def select_pans(db, pans=None, stale_only: bool = False) -> list:
+    """PANs to re-evaluate: all users, those in `pans`, and/or those last evaluated by an older engine."""
+    wanted = set(pans) if pans else None
+    selected = []
+    for pan, rules_inputs in db.query(models.User.pan, models.User.rules_inputs).order_by(models.User.pan).yield_per(1000):
+        if wanted is not None and pan not in wanted:
+            continue
+        if stale_only and rules_inputs:
+            try:
+                if json.loads(rules_inputs).get("version") == rule_engine.RULE_ENGINE_VERSION:
+                    continue
+            except ValueError:
+                pass
+        selected.append(pan)
+    return selected
+
+def reprocess_pending(db, pans: list) -> int:
+    """Extracts the columns of legacy filings up front, so workers only ever read."""
+    count = 0
+    for start in range(0, len(pans), bulk_writer.DELETE_CHUNK_SIZE):
+        chunk = pans[start:start + bulk_writer.DELETE_CHUNK_SIZE]
+        for filing in db.query(models.ITR_Filing).filter(
+            models.ITR_Filing.user_pan.in_(chunk),
+            models.ITR_Filing.fields_extracted.isnot(True)
+        ):
+            count += itr_service.reprocess_filing(db, filing)
+        db.commit()
+    return count
+
+def evaluate_chunk(pans: list, force: bool = False):
+    """
+    Worker: evaluates the latest filing of each PAN. Returns (pans, skipped, evaluations),
+    evaluations being (pan, ay, inputs, fingerprint, user_profile, EvaluationResult) tuples
+    for users whose inputs differ from their stored evaluation (all of them if `force`).
+    """
+    with database.SessionLocal() as db:
+        table = itr_service.load_rule_table(db, pans)
+        stored = dict(db.query(models.User.pan, models.User.rules_fingerprint).filter(models.User.pan.in_(pans)))
+
+    evaluations = []
+    skipped = len(pans) - len(table) # users without a filing, or with one that could not be extracted
+    rows = zip(table.keys, table.itrs, table.aiss, table.profiles, batch_rule_engine.evaluate_batch(table))
+    for (pan, ay), raw_itr, raw_ais, user_profile, result in rows:
+        inputs = itr_service.rule_inputs(ay, raw_itr, raw_ais, user_profile)
+        fingerprint = artifact_codec.content_hash(inputs)
+        if not force and stored.get(pan) == fingerprint:
+            skipped += 1
+            continue
+        evaluations.append((pan, ay, inputs, fingerprint, user_profile, result))
+    return len(pans), skipped, evaluations
+
+def write_chunk(db, evaluations: list, enrich: bool = True):
+    """Stores a worker's evaluations in one transaction. Returns (written, failed)."""
+    users = {
+        user.pan: user
+        for user in db.query(models.User).filter(models.User.pan.in_([evaluation[0] for evaluation in evaluations]))
+    }
+    written, failed = [], 0
+    database.begin_transaction(db)
+    for pan, ay, inputs, fingerprint, user_profile, result in evaluations:
+        user = users.get(pan)
+        try:
+            with db.begin_nested():
+                risk_ids = itr_service.store_evaluation(
+                    db, user, pan, ay, inputs, fingerprint, itr_service.previous_inputs(user), None, result
+                )
+            written.append((risk_ids, user_profile))
+        except Exception as e:
+            logging.error(f"Storing the evaluation of {pan} failed: {e}")
+            failed += 1
+    db.commit()
+
+    if enrich:
+        for risk_ids, user_profile in written:
+            if risk_ids:
+                risk_rows = db.query(models.Risk).filter(models.Risk.id.in_(risk_ids)).all()
+                enrichment_service.enrich_risks(db, risk_rows, user_profile)
+    return len(written), failed
+
+def _chunks(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def run(pans: list, workers: int, chunk_size: int, force: bool = False, enrich: bool = True) -> dict:
+    totals = {"evaluated": 0, "skipped": 0, "failed": 0}
+    progress = Progress(len(pans), "users")
+
+    def collect(db, outcome):
+        count, skipped, evaluations = outcome
+        written, failed = write_chunk(db, evaluations, enrich)
+        totals["evaluated"] += written
+        totals["skipped"] += skipped
+        totals["failed"] += failed
+        progress.advance(count, **totals)
+
+    with database.SessionLocal() as db:
+        if workers <= 1:
+            for chunk in _chunks(pans, chunk_size):
+                collect(db, evaluate_chunk(chunk, force))
+            return totals
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+            # Keep a bounded number of chunks in flight so results never pile up in memory
+            pending = set()
+            for chunk in _chunks(pans, chunk_size):
+                if len(pending) >= workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        collect(db, future.result())
+                pending.add(pool.submit(evaluate_chunk, chunk, force))
+            for future in as_completed(pending):
+                collect(db, future.result())
+    return totals
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m backend.tools.reevaluate", description="Re-run the Rule Engine for stored users.")
+    parser.add_argument("--pan", action="append", help="PAN to re-evaluate (repeatable); default: all users")
+    parser.add_argument("--pans-file", help="File with one PAN per line")
+    parser.add_argument("--stale-only", action="store_true", help="Only users last evaluated by an older rule engine version")
+    parser.add_argument("--force", action="store_true", help="Rewrite results even if the inputs are unchanged")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes (1 evaluates in-process)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Users per worker task and per write transaction")
+    parser.add_argument("--no-enrich", action="store_true", help="Skip explanations for new or changed risks")
+    parser.add_argument("--verbose", action="store_true", help="Log every user's result counts")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig()
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+    pans = list(args.pan or [])
+    if args.pans_file:
+        with open(args.pans_file) as f:
+            pans.extend(line.strip() for line in f if line.strip())
+
+    prepare_database()
+    with database.SessionLocal() as db:
+        selected = select_pans(db, pans, args.stale_only)
+        reprocessed = reprocess_pending(db, selected)
+    print(f"Re-evaluating {len(selected)} users with {args.workers} workers (rule engine v{rule_engine.RULE_ENGINE_VERSION}"
+          f"{f', {reprocessed} filings re-extracted' if reprocessed else ''})", flush=True)
+    if not selected:
+        return 0
+
+    totals = run(selected, args.workers, args.chunk_size, force=args.force, enrich=not args.no_enrich)
+    print(f"Done: {totals['evaluated']} evaluated, {totals['skipped']} unchanged or without a filing, {totals['failed']} failed", flush=True)
+    return 1 if totals["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())